@@ -0,0 +1,439 @@
+"""Per-collection limits on concurrent query execution."""
+
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from .config import config
+from .cost import QueryLane
+from .limiter import AdaptiveLimit
+from .models.status import BulkheadStatus
+from .registry import CollectionRuntime
+
+__all__ = ["Bulkhead", "BulkheadFullError", "Bulkheads", "bulkheads"]
+
+
+_SERVICE_TIME_WEIGHT = 0.2
+"""Weight of the latest query in the moving average of query duration."""
+
+
+class BulkheadFullError(Exception):
+    """Raised when a query is rejected to shed load.
+
+    Parameters
+    ----------
+    retry_after
+        Suggested number of seconds to wait before retrying.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass(slots=True)
+class _Waiter:
+    """A query waiting for a slot."""
+
+    user: str
+    """User who sent the query."""
+
+    start: float
+    """Virtual start time, which determines the order in which queries run."""
+
+    sequence: int
+    """Arrival order, to break ties between equal start times."""
+
+    future: asyncio.Future[None]
+    """Future that is resolved when the query is granted a slot."""
+
+
+class Bulkhead:
+    """Limit on the number of queries running against one collection.
+
+    Queries beyond the concurrency limit wait in a bounded queue. To shed
+    load before any work is done for it, a query is rejected if the queue is
+    full or if its estimated wait, based on the moving average of query
+    durations, exceeds the configured maximum queue wait. A query that has
+    waited that long without starting is also rejected.
+
+    Waiting queries are started in weighted fair queuing order by user, using
+    start-time fair queuing. Each query gets a virtual start time that is the
+    later of the current virtual time and the virtual finish time of the
+    previous query from the same user, and finishes one unit of work divided
+    by the user's weight later. The waiting query with the earliest start
+    time runs next. A user with a long backlog of queries therefore does not
+    delay a user who sends an occasional query by more than one query, while
+    still getting a share of the slots proportional to their weight. In
+    addition, no user may have more than a configured number of queries
+    running at once.
+
+    If adaptive concurrency is enabled, the number of running queries is
+    further limited by an `~sia.limiter.AdaptiveLimit` driven by the latency
+    of Butler queries, which can be at most the configured concurrency.
+
+    Parameters
+    ----------
+    concurrency
+        Maximum number of queries running at once.
+    queue
+        Maximum number of queries waiting to run.
+    """
+
+    def __init__(self, concurrency: int, queue: int) -> None:
+        self._concurrency = concurrency
+        self._queue = queue
+        self._adaptive = AdaptiveLimit(concurrency)
+        self._active = 0
+        self._active_by_user: Counter[str] = Counter()
+        self._waiters: dict[str, deque[_Waiter]] = {}
+        self._queued = 0
+        self._finish: dict[str, float] = {}
+        self._vtime = 0.0
+        self._sequence = 0
+        self._service_time: float | None = None
+
+    @property
+    def concurrency(self) -> int:
+        """Maximum number of queries running at once."""
+        return self._concurrency
+
+    @property
+    def queue(self) -> int:
+        """Maximum number of queries waiting to run."""
+        return self._queue
+
+    @property
+    def load(self) -> float:
+        """Running and queued queries as a fraction of the current limit."""
+        return (self._active + self._queued) / self._limit()
+
+    @property
+    def service_time(self) -> float | None:
+        """Moving average of query duration in seconds, if known."""
+        return self._service_time
+
+    @asynccontextmanager
+    async def slot(self, user: str) -> AsyncIterator[None]:
+        """Wait for and hold a slot to run a query.
+
+        Parameters
+        ----------
+        user
+            User who sent the query.
+
+        Raises
+        ------
+        BulkheadFullError
+            Raised if the query was rejected to shed load.
+        """
+        await self._acquire(user)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._observe(time.monotonic() - started)
+            self._release(user)
+
+    @asynccontextmanager
+    async def try_slot(self, user: str) -> AsyncIterator[bool]:
+        """Hold a slot for low-priority work only if one is free now.
+
+        The slot is only taken if no query is waiting and the limits allow
+        a query from this user to start, so low-priority work never waits
+        and never makes a query wait ahead of it. Its duration is not used
+        to estimate waits.
+
+        Parameters
+        ----------
+        user
+            User to account the work to.
+
+        Yields
+        ------
+        bool
+            Whether a slot was taken. If not, the work should be skipped.
+        """
+        if self._waiters or not self._can_start(user):
+            yield False
+            return
+        self._start(user, self._vtime)
+        try:
+            yield True
+        finally:
+            self._release(user)
+
+    def observe_query(self, latency: float) -> int | None:
+        """Record the latency of a Butler query run while holding a slot.
+
+        Parameters
+        ----------
+        latency
+            Duration of the Butler query in seconds.
+
+        Returns
+        -------
+        int or None
+            New limit on running queries if it changed, otherwise `None`.
+        """
+        if not config.adaptive_concurrency:
+            return None
+        if not self._adaptive.observe(latency, self._active):
+            return None
+        self._wake()
+        return self._adaptive.limit
+
+    def resize(self, concurrency: int, queue: int) -> None:
+        """Change the limits.
+
+        Queries that are already running or queued are not affected, but if
+        the concurrency limit grows, waiting queries are started.
+
+        Parameters
+        ----------
+        concurrency
+            Maximum number of queries running at once.
+        queue
+            Maximum number of queries waiting to run.
+        """
+        self._concurrency = concurrency
+        self._queue = queue
+        self._adaptive.set_maximum(concurrency)
+        self._wake()
+
+    def status(self) -> BulkheadStatus:
+        """Return the current state of the bulkhead.
+
+        Returns
+        -------
+        BulkheadStatus
+            Limits and current usage.
+        """
+        return BulkheadStatus(
+            concurrency=self._concurrency,
+            limit=self._limit(),
+            queue=self._queue,
+            active=self._active,
+            queued=self._queued,
+            users=len(self._active_by_user.keys() | self._waiters.keys()),
+            service_time_seconds=self._service_time,
+            estimated_wait_seconds=self._estimate_wait(self._vtime),
+        )
+
+    async def _acquire(self, user: str) -> None:
+        start = max(self._vtime, self._finish.get(user, 0.0))
+        if not self._waiters and self._can_start(user):
+            self._start(user, start)
+            return
+        max_wait = config.max_queue_wait.total_seconds()
+        estimate = self._estimate_wait(start)
+        if self._queued >= self._queue or (estimate or 0) > max_wait:
+            raise BulkheadFullError(self._retry_after())
+        self._finish[user] = start + 1 / config.user_weight(user)
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(user, start, self._sequence, future)
+        self._sequence += 1
+        self._waiters.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+
+        # The query may be able to start immediately if the only other
+        # waiting queries are from users who are at their limit.
+        self._wake()
+        try:
+            async with asyncio.timeout(max_wait):
+                try:
+                    await future
+                except asyncio.CancelledError:
+                    # If the slot was granted just before cancellation, give
+                    # it back.
+                    if future.done() and not future.cancelled():
+                        self._release(user)
+                    else:
+                        self._remove(waiter)
+                    raise
+        except TimeoutError:
+            raise BulkheadFullError(self._retry_after()) from None
+
+    def _can_start(self, user: str) -> bool:
+        """Whether a query from this user could start now."""
+        if self._active >= self._limit():
+            return False
+        return self._active_by_user[user] < config.max_queries_per_user
+
+    def _estimate_wait(self, start: float) -> float | None:
+        """Estimate how long a query with this start time would wait.
+
+        Returns
+        -------
+        float or None
+            Estimated wait in seconds, or `None` if no query has finished
+            yet to base an estimate on.
+        """
+        ahead = sum(
+            1 for ws in self._waiters.values() for w in ws if w.start <= start
+        )
+        if not ahead and self._active < self._limit():
+            return 0.0
+        if self._service_time is None:
+            return None
+        return (ahead + 1) / self._limit() * self._service_time
+
+    def _forget_idle(self) -> None:
+        """Drop the finish times of idle users that no longer matter.
+
+        A finish time no later than the virtual time has no effect on the
+        next start time of that user, so it need not be kept.
+        """
+        for user, finish in list(self._finish.items()):
+            if finish <= self._vtime and user not in self._active_by_user:
+                if user not in self._waiters:
+                    del self._finish[user]
+
+    def _limit(self) -> int:
+        """Return the current limit on running queries."""
+        if config.adaptive_concurrency:
+            return self._adaptive.limit
+        return self._concurrency
+
+    def _observe(self, duration: float) -> None:
+        """Update the moving average of query durations."""
+        if self._service_time is None:
+            self._service_time = duration
+        else:
+            self._service_time += _SERVICE_TIME_WEIGHT * (
+                duration - self._service_time
+            )
+
+    def _release(self, user: str) -> None:
+        self._active -= 1
+        self._active_by_user[user] -= 1
+        if not self._active_by_user[user]:
+            del self._active_by_user[user]
+        self._wake()
+        self._forget_idle()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Remove a waiter from the queue, if it is still queued.
+
+        A cancelled waiter may already have been dropped by `_wake` by the
+        time its task handles the cancellation, so this may be called twice
+        for the same waiter.
+        """
+        waiters = self._waiters.get(waiter.user)
+        if not waiters or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[waiter.user]
+        self._queued -= 1
+
+    def _retry_after(self) -> int:
+        """Suggest how many seconds a rejected client should wait."""
+        if self._service_time is None:
+            return 1
+        drain = self._queued / self._limit() * self._service_time
+        return max(1, math.ceil(drain))
+
+    def _start(self, user: str, start: float) -> None:
+        """Mark a query as running and advance the virtual time."""
+        self._active += 1
+        self._active_by_user[user] += 1
+        self._vtime = max(self._vtime, start)
+        if user not in self._finish or self._finish[user] < start:
+            self._finish[user] = start + 1 / config.user_weight(user)
+
+    def _wake(self) -> None:
+        while self._active < self._limit():
+            eligible = [
+                w[0]
+                for u, w in self._waiters.items()
+                if self._active_by_user[u] < config.max_queries_per_user
+            ]
+            if not eligible:
+                break
+            waiter = min(eligible, key=lambda w: (w.start, w.sequence))
+            self._remove(waiter)
+            if not waiter.future.done():
+                self._start(waiter.user, waiter.start)
+                waiter.future.set_result(None)
+
+
+class Bulkheads:
+    """Process-wide bulkheads, one per collection and lane.
+
+    Isolating collections from each other means that a collection whose
+    Butler server is slow or degraded can only use up its own slots, and
+    queries against other collections are unaffected. Within a collection,
+    queries estimated to be expensive run in a separate slow lane with its
+    own limits, so that they cannot hold up cheap interactive queries.
+    """
+
+    def __init__(self) -> None:
+        self._bulkheads: dict[tuple[str, QueryLane], Bulkhead] = {}
+
+    def get(
+        self, collection: CollectionRuntime, lane: QueryLane = QueryLane.fast
+    ) -> Bulkhead:
+        """Return the bulkhead for a collection and lane.
+
+        The bulkhead is created if needed, and its limits are updated if the
+        limits of the collection have changed.
+
+        Parameters
+        ----------
+        collection
+            Runtime state of the collection.
+        lane
+            Lane of the query.
+
+        Returns
+        -------
+        Bulkhead
+            Bulkhead for that collection and lane.
+        """
+        limits = collection.limits
+        if lane == QueryLane.slow:
+            concurrency, queue = limits.slow_concurrency, limits.slow_queue
+        else:
+            concurrency, queue = limits.concurrency, limits.queue
+        key = (collection.name, lane)
+        bulkhead = self._bulkheads.get(key)
+        if not bulkhead:
+            bulkhead = Bulkhead(concurrency, queue)
+            self._bulkheads[key] = bulkhead
+        elif bulkhead.concurrency != concurrency or bulkhead.queue != queue:
+            bulkhead.resize(concurrency, queue)
+        return bulkhead
+
+    def reset(self) -> None:
+        """Forget all bulkheads."""
+        self._bulkheads = {}
+
+    def status(
+        self, lane: QueryLane = QueryLane.fast
+    ) -> dict[str, BulkheadStatus]:
+        """Return the current state of all bulkheads for a lane.
+
+        Parameters
+        ----------
+        lane
+            Lane to report on.
+
+        Returns
+        -------
+        dict of BulkheadStatus
+            State by collection name.
+        """
+        return {
+            name: bulkhead.status()
+            for (name, bulkhead_lane), bulkhead in self._bulkheads.items()
+            if bulkhead_lane == lane
+        }
+
+
+bulkheads = Bulkheads()
+"""Process-wide bulkheads, one per collection and lane."""
@@ -1,13 +1,160 @@
 """Configuration definition."""
 
+from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Annotated, Self
 
-from pydantic import Field, HttpUrl, model_validator
+from pydantic import BaseModel, Field, HttpUrl, SecretStr, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from safir.logging import LogLevel, Profile
 from safir.metrics import MetricsConfiguration, metrics_configuration_factory
+from safir.pydantic import HumanTimedelta
 
-__all__ = ["Config", "config"]
+__all__ = ["Config", "DatasetSettings", "config", "load_config"]
+
+
+class DatasetSettings(BaseModel):
+    """Optional settings for a single dataset."""
+
+    max_concurrent_queries: Annotated[
+        int,
+        Field(
+            title="Concurrent query limit",
+            description=(
+                "Maximum number of queries against this dataset that may run"
+                " at the same time"
+            ),
+            ge=1,
+        ),
+    ] = 8
+
+    max_queued_queries: Annotated[
+        int,
+        Field(
+            title="Queued query limit",
+            description=(
+                "Maximum number of queries against this dataset that may wait"
+                " to run. Further queries are rejected"
+            ),
+            ge=0,
+        ),
+    ] = 32
+
+    max_concurrent_slow_queries: Annotated[
+        int,
+        Field(
+            title="Slow query concurrency limit",
+            description=(
+                "Maximum number of queries against this dataset that are"
+                " estimated to be expensive that may run at the same time,"
+                " separately from other queries"
+            ),
+            ge=1,
+        ),
+    ] = 2
+
+    max_queued_slow_queries: Annotated[
+        int,
+        Field(
+            title="Queued slow query limit",
+            description=(
+                "Maximum number of queries against this dataset that are"
+                " estimated to be expensive that may wait to run"
+            ),
+            ge=0,
+        ),
+    ] = 8
+
+    query_timeout: Annotated[
+        HumanTimedelta | None,
+        Field(
+            title="Query timeout",
+            description=(
+                "Deadline for queries against this dataset, if different"
+                " from the global query timeout"
+            ),
+        ),
+    ] = None
+
+    maxrec_limit: Annotated[
+        int | None,
+        Field(
+            title="MAXREC limit",
+            description=(
+                "Maximum number of records returned by a query against this"
+                " dataset, if lower than the global limit"
+            ),
+            ge=1,
+        ),
+    ] = None
+
+    default_maxrec: Annotated[
+        int | None,
+        Field(
+            title="Default MAXREC",
+            description=(
+                "Maximum number of records returned by a query against this"
+                " dataset that does not set MAXREC, while the dataset is"
+                " lightly loaded. Defaults to the MAXREC limit"
+            ),
+            ge=1,
+        ),
+    ] = None
+
+    coverage_dimension: Annotated[
+        str | None,
+        Field(
+            title="Coverage dimension",
+            description=(
+                "Butler dimension whose regions are used to build the sky"
+                " coverage of this dataset, such as visit. The regions must"
+                " contain the footprint of every data product in the"
+                " dataset, since queries outside them return no rows without"
+                " querying the Butler server. Requires a service token."
+                " Datasets with a replica use the replica instead if this is"
+                " not set"
+            ),
+        ),
+    ] = None
+
+    replica: Annotated[
+        Path | None,
+        Field(
+            title="ObsCore replica",
+            description=(
+                "Parquet snapshot of the ObsCore table of this dataset, as"
+                " written by the ObsCore exporter. If set, queries against"
+                " this dataset are answered from the snapshot in memory"
+                " instead of by the Butler server, including queries by ID,"
+                " which use an index of the dataset IDs in the snapshot."
+                " Only suitable for datasets that no longer change"
+            ),
+        ),
+    ] = None
+
+    shadow_replica: Annotated[
+        bool,
+        Field(
+            title="Use the ObsCore replica only in shadow mode",
+            description=(
+                "If true, queries against this dataset are answered by the"
+                " Butler server even if it has a replica, and the replica is"
+                " only used to run shadow queries for comparison"
+            ),
+        ),
+    ] = False
+
+    time_epochs: Annotated[
+        list[datetime],
+        Field(
+            title="Observing epoch boundaries",
+            description=(
+                "Boundaries between the observing epochs of this dataset, in"
+                " increasing order. A query whose TIME interval spans more"
+                " than one epoch is split into one sub-query per epoch"
+            ),
+        ),
+    ] = []
 
 
 class Config(BaseSettings):
@@ -15,6 +162,168 @@ class Config(BaseSettings):
 
     model_config = SettingsConfigDict(env_prefix="SIA_", case_sensitive=False)
 
+    adaptive_concurrency: Annotated[
+        bool,
+        Field(
+            title="Whether to adapt query concurrency",
+            description=(
+                "Whether to lower the number of concurrent queries against a"
+                " dataset below its configured limit when Butler query"
+                " latency rises, and raise it again when latency recovers"
+            ),
+        ),
+    ] = True
+
+    adaptive_latency_tolerance: Annotated[
+        float,
+        Field(
+            title="Adaptive concurrency latency tolerance",
+            description=(
+                "Multiple of normal Butler query latency above which the"
+                " concurrency limit of a dataset is reduced"
+            ),
+            gt=1,
+        ),
+    ] = 2.0
+
+    availability_probe_interval: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Availability probe interval",
+            description=(
+                "How frequently to check the availability of the Butler"
+                " server for each dataset in the background"
+            ),
+        ),
+    ] = timedelta(seconds=30)
+
+    availability_probe_timeout: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Availability probe timeout",
+            description=(
+                "How long to wait for the Butler server to respond to an"
+                " availability probe before considering it unavailable"
+            ),
+        ),
+    ] = timedelta(seconds=10)
+
+    bulk_batch_size: Annotated[
+        int,
+        Field(
+            title="Bulk query batch size",
+            description=(
+                "Number of uploaded positions of a bulk query whose results"
+                " are sent to the client together"
+            ),
+            ge=1,
+        ),
+    ] = 100
+
+    bulk_concurrency: Annotated[
+        int,
+        Field(
+            title="Bulk query concurrency",
+            description=(
+                "Maximum number of positions of a single bulk query to query"
+                " at the same time"
+            ),
+            ge=1,
+        ),
+    ] = 4
+
+    bulk_max_positions: Annotated[
+        int,
+        Field(
+            title="Bulk query size limit",
+            description="Maximum number of positions in a bulk query upload",
+            ge=1,
+        ),
+    ] = 10000
+
+    butler_hedge_percentile: Annotated[
+        float | None,
+        Field(
+            title="Butler hedging percentile",
+            description=(
+                "Percentile of recent Butler call latency after which a"
+                " second attempt at the same call is started, using"
+                " whichever finishes first. Disabled if not set"
+            ),
+            gt=0,
+            lt=100,
+        ),
+    ] = None
+
+    butler_retries: Annotated[
+        int,
+        Field(
+            title="Butler retries",
+            description=(
+                "Maximum number of times to retry a Butler call that failed"
+                " with a connection error or a 5xx response"
+            ),
+            ge=0,
+        ),
+    ] = 2
+
+    butler_retry_backoff: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Butler retry backoff",
+            description=(
+                "Base delay before retrying a failed Butler call, doubled for"
+                " each further retry, with random jitter"
+            ),
+        ),
+    ] = timedelta(milliseconds=500)
+
+    circuit_breaker_threshold: Annotated[
+        int,
+        Field(
+            title="Circuit breaker threshold",
+            description=(
+                "Number of consecutive failed availability probes after which"
+                " queries against a dataset are rejected immediately until a"
+                " probe succeeds again"
+            ),
+            ge=1,
+        ),
+    ] = 3
+
+    coverage_level: Annotated[
+        int,
+        Field(
+            title="Coverage HEALPix level",
+            description=(
+                "HEALPix level of the sky coverage maps of datasets. Higher"
+                " levels follow the footprints more closely but use more"
+                " memory"
+            ),
+            ge=0,
+            le=29,
+        ),
+    ] = 9
+
+    coverage_refresh_interval: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Coverage refresh interval",
+            description=(
+                "How frequently to rebuild the sky coverage maps of datasets"
+                " in the background"
+            ),
+        ),
+    ] = timedelta(hours=1)
+
+    dataset_settings: Annotated[
+        dict[str, DatasetSettings],
+        Field(
+            title="Per-dataset settings",
+            description="Mapping of dataset label to optional settings",
+        ),
+    ] = {}
+
     datasets: Annotated[
         list[str],
         Field(
@@ -26,6 +335,33 @@ class Config(BaseSettings):
         ),
     ]
 
+    dependency_threads: Annotated[
+        int,
+        Field(
+            title="Dependency threads",
+            description=(
+                "Size of the thread pool used to build Butler clients and"
+                " per-collection state"
+            ),
+            ge=1,
+        ),
+    ] = 8
+
+    id_lookup_limit: Annotated[
+        int,
+        Field(
+            title="ID lookup limit",
+            description=(
+                "Maximum number of IDs in a query that only has ID"
+                " constraints for the datasets to be looked up directly in"
+                " the Butler before the ObsCore query, so that only the"
+                " dataset types of the matching datasets are queried. Set to"
+                " 0 to disable"
+            ),
+            ge=0,
+        ),
+    ] = 10
+
     log_level: LogLevel = Field(
         LogLevel.INFO, title="Log level of the application's logger"
     )
@@ -34,12 +370,62 @@ class Config(BaseSettings):
         Profile.development, title="Application logging profile"
     )
 
+    loop_lag_threshold: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Event loop lag threshold",
+            description=(
+                "Delay in running scheduled work on the event loop above"
+                " which the lag is logged and reported as a metrics event"
+            ),
+        ),
+    ] = timedelta(milliseconds=100)
+
+    max_queries_per_user: Annotated[
+        int,
+        Field(
+            title="Per-user query limit",
+            description=(
+                "Maximum number of queries from a single user that may run"
+                " at the same time against a dataset. Further queries from"
+                " that user wait even if there are free slots"
+            ),
+            ge=1,
+        ),
+    ] = 4
+
+    max_queue_wait: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Maximum queue wait",
+            description=(
+                "Longest time a query may wait for a free slot. Queries whose"
+                " estimated wait is longer are rejected immediately, and"
+                " queries that have waited this long are rejected, in both"
+                " cases with a 503 status code and a Retry-After header"
+            ),
+        ),
+    ] = timedelta(seconds=30)
+
     metrics: MetricsConfiguration = Field(
         default_factory=metrics_configuration_factory,
         title="Metrics configuration",
         description="Configuration for reporting metrics to Kafka",
     )
 
+    min_default_maxrec: Annotated[
+        int,
+        Field(
+            title="Minimum default MAXREC",
+            description=(
+                "Maximum number of records returned by a query that does not"
+                " set MAXREC while queries against its dataset are queueing."
+                " The default shrinks towards this as load rises"
+            ),
+            ge=1,
+        ),
+    ] = 1000
+
     name: str = Field("sia", title="Name of application")
 
     obscore_config: Annotated[
@@ -52,10 +438,253 @@ class Config(BaseSettings):
 
     path_prefix: str = Field("/api/sia", title="URL prefix for application")
 
+    pos_fanout: Annotated[
+        bool,
+        Field(
+            title="Fan out multiple POS constraints",
+            description=(
+                "Whether to run a query with several POS constraints as one"
+                " Butler query per region, concurrently, and merge the results"
+            ),
+        ),
+    ] = True
+
+    pos_fanout_concurrency: Annotated[
+        int,
+        Field(
+            title="Sub-query concurrency",
+            description=(
+                "Maximum number of sub-queries of a single query, by region,"
+                " sky tile or observing epoch, to run at the same time"
+            ),
+            ge=1,
+        ),
+    ] = 4
+
+    pos_max_tiles: Annotated[
+        int,
+        Field(
+            title="Maximum tiles per region",
+            description=(
+                "Approximate maximum number of sky tiles into which a single"
+                " large POS region is split. Coarser tiles are used for"
+                " regions that would otherwise need more"
+            ),
+            ge=2,
+        ),
+    ] = 64
+
+    pos_tile_size: Annotated[
+        float | None,
+        Field(
+            title="POS tile size",
+            description=(
+                "POS regions whose bounding circle has a radius larger than"
+                " this many degrees are split into HEALPix tiles of about"
+                " this size, which are queried separately. If not set,"
+                " regions are never split"
+            ),
+            gt=0,
+        ),
+    ] = 5.0
+
+    query_threads: Annotated[
+        int,
+        Field(
+            title="Query threads",
+            description="Size of the thread pool used to run Butler queries",
+            ge=1,
+        ),
+    ] = 16
+
+    query_timeout: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Query timeout",
+            description=(
+                "Deadline for a query, including time spent waiting for a"
+                " free slot, after which it is abandoned"
+            ),
+        ),
+    ] = timedelta(minutes=5)
+
+    registry_refresh_interval: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Collection refresh interval",
+            description=(
+                "How frequently to check service discovery for changes to the"
+                " per-collection state and rebuild any that changed"
+            ),
+        ),
+    ] = timedelta(minutes=5)
+
+    serialization_threads: Annotated[
+        int,
+        Field(
+            title="Serialization threads",
+            description=(
+                "Size of the thread pool used to serialize query results"
+            ),
+            ge=1,
+        ),
+    ] = 4
+
+    service_token: Annotated[
+        SecretStr | None,
+        Field(
+            title="Service token",
+            description=(
+                "Gafaelfawr token used for Butler queries made by SIA itself"
+                " rather than on behalf of a user, such as during warm-up"
+            ),
+        ),
+    ] = None
+
+    settings_file: Annotated[
+        Path | None,
+        Field(
+            title="Settings file",
+            description=(
+                "Optional dotenv file with further settings, which is read"
+                " again when the configuration is reloaded. Environment"
+                " variables take precedence over settings in this file"
+            ),
+        ),
+    ] = None
+
+    shadow_columns: Annotated[
+        list[str],
+        Field(
+            title="Shadow comparison columns",
+            description=(
+                "ObsCore columns whose values are compared between the"
+                " primary and shadow results for each data product"
+            ),
+        ),
+    ] = [
+        "dataproduct_type",
+        "calib_level",
+        "s_ra",
+        "s_dec",
+        "t_min",
+        "t_max",
+        "em_min",
+        "em_max",
+        "access_url",
+    ]
+
+    shadow_fraction: Annotated[
+        float,
+        Field(
+            title="Shadow query fraction",
+            description=(
+                "Fraction of successful queries that are run again in the"
+                " background with an alternate query engine, to compare the"
+                " results. Zero disables shadow queries"
+            ),
+            ge=0,
+            le=1,
+        ),
+    ] = 0.0
+
+    shadow_max_pending: Annotated[
+        int,
+        Field(
+            title="Shadow query limit",
+            description=(
+                "Maximum number of shadow queries running at the same time."
+                " Further queries are not shadowed"
+            ),
+            ge=1,
+        ),
+    ] = 2
+
+    shutdown_grace_period: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Shutdown grace period",
+            description=(
+                "How long to wait on shutdown for queries in progress to"
+                " finish before releasing the resources they use"
+            ),
+        ),
+    ] = timedelta(seconds=30)
+
     slack_webhook: Annotated[
         HttpUrl | None, Field(title="Slack webhook for exception reporting")
     ] = None
 
+    slow_query_cost: Annotated[
+        float,
+        Field(
+            title="Slow query cost",
+            description=(
+                "Estimated cost, roughly the number of rows a query could"
+                " return, above which a query with no latency history runs"
+                " in the slow lane"
+            ),
+            gt=0,
+        ),
+    ] = 1000
+
+    slow_query_latency: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Slow query latency",
+            description=(
+                "Average Butler latency of similar past queries above which"
+                " a query runs in the slow lane"
+            ),
+        ),
+    ] = timedelta(seconds=10)
+
+    snapshot_path: Annotated[
+        Path | None,
+        Field(
+            title="Warm-start snapshot path",
+            description=(
+                "File in which to persist the last known service discovery"
+                " results and ObsCore exporter configurations. If set, newly"
+                " started workers serve requests from this snapshot while"
+                " revalidating it in the background"
+            ),
+        ),
+    ] = None
+
+    user_weights: Annotated[
+        dict[str, Annotated[float, Field(gt=0)]],
+        Field(
+            title="User weights",
+            description=(
+                "Mapping of username to relative share of query slots when"
+                " queries are waiting. Users not listed have a weight of 1"
+            ),
+        ),
+    ] = {}
+
+    warmup_enabled: Annotated[
+        bool,
+        Field(
+            title="Whether to pre-warm collections",
+            description=(
+                "Whether to resolve the per-collection state for every"
+                " configured dataset at startup before reporting readiness"
+            ),
+        ),
+    ] = True
+
+    warmup_timeout: Annotated[
+        HumanTimedelta,
+        Field(
+            title="Warm-up timeout",
+            description=(
+                "How long to wait for startup warm-up before reporting"
+                " readiness anyway and resolving any remaining state lazily"
+            ),
+        ),
+    ] = timedelta(minutes=2)
+
     @model_validator(mode="after")
     def _validate_obscore_config(self) -> Self:
         """Every dataset must have an ObsCore configuration."""
@@ -63,8 +692,56 @@ class Config(BaseSettings):
             if not self.obscore_config.get(dataset):
                 msg = f"No ObsCore configuration for dataset {dataset}"
                 raise ValueError(msg)
+        for dataset in self.dataset_settings:
+            if dataset not in self.datasets:
+                msg = f"Settings given for unknown dataset {dataset}"
+                raise ValueError(msg)
         return self
 
+    def settings_for(self, dataset: str) -> DatasetSettings:
+        """Return the settings for a dataset.
+
+        Parameters
+        ----------
+        dataset
+            Label of the dataset.
+
+        Returns
+        -------
+        DatasetSettings
+            Settings for that dataset, using defaults if none were given.
+        """
+        return self.dataset_settings.get(dataset) or DatasetSettings()
+
+    def user_weight(self, user: str) -> float:
+        """Return the fair queuing weight of a user.
+
+        Parameters
+        ----------
+        user
+            Username.
+
+        Returns
+        -------
+        float
+            Relative share of query slots for that user.
+        """
+        return self.user_weights.get(user, 1.0)
+
+
+def load_config() -> Config:
+    """Load the configuration from the environment and settings file.
+
+    Returns
+    -------
+    Config
+        Newly-loaded configuration.
+    """
+    settings = Config()
+    if settings.settings_file:
+        settings = Config(_env_file=settings.settings_file)
+    return settings
+
 
-config = Config()
+config = load_config()
 """Configuration instance for sia."""
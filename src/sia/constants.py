@@ -3,6 +3,7 @@
 __all__ = [
     "BASE_RESOURCE_IDENTIFIER",
     "DATALINK_VERSION",
+    "EXTRA_PARAMS",
     "RESPONSEFORMATS",
     "RESULT_NAME",
     "SINGLE_PARAMS",
@@ -22,3 +23,6 @@ RESULT_NAME = "result"
 
 SINGLE_PARAMS = {"maxrec", "responseformat"}
 """Parameters that should be treated as single values."""
+
+EXTRA_PARAMS = {"collection_name", "upload"}
+"""Form parameters of the other query routes that are not SIA parameters."""
@@ -0,0 +1,179 @@
+"""Estimate the cost of SIA queries and route them to a lane."""
+
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import StrEnum
+
+from astropy.time import Time
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+
+from .config import config
+
+__all__ = ["CostEstimator", "QueryCost", "QueryLane", "cost_estimator"]
+
+_FULL_SKY = 4 * math.pi
+"""Area of the full sky in steradians."""
+
+_TIME_BASELINE = 3652.5
+"""Width of a time range in days that counts as covering the full survey."""
+
+_INSTANT = 1.0
+"""Width in days charged for a query for a single instant."""
+
+_LATENCY_WEIGHT = 0.2
+"""Weight of the latest query in the moving average of latency."""
+
+_MAX_FINGERPRINTS = 1024
+"""Maximum number of query fingerprints whose latency is remembered."""
+
+
+class QueryLane(StrEnum):
+    """Lane in which a query runs, each with its own capacity."""
+
+    fast = "fast"
+    slow = "slow"
+
+
+@dataclass(frozen=True, slots=True)
+class QueryCost:
+    """Estimated cost of a query."""
+
+    fingerprint: str
+    """Coarse description of the query shape, used to look up history."""
+
+    score: float
+    """Heuristic cost, roughly the expected number of rows."""
+
+    latency: float | None
+    """Average Butler latency of similar queries in seconds, if known."""
+
+    lane: QueryLane
+    """Lane in which the query should run."""
+
+
+class CostEstimator:
+    """Estimate the cost of queries and choose their lane.
+
+    Queries are reduced to a fingerprint made up of the collection, the
+    set of constrained parameters, and the order of magnitude of the search
+    area, time range, and MAXREC. A moving average of Butler latency is kept
+    for recently seen fingerprints. Queries whose fingerprint has history go
+    to the slow lane if that latency exceeds the configured threshold.
+
+    Otherwise, the query is scored from its parameters: MAXREC scaled by the
+    fraction of the sky covered by its regions and by the fraction of the
+    survey covered by its time ranges, which approximates the number of rows
+    it could return. Queries scoring above the configured threshold go to
+    the slow lane. Queries with ``MAXREC=0`` or that look up data products
+    by ID are always cheap.
+    """
+
+    def __init__(self) -> None:
+        self._latency: OrderedDict[str, float] = OrderedDict()
+
+    def estimate(self, collection: str, params: SIAv2Parameters) -> QueryCost:
+        """Estimate the cost of a query.
+
+        Parameters
+        ----------
+        collection
+            Name of the collection being queried.
+        params
+            Parsed query parameters, with MAXREC already capped to the limit
+            for the collection. A missing MAXREC is treated as unlimited.
+
+        Returns
+        -------
+        QueryCost
+            Estimated cost of the query.
+        """
+        area = self._area_fraction(params)
+        width = self._time_fraction(params)
+        maxrec = math.inf if params.maxrec is None else params.maxrec
+        fingerprint = self._fingerprint(collection, params, area, width)
+        latency = self._latency.get(fingerprint)
+
+        if maxrec == 0 or params.id:
+            score = 0.0
+            lane = QueryLane.fast
+        else:
+            score = maxrec * area * width
+            if latency is not None:
+                threshold = config.slow_query_latency.total_seconds()
+                slow = latency > threshold
+            else:
+                slow = score > config.slow_query_cost
+            lane = QueryLane.slow if slow else QueryLane.fast
+        return QueryCost(
+            fingerprint=fingerprint, score=score, latency=latency, lane=lane
+        )
+
+    def observe(self, cost: QueryCost, latency: float) -> None:
+        """Record the Butler latency of a completed query.
+
+        Parameters
+        ----------
+        cost
+            Estimated cost of the query, from `estimate`.
+        latency
+            Time spent in the Butler query in seconds.
+        """
+        previous = self._latency.pop(cost.fingerprint, None)
+        if previous is not None:
+            latency = previous + _LATENCY_WEIGHT * (latency - previous)
+        self._latency[cost.fingerprint] = latency
+        if len(self._latency) > _MAX_FINGERPRINTS:
+            self._latency.popitem(last=False)
+
+    def reset(self) -> None:
+        """Forget all latency history."""
+        self._latency = OrderedDict()
+
+    @staticmethod
+    def _area_fraction(params: SIAv2Parameters) -> float:
+        """Return the fraction of the sky covered by the query regions."""
+        if not params.pos:
+            return 1.0
+        area = sum(r.getBoundingCircle().getArea() for r in params.pos)
+        return min(1.0, area / _FULL_SKY)
+
+    @staticmethod
+    def _time_fraction(params: SIAv2Parameters) -> float:
+        """Return the fraction of the survey covered by the time ranges."""
+        if not params.time:
+            return 1.0
+        width = 0.0
+        for interval in params.time:
+            if isinstance(interval, Time):
+                width += _INSTANT
+            elif interval.isEmpty():
+                continue
+            elif isinstance(interval.begin, Time) and isinstance(
+                interval.end, Time
+            ):
+                days = (interval.end - interval.begin).to_value("day")
+                width += max(_INSTANT, days)
+            else:
+                return 1.0
+        return min(1.0, width / _TIME_BASELINE)
+
+    @staticmethod
+    def _fingerprint(
+        collection: str, params: SIAv2Parameters, area: float, width: float
+    ) -> str:
+        """Reduce a query to a coarse description of its shape."""
+        fields = sorted(k for k, v in params if k != "maxrec" and v)
+        if params.maxrec is None:
+            maxrec = "all"
+        else:
+            maxrec = str(round(math.log10(params.maxrec + 1)))
+        area_bucket = str(round(math.log2(area))) if area > 0 else "none"
+        width_bucket = str(round(math.log2(width))) if width > 0 else "none"
+        return "/".join(
+            (collection, ",".join(fields), area_bucket, width_bucket, maxrec)
+        )
+
+
+cost_estimator = CostEstimator()
+"""Process-wide query cost estimator."""
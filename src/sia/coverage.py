@@ -0,0 +1,211 @@
+"""Multi-order coverage maps of the sky footprint of collections."""
+
+import math
+from collections import defaultdict
+from collections.abc import Iterator
+from typing import Self
+
+import hpgeom
+import numpy as np
+from lsst.sphgeom import HealpixPixelization, Region
+
+__all__ = ["Coverage"]
+
+_PIXEL_SIZE_DEGREES = 58.6
+"""Approximate size of a HEALPix pixel at level 0, in degrees."""
+
+_QUERY_PIXELS_PER_RADIUS = 4
+"""Minimum number of pixels across the radius of a region being checked."""
+
+_CHUNK_SIZE = 100_000
+"""Number of footprints whose pixels are merged together while building."""
+
+
+class Coverage:
+    """Sky coverage of a collection as sorted ranges of HEALPix pixels.
+
+    The coverage is held as the disjoint ranges of nested HEALPix pixel
+    indices, at a single level, that contain the footprint of any data
+    product in the collection. Coverage is always conservative: pixels are
+    included if they may overlap a footprint, so a region that does not
+    overlap the coverage cannot match any data product.
+
+    Parameters
+    ----------
+    level
+        HEALPix level of the pixel indices.
+    ranges
+        Array of shape ``(n, 2)`` of the start and end, exclusive, of each
+        range of pixel indices. The ranges must be sorted, disjoint and not
+        adjacent to each other.
+    """
+
+    def __init__(self, level: int, ranges: np.ndarray) -> None:
+        self.level = level
+        self._ranges = ranges.astype(np.uint64).reshape(-1, 2)
+
+    @classmethod
+    def from_circles(
+        cls,
+        ra: np.ndarray,
+        dec: np.ndarray,
+        radius: np.ndarray,
+        level: int,
+    ) -> Self:
+        """Build the coverage of a set of circular footprints.
+
+        This is CPU-bound and therefore should not be called from the main
+        event loop thread.
+
+        Parameters
+        ----------
+        ra
+            Right ascension of the center of each footprint, in degrees.
+        dec
+            Declination of the center of each footprint, in degrees.
+        radius
+            Radius of each footprint, in degrees. Missing radii are treated
+            as zero.
+        level
+            HEALPix level of the coverage.
+
+        Returns
+        -------
+        Coverage
+            Coverage of the footprints. Footprints without a center are
+            ignored, since no POS constraint can match them.
+        """
+        radius = np.clip(np.nan_to_num(radius), 0, 180)
+        circles = np.column_stack((ra, dec, radius))
+        circles = circles[np.isfinite(circles).all(axis=1)]
+        circles = np.unique(circles, axis=0)
+
+        nside = hpgeom.order_to_nside(level)
+        pixels = np.empty(0, dtype=np.int64)
+        for start in range(0, len(circles), _CHUNK_SIZE):
+            chunk = [
+                hpgeom.query_circle(nside, a, b, r, inclusive=True)
+                for a, b, r in circles[start : start + _CHUNK_SIZE]
+            ]
+            pixels = np.unique(np.concatenate([pixels, *chunk]))
+        return cls.from_pixels(level, pixels)
+
+    @classmethod
+    def from_pixels(cls, level: int, pixels: np.ndarray) -> Self:
+        """Build the coverage of a set of pixels.
+
+        Parameters
+        ----------
+        level
+            HEALPix level of the pixels.
+        pixels
+            Nested pixel indices, in any order and possibly repeated.
+
+        Returns
+        -------
+        Coverage
+            Coverage of the pixels.
+        """
+        pixels = np.unique(pixels).astype(np.uint64)
+        if not len(pixels):
+            return cls(level, np.empty((0, 2), dtype=np.uint64))
+        breaks = np.flatnonzero(np.diff(pixels) != 1) + 1
+        starts = pixels[np.concatenate(([0], breaks))]
+        ends = pixels[np.concatenate((breaks - 1, [len(pixels) - 1]))] + 1
+        return cls(level, np.column_stack((starts, ends)))
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    @property
+    def sky_fraction(self) -> float:
+        """Fraction of the sky covered."""
+        pixels = int(np.sum(self._ranges[:, 1] - self._ranges[:, 0]))
+        return pixels / (12 * 4**self.level)
+
+    def overlaps(self, region: Region) -> bool:
+        """Check whether a region may overlap the coverage.
+
+        Large regions are checked at a coarser level than the coverage, so
+        that checking stays cheap, which may find overlaps that do not exist
+        but never misses one.
+
+        Parameters
+        ----------
+        region
+            Region to check.
+
+        Returns
+        -------
+        bool
+            `False` if the region does not overlap the coverage.
+        """
+        radius = region.getBoundingCircle().getOpeningAngle().asDegrees()
+        level = self.level
+        if radius > 0:
+            pixels = _QUERY_PIXELS_PER_RADIUS * _PIXEL_SIZE_DEGREES / radius
+            level = min(level, max(0, math.floor(math.log2(pixels))))
+        envelope = HealpixPixelization(level).envelope(region)
+        query = np.array(list(envelope), dtype=np.uint64).reshape(-1, 2)
+
+        # Coarsen the coverage to the level of the envelope. The ranges may
+        # then touch or overlap each other, but stay sorted by both start and
+        # end, so the first range ending after the start of each range of the
+        # envelope is the only one that can overlap it.
+        shift = np.uint64(2 * (self.level - level))
+        starts = self._ranges[:, 0] >> shift
+        ends = ((self._ranges[:, 1] - np.uint64(1)) >> shift) + np.uint64(1)
+        index = np.searchsorted(ends, query[:, 0], side="right")
+        found = index < len(ends)
+        return bool(np.any(starts[index[found]] < query[found, 1]))
+
+    def to_ascii(self) -> str:
+        """Serialize the coverage as an IVOA MOC in ASCII format.
+
+        Returns
+        -------
+        str
+            Coverage in the ASCII serialization of MOC 2.0, normalized so
+            that each pixel is given at the lowest level possible.
+        """
+        cells: defaultdict[int, list[int]] = defaultdict(list)
+        for start, end in self._ranges.tolist():
+            for order, cell in _decompose(start, end, self.level):
+                cells[order].append(cell)
+
+        orders = [f"{o}/{_compress(cells[o])}" for o in sorted(cells)]
+        if self.level not in cells:
+            orders.append(f"{self.level}/")
+        return " ".join(orders)
+
+
+def _decompose(start: int, end: int, level: int) -> Iterator[tuple[int, int]]:
+    """Split a range of pixels into the fewest cells of any level.
+
+    Yields the level and index of each cell, in order.
+    """
+    while start < end:
+        order = level
+        while order > 0:
+            size = 4 ** (level - order + 1)
+            if start % size or start + size > end:
+                break
+            order -= 1
+        yield order, start >> 2 * (level - order)
+        start += 4 ** (level - order)
+
+
+def _compress(cells: list[int]) -> str:
+    """Format sorted cell indices, joining consecutive ones into ranges."""
+    tokens = []
+    first = previous = cells[0]
+    for cell in [*cells[1:], None]:
+        if cell is not None and cell == previous + 1:
+            previous = cell
+            continue
+        tokens.append(
+            str(first) if first == previous else f"{first}-{previous}"
+        )
+        if cell is not None:
+            first = previous = cell
+    return " ".join(tokens)
@@ -11,17 +11,18 @@ from typing import Annotated, Any
 
 from fastapi import Depends, Request
 from lsst.daf.butler import Butler
-from lsst.dax.obscore import ExporterConfig
 from safir.dependencies.gafaelfawr import auth_logger_dependency
 from safir.metrics import EventManager
 from structlog.stdlib import BoundLogger
 
+from ..bulkhead import bulkheads
+from ..cost import cost_estimator
 from ..events import Events
 from ..factory import Factory
-from ..models.data_collections import ButlerDataCollection
+from ..health import health_tracker
+from ..registry import CollectionRuntime, collection_registry
 from .butler import butler_dependency
-from .data_collections import validate_collection
-from .obscore_configs import obscore_config_dependency
+from .data_collections import collection_dependency
 
 __all__ = [
     "ContextDependency",
@@ -46,8 +47,8 @@ class RequestContext:
     factory: Factory
     """The component factory."""
 
-    collection: ButlerDataCollection
-    """Name of the Butler collection specified in the request."""
+    collection: CollectionRuntime
+    """Runtime state of the collection specified in the request."""
 
     logger: BoundLogger
     """The request logger, rebound with discovered context."""
@@ -81,23 +82,13 @@ class ContextDependency:
         *,
         request: Request,
         collection: Annotated[
-            ButlerDataCollection, Depends(validate_collection)
+            CollectionRuntime, Depends(collection_dependency)
         ],
         butler: Annotated[Butler, Depends(butler_dependency)],
-        obscore_config: Annotated[
-            ExporterConfig, Depends(obscore_config_dependency)
-        ],
         logger: Annotated[BoundLogger, Depends(auth_logger_dependency)],
     ) -> RequestContext:
         """Create a per-request context and return it."""
-        if not self._events:
-            raise RuntimeError("ContextDependency not initialized")
-        factory = Factory(
-            butler=butler,
-            obscore_config=obscore_config,
-            events=self._events,
-            logger=logger,
-        )
+        factory = self.create_factory(collection, butler, logger)
         return RequestContext(
             request=request,
             factory=factory,
@@ -105,6 +96,50 @@ class ContextDependency:
             logger=logger,
         )
 
+    def create_factory(
+        self,
+        collection: CollectionRuntime,
+        butler: Butler,
+        logger: BoundLogger,
+    ) -> Factory:
+        """Create a component factory for a collection.
+
+        Used directly by handlers that work with more than one collection.
+
+        Parameters
+        ----------
+        collection
+            Runtime state of the collection.
+        butler
+            Butler for the collection.
+        logger
+            Logger to use.
+
+        Returns
+        -------
+        Factory
+            Newly-created factory.
+        """
+        if not self._events:
+            raise RuntimeError("ContextDependency not initialized")
+        return Factory(
+            butler=butler,
+            collection=collection,
+            registry=collection_registry,
+            health=health_tracker,
+            bulkheads=bulkheads,
+            costs=cost_estimator,
+            events=self._events,
+            logger=logger,
+        )
+
+    @property
+    def events(self) -> Events:
+        """Metrics events publishers, once initialized."""
+        if not self._events:
+            raise RuntimeError("ContextDependency not initialized")
+        return self._events
+
     async def initialize(self, event_manager: EventManager) -> None:
         """Initialize the process-wide shared context.
 
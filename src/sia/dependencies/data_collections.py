@@ -1,29 +1,95 @@
 """Data collection dependencies."""
 
+import asyncio
+from typing import Annotated
+
+from fastapi import Depends, Query, Request
+from rubin.repertoire import DiscoveryClient, discovery_dependency
+
 from ..config import config
 from ..exceptions import UsageFaultError
-from ..models.data_collections import ButlerDataCollection
+from ..registry import CollectionRuntime, collection_registry
+
+__all__ = ["collection_dependency", "collections_dependency"]
 
 
-def validate_collection(collection_name: str) -> ButlerDataCollection:
-    """Validate the collection name and return the Butler data collection.
+async def collection_dependency(
+    collection_name: str,
+    discovery: Annotated[DiscoveryClient, Depends(discovery_dependency)],
+) -> CollectionRuntime:
+    """Look up the runtime state for the collection named in the path.
 
     Parameters
     ----------
     collection_name
         Name of the collection.
+    discovery
+        Service discovery client, used only if the collection's state has not
+        yet been built.
 
     Returns
     -------
-    ButlerDataCollection
-        Metadata for the Butler data collection.
+    CollectionRuntime
+        Runtime state for the collection.
 
     Raises
     ------
     UsageFaultError
         Raised if the collection is not found.
     """
-    if collection_name not in config.datasets:
-        raise UsageFaultError(f"Collection '{collection_name}' not found", 404)
-    obscore_config = config.obscore_config[collection_name]
-    return ButlerDataCollection(config=obscore_config, name=collection_name)
+    return await collection_registry.resolve(collection_name, discovery)
+
+
+async def collections_dependency(
+    *,
+    request: Request,
+    collection_name: Annotated[
+        list[str] | None,
+        Query(
+            title="Collections",
+            description=(
+                "Names of the collections to query. May be repeated. If not"
+                " given, all collections are queried"
+            ),
+            examples=["dp02"],
+        ),
+    ] = None,
+    discovery: Annotated[DiscoveryClient, Depends(discovery_dependency)],
+) -> list[CollectionRuntime]:
+    """Look up the runtime state for the collections of a federated query.
+
+    For POST requests, the collections are taken from the form data instead
+    of the query string.
+
+    Parameters
+    ----------
+    request
+        Incoming request.
+    collection_name
+        Names of the collections from the query string, if any.
+    discovery
+        Service discovery client, used only if a collection's state has not
+        yet been built.
+
+    Returns
+    -------
+    list of CollectionRuntime
+        Runtime state for each collection, without duplicates.
+
+    Raises
+    ------
+    UsageFaultError
+        Raised if a collection is not found.
+    """
+    names = collection_name
+    if request.method == "POST":
+        form = await request.form()
+        names = [str(v) for v in form.getlist("collection_name")]
+    names = list(dict.fromkeys(names or config.datasets))
+    if not names:
+        raise UsageFaultError("No collections to query")
+    return list(
+        await asyncio.gather(
+            *(collection_registry.resolve(n, discovery) for n in names)
+        )
+    )
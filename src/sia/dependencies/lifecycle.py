@@ -0,0 +1,23 @@
+"""Tracking of in-flight query requests."""
+
+from collections.abc import AsyncIterator
+
+from ..exceptions import TransientFaultError
+from ..lifecycle import lifecycle
+
+__all__ = ["in_flight_dependency"]
+
+
+async def in_flight_dependency() -> AsyncIterator[None]:
+    """Reject queries while draining and track the rest as in flight.
+
+    Raises
+    ------
+    TransientFaultError
+        Raised if the worker is shutting down.
+    """
+    if lifecycle.draining:
+        msg = "Service is shutting down, try again later"
+        raise TransientFaultError(msg, 503, {"Retry-After": "1"})
+    with lifecycle.track():
+        yield
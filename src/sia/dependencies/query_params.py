@@ -5,7 +5,7 @@ from typing import Annotated
 
 from fastapi import Depends, Request
 
-from ..constants import SINGLE_PARAMS
+from ..constants import EXTRA_PARAMS, SINGLE_PARAMS
 from ..models.sia_query_params import SIAQueryParams
 
 
@@ -19,10 +19,14 @@ async def get_sia_params_dependency(
     if request.method == "POST":
         post_params_ddict: dict[str, list[str]] = defaultdict(list)
 
+        # Multipart forms, used for uploads, are not lowercased by the
+        # middleware.
         for key, value in (await request.form()).multi_items():
+            if key.lower() in EXTRA_PARAMS:
+                continue
             if not isinstance(value, str):
                 raise TypeError("File upload not supported")
-            post_params_ddict[key].append(value)
+            post_params_ddict[key.lower()].append(value)
 
         post_params = {
             key: (values[0] if key in SINGLE_PARAMS and values else values)
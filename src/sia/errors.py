@@ -73,6 +73,8 @@ async def votable_exception_handler(
         media_type="application/xml",
     )
     response.status_code = exc.status_code
+    if exc.headers:
+        response.headers.update(exc.headers)
     return response
 
 
@@ -12,6 +12,7 @@ class SIAQuerySucceeded(EventPayload):
 
     duration: timedelta
     username: str
+    query_wait: timedelta | None = None
 
 
 class SIAQueryFailed(EventPayload):
@@ -22,6 +23,64 @@ class SIAQueryFailed(EventPayload):
     error: str | None = None
 
 
+class SIAQueryCancelled(EventPayload):
+    """Reported when a SIA query is abandoned before it finishes.
+
+    The reason is either ``deadline`` or ``disconnect``, and the phase is the
+    one the query was in when abandoned: ``queued``, ``query``, or
+    ``serialization``. The saved time is the average query duration minus
+    the time already spent, if known.
+    """
+
+    username: str
+    reason: str
+    phase: str
+    elapsed: timedelta
+    saved: timedelta | None = None
+
+
+class SIAConcurrencyLimitChanged(EventPayload):
+    """Reported when the adaptive concurrency limit of a collection changes."""
+
+    collection: str
+    limit: int
+    latency: timedelta
+
+
+class SIAEventLoopLag(EventPayload):
+    """Reported when the event loop falls behind by more than the threshold.
+
+    The lag is how late the event loop ran a scheduled callback, and the
+    in-flight count is the number of HTTP requests being handled then.
+    """
+
+    lag: timedelta
+    in_flight: int
+
+
+class SIAShadowQueryCompared(EventPayload):
+    """Reported when a shadow query finishes and is compared to the primary.
+
+    The engines are ``butler`` for a single Butler query, ``split`` for a
+    Butler query split into sub-queries, or ``replica`` for a query answered
+    from a local ObsCore replica. Missing rows are those only in the primary
+    result, extra rows are those only in the shadow result, and mismatched
+    rows are those in both whose compared columns differ. If either result
+    was cut at MAXREC, only rows in both are compared.
+    """
+
+    collection: str
+    primary_engine: str
+    shadow_engine: str
+    matches: bool
+    missing: int
+    extra: int
+    mismatched: int
+    truncated: bool
+    primary_duration: timedelta
+    shadow_duration: timedelta
+
+
 class Events(EventMaker):
     """Container for app metrics event publishers."""
 
@@ -33,3 +92,15 @@ class Events(EventMaker):
         self.sia_query_failed = await manager.create_publisher(
             "sia_query_failed", SIAQueryFailed
         )
+        self.sia_query_cancelled = await manager.create_publisher(
+            "sia_query_cancelled", SIAQueryCancelled
+        )
+        self.sia_concurrency_limit_changed = await manager.create_publisher(
+            "sia_concurrency_limit_changed", SIAConcurrencyLimitChanged
+        )
+        self.sia_event_loop_lag = await manager.create_publisher(
+            "sia_event_loop_lag", SIAEventLoopLag
+        )
+        self.sia_shadow_query_compared = await manager.create_publisher(
+            "sia_shadow_query_compared", SIAShadowQueryCompared
+        )
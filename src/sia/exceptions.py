@@ -2,6 +2,7 @@
 VOTAble.
 """
 
+from collections.abc import Mapping
 from pathlib import Path
 from typing import override
 
@@ -20,9 +21,14 @@ class VOTableError(HTTPException):
     """Exception for VOTable errors."""
 
     def __init__(
-        self, detail: str = "Uknown error occured", status_code: int = 400
+        self,
+        detail: str = "Uknown error occured",
+        status_code: int = 400,
+        headers: Mapping[str, str] | None = None,
     ) -> None:
-        super().__init__(detail=detail, status_code=status_code)
+        super().__init__(
+            detail=detail, status_code=status_code, headers=headers
+        )
 
     @override
     def __str__(self) -> str:
@@ -38,14 +44,21 @@ class UsageFaultError(VOTableError):
         The error message.
     status_code
         The status code for the exception
+    headers
+        Additional headers to send with the error response
     """
 
     def __init__(
-        self, detail: str = "Invalid input", status_code: int = 400
+        self,
+        detail: str = "Invalid input",
+        status_code: int = 400,
+        headers: Mapping[str, str] | None = None,
     ) -> None:
         self.detail = f"UsageFault: {detail}"
         self.status_code = status_code
-        super().__init__(detail=self.detail, status_code=self.status_code)
+        super().__init__(
+            detail=self.detail, status_code=self.status_code, headers=headers
+        )
 
 
 class TransientFaultError(VOTableError):
@@ -57,16 +70,21 @@ class TransientFaultError(VOTableError):
         The error message.
     status_code
         The status code for the exception
+    headers
+        Additional headers to send with the error response
     """
 
     def __init__(
         self,
         detail: str = "Service is not currently able to function",
         status_code: int = 400,
+        headers: Mapping[str, str] | None = None,
     ) -> None:
         self.detail = f"TransientFault: {detail}"
         self.status_code = status_code
-        super().__init__(detail=self.detail, status_code=self.status_code)
+        super().__init__(
+            detail=self.detail, status_code=self.status_code, headers=headers
+        )
 
 
 class FatalFaultError(VOTableError):
@@ -78,16 +96,21 @@ class FatalFaultError(VOTableError):
         The error message.
     status_code
         The status code for the exception
+    headers
+        Additional headers to send with the error response
     """
 
     def __init__(
         self,
         detail: str = "Service cannot perform requested action",
         status_code: int = 400,
+        headers: Mapping[str, str] | None = None,
     ) -> None:
         self.detail = f"FatalFault: {detail}"
         self.status_code = status_code
-        super().__init__(detail=self.detail, status_code=self.status_code)
+        super().__init__(
+            detail=self.detail, status_code=self.status_code, headers=headers
+        )
 
 
 class DefaultFaultError(VOTableError):
@@ -99,11 +122,18 @@ class DefaultFaultError(VOTableError):
         The error message.
     status_code
         The status code for the exception
+    headers
+        Additional headers to send with the error response
     """
 
     def __init__(
-        self, detail: str = "General error", status_code: int = 400
+        self,
+        detail: str = "General error",
+        status_code: int = 400,
+        headers: Mapping[str, str] | None = None,
     ) -> None:
         self.detail = f"DefaultFault: {detail}"
         self.status_code = status_code
-        super().__init__(detail=self.detail, status_code=self.status_code)
+        super().__init__(
+            detail=self.detail, status_code=self.status_code, headers=headers
+        )
@@ -0,0 +1,214 @@
+"""Bounded thread pools for blocking work, with saturation statistics."""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from .config import config
+from .models.status import ExecutorStatus
+
+__all__ = ["Executors", "InstrumentedExecutor", "executors"]
+
+
+class InstrumentedExecutor:
+    """Thread pool that tracks its queue depth and queue wait time.
+
+    The underlying thread pool is created on first use and discarded on
+    shutdown, so the executor can be used again after a shutdown.
+
+    Parameters
+    ----------
+    name
+        Name of the executor, used as the thread name prefix.
+    max_workers
+        Function returning the number of threads to use, called whenever the
+        thread pool is created.
+    """
+
+    def __init__(self, name: str, max_workers: Callable[[], int]) -> None:
+        self._name = name
+        self._max_workers = max_workers
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def name(self) -> str:
+        """Name of the executor."""
+        return self._name
+
+    async def run[**P, T](
+        self, func: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        """Run a blocking function in the thread pool.
+
+        Like `asyncio.to_thread`, the current context variables are
+        propagated to the thread.
+
+        Parameters
+        ----------
+        func
+            Function to run.
+        *args
+            Positional arguments to the function.
+        **kwargs
+            Keyword arguments to the function.
+
+        Returns
+        -------
+        T
+            Return value of the function.
+        """
+        result, _ = await self.run_timed(func, *args, **kwargs)
+        return result
+
+    async def run_timed[**P, T](
+        self, func: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> tuple[T, timedelta]:
+        """Run a blocking function and report how long it was queued.
+
+        Parameters
+        ----------
+        func
+            Function to run.
+        *args
+            Positional arguments to the function.
+        **kwargs
+            Keyword arguments to the function.
+
+        Returns
+        -------
+        tuple of T and datetime.timedelta
+            Return value of the function and the time spent waiting for a
+            free thread before it started.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+        wait = 0.0
+        started = False
+        abandoned = False
+
+        def call() -> T:
+            nonlocal wait, started
+            wait = time.perf_counter() - submitted
+            with self._lock:
+                started = True
+                if not abandoned:
+                    self._queued -= 1
+                self._active += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            try:
+                return context.run(partial(func, *args, **kwargs))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        with self._lock:
+            self._queued += 1
+        try:
+            result = await loop.run_in_executor(self._get_pool(), call)
+        except BaseException:
+            # If the call has not started, it is no longer queued.
+            with self._lock:
+                if not started:
+                    abandoned = True
+                    self._queued -= 1
+            raise
+        return result, timedelta(seconds=wait)
+
+    def shutdown(self) -> None:
+        """Shut down the thread pool without waiting for running calls."""
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def status(self) -> ExecutorStatus:
+        """Return the current statistics of the executor.
+
+        Returns
+        -------
+        ExecutorStatus
+            Queue depth, activity, and queue wait time statistics.
+        """
+        with self._lock:
+            completed = self._completed
+            mean = self._wait_total / completed if completed else 0.0
+            return ExecutorStatus(
+                max_workers=self._max_workers(),
+                active=self._active,
+                queued=self._queued,
+                completed=completed,
+                wait_mean_seconds=mean,
+                wait_max_seconds=self._wait_max,
+            )
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Return the thread pool, creating it if needed."""
+        with self._lock:
+            if not self._pool:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self._max_workers(),
+                    thread_name_prefix=f"sia-{self._name}",
+                )
+            return self._pool
+
+
+class Executors:
+    """Process-wide thread pools, separated by the kind of work they do.
+
+    Keeping slow Butler queries in their own pool prevents them from
+    starving serialization of results and resolution of request
+    dependencies, which would otherwise share the default executor.
+    """
+
+    def __init__(self) -> None:
+        self.query = InstrumentedExecutor(
+            "query", lambda: config.query_threads
+        )
+        """Executor for Butler queries."""
+
+        self.serialization = InstrumentedExecutor(
+            "serialization", lambda: config.serialization_threads
+        )
+        """Executor for serializing query results."""
+
+        self.dependency = InstrumentedExecutor(
+            "dependency", lambda: config.dependency_threads
+        )
+        """Executor for building Butler clients and per-collection state."""
+
+    def shutdown(self) -> None:
+        """Shut down all thread pools."""
+        for executor in self._all():
+            executor.shutdown()
+
+    def status(self) -> dict[str, ExecutorStatus]:
+        """Return the current statistics of all executors.
+
+        Returns
+        -------
+        dict of ExecutorStatus
+            Statistics by executor name.
+        """
+        return {e.name: e.status() for e in self._all()}
+
+    def _all(self) -> list[InstrumentedExecutor]:
+        return [self.query, self.serialization, self.dependency]
+
+
+executors = Executors()
+"""Process-wide thread pools for blocking work."""
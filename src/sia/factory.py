@@ -1,10 +1,14 @@
 """Component factory for SIA."""
 
 from lsst.daf.butler import Butler
-from lsst.dax.obscore import ExporterConfig
 from structlog.stdlib import BoundLogger
 
+from .bulkhead import Bulkheads
+from .cost import CostEstimator
 from .events import Events
+from .health import HealthTracker
+from .registry import CollectionRegistry, CollectionRuntime
+from .services.bulk import BulkQueryService
 from .services.description import SelfDescriptionService
 from .services.query import QueryService
 
@@ -23,8 +27,16 @@ class Factory:
     ----------
     butler
         Remote Butler client for the relevant collection.
-    obscore_config
-        ObsCore exporter configuration for the relevant collection.
+    collection
+        Runtime state of the relevant collection.
+    registry
+        Registry of per-collection runtime state.
+    health
+        Record of the health of each collection.
+    bulkheads
+        Per-collection limits on concurrent queries.
+    costs
+        Query cost estimator.
     events
         Events publishers.
     logger
@@ -35,15 +47,33 @@ class Factory:
         self,
         *,
         butler: Butler,
-        obscore_config: ExporterConfig,
+        collection: CollectionRuntime,
+        registry: CollectionRegistry,
+        health: HealthTracker,
+        bulkheads: Bulkheads,
+        costs: CostEstimator,
         events: Events,
         logger: BoundLogger,
     ) -> None:
         self._butler = butler
-        self._obscore_config = obscore_config
+        self._collection = collection
+        self._registry = registry
+        self._health = health
+        self._bulkheads = bulkheads
+        self._costs = costs
         self._events = events
         self._logger = logger
 
+    def create_bulk_query_service(self) -> BulkQueryService:
+        """Create the service that executes bulk multi-position SIA queries.
+
+        Returns
+        -------
+        BulkQueryService
+            Newly-created service.
+        """
+        return BulkQueryService(self.create_query_service, self._logger)
+
     def create_query_service(self) -> QueryService:
         """Create the service that executes SIA queries.
 
@@ -54,7 +84,10 @@ class Factory:
         """
         return QueryService(
             butler=self._butler,
-            obscore_config=self._obscore_config,
+            collection=self._collection,
+            health=self._health,
+            bulkheads=self._bulkheads,
+            costs=self._costs,
             events=self._events,
             logger=self._logger,
         )
@@ -67,7 +100,9 @@ class Factory:
         SelfDescriptionService
             Newly-created service.
         """
-        return SelfDescriptionService(self._butler, self._obscore_config)
+        return SelfDescriptionService(
+            self._butler, self._collection, self._registry, self._logger
+        )
 
     def set_logger(self, logger: BoundLogger) -> None:
         """Replace the internal logger.
@@ -1,12 +1,18 @@
 """Handlers for the app's external root, ``/api/sia/``."""
 
+import asyncio
 from pathlib import Path
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Request, Response
+from fastapi import APIRouter, Depends, File, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
 from httpx import AsyncClient
-from safir.dependencies.gafaelfawr import auth_dependency
+from safir.dependencies.gafaelfawr import (
+    auth_delegated_token_dependency,
+    auth_dependency,
+    auth_logger_dependency,
+)
 from safir.dependencies.http_client import http_client_dependency
 from safir.dependencies.logger import logger_dependency
 from safir.metadata import get_metadata
@@ -17,14 +23,23 @@ from vo_models.vosi.capabilities.models import VOSICapabilities
 
 from ..config import config
 from ..constants import RESULT_NAME
-from ..dependencies.butler import butler_factory_dependency
+from ..dependencies.butler import create_butler
 from ..dependencies.context import RequestContext, context_dependency
-from ..dependencies.data_collections import validate_collection
+from ..dependencies.data_collections import (
+    collection_dependency,
+    collections_dependency,
+)
+from ..dependencies.lifecycle import in_flight_dependency
 from ..dependencies.query_params import get_sia_params_dependency
-from ..models.data_collections import ButlerDataCollection
+from ..exceptions import TransientFaultError
+from ..executors import executors
+from ..health import health_tracker
 from ..models.index import Index
 from ..models.sia_query_params import SIAQueryParams
+from ..registry import CollectionRuntime
 from ..services.availability import AvailabilityService
+from ..services.federation import FederatedQueryService
+from ..upload import parse_cones, read_upload
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 _TEMPLATES = Jinja2Templates(directory=str(Path(BASE_DIR, "templates")))
@@ -70,6 +85,73 @@ async def get_index(
     return Index(metadata=metadata)
 
 
+@external_router.get(
+    "/query",
+    description=(
+        "Query endpoint for the SIA service that searches several collections"
+        " at once."
+    ),
+    responses={
+        200: {"content": {"application/xml": {}}},
+        400: {
+            "description": "Invalid query parameters",
+            "model": ErrorModel,
+        },
+    },
+    summary="IVOA SIA service query of several collections",
+    dependencies=[Depends(in_flight_dependency)],
+)
+@external_router.post(
+    "/query",
+    description=(
+        "Query endpoint for the SIA service that searches several collections"
+        " at once (POST method)."
+    ),
+    responses={
+        200: {"content": {"application/xml": {}}},
+        400: {
+            "description": "Invalid query parameters",
+            "model": ErrorModel,
+        },
+    },
+    summary="IVOA SIA (v2) service query of several collections (POST)",
+    dependencies=[Depends(in_flight_dependency)],
+)
+async def federated_query(
+    *,
+    params: Annotated[SIAQueryParams, Depends(get_sia_params_dependency)],
+    collections: Annotated[
+        list[CollectionRuntime], Depends(collections_dependency)
+    ],
+    user: Annotated[str, Depends(auth_dependency)],
+    token: Annotated[str, Depends(auth_delegated_token_dependency)],
+    request: Request,
+    logger: Annotated[BoundLogger, Depends(auth_logger_dependency)],
+) -> Response:
+    butlers = await asyncio.gather(
+        *(create_butler(c, token) for c in collections)
+    )
+    services = {
+        c.name: context_dependency.create_factory(
+            c, butler, logger
+        ).create_query_service()
+        for c, butler in zip(collections, butlers, strict=True)
+    }
+    federated_service = FederatedQueryService(services, logger)
+    votable = await federated_service.run_query_votable(
+        params,
+        str(request.url),
+        user,
+        is_disconnected=request.is_disconnected,
+    )
+    filename = f"{RESULT_NAME}.xml"
+    return Response(
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        content=votable,
+        media_type="application/x-votable+xml",
+    )
+
+
 @external_router.get(
     "/{collection_name}/availability",
     response_model=Availability,
@@ -92,16 +174,43 @@ async def get_index(
     summary="IVOA service availability",
 )
 async def get_availability(
-    butler_url: Annotated[str, Depends(butler_factory_dependency.butler_url)],
-    collection: Annotated[ButlerDataCollection, Depends(validate_collection)],
+    collection: Annotated[CollectionRuntime, Depends(collection_dependency)],
     http_client: Annotated[AsyncClient, Depends(http_client_dependency)],
+    logger: Annotated[BoundLogger, Depends(logger_dependency)],
 ) -> Response:
-    availability_service = AvailabilityService(http_client)
-    availability = await availability_service.get_availability(butler_url)
+    availability_service = AvailabilityService(
+        http_client, health_tracker, logger
+    )
+    availability = await availability_service.get_availability(collection)
     xml = availability.to_xml(skip_empty=True)
     return Response(content=xml, media_type="application/xml")
 
 
+@external_router.get(
+    "/{collection_name}/coverage",
+    description=(
+        "Sky coverage of the collection as an IVOA MOC in ASCII format."
+        " Queries whose POS regions are all outside it return no rows."
+    ),
+    responses={
+        200: {"content": {"text/plain": {"example": "3/3 10 4/16-18 9/"}}},
+        503: {
+            "description": "Coverage not yet available",
+            "model": ErrorModel,
+        },
+    },
+    summary="Collection sky coverage",
+)
+async def get_coverage(
+    collection: Annotated[CollectionRuntime, Depends(collection_dependency)],
+) -> Response:
+    if not collection.coverage:
+        msg = f"Coverage of {collection.name} is not available"
+        raise TransientFaultError(msg, 503)
+    moc = await executors.serialization.run(collection.coverage.to_ascii)
+    return Response(content=moc, media_type="text/plain")
+
+
 @external_router.get(
     "/{collection_name}/capabilities",
     description="VOSI-capabilities resource for the SIA service.",
@@ -129,7 +238,7 @@ async def get_availability(
     summary="IVOA service capabilities",
 )
 async def get_capabilities(
-    collection: Annotated[ButlerDataCollection, Depends(validate_collection)],
+    collection: Annotated[CollectionRuntime, Depends(collection_dependency)],
     request: Request,
 ) -> Response:
     return _TEMPLATES.TemplateResponse(
@@ -162,6 +271,7 @@ async def get_capabilities(
         },
     },
     summary="IVOA SIA service query",
+    dependencies=[Depends(in_flight_dependency)],
 )
 @external_router.post(
     "/{collection_name}/query",
@@ -174,6 +284,7 @@ async def get_capabilities(
         },
     },
     summary="IVOA SIA (v2) service query (POST)",
+    dependencies=[Depends(in_flight_dependency)],
 )
 async def query(
     *,
@@ -203,9 +314,67 @@ async def query(
     # Otherwise, perform and return the query.
     query_service = context.factory.create_query_service()
     request_url = str(context.request.url)
-    votable = await query_service.run_query_votable(params, request_url, user)
+    votable = await query_service.run_query_votable(
+        params,
+        request_url,
+        user,
+        is_disconnected=context.request.is_disconnected,
+    )
     return Response(
         headers=headers,
         content=votable,
         media_type="application/x-votable+xml",
     )
+
+
+@external_router.post(
+    "/{collection_name}/bulk",
+    description=(
+        "Bulk query endpoint for the SIA service, which runs the query once"
+        " for each position in an uploaded table of positions."
+    ),
+    responses={
+        200: {"content": {"application/xml": {}}},
+        400: {
+            "description": "Invalid query parameters or uploaded table",
+            "model": ErrorModel,
+        },
+        413: {
+            "description": "Uploaded table is too large",
+            "model": ErrorModel,
+        },
+    },
+    summary="IVOA SIA (v2) bulk query of many positions",
+    dependencies=[Depends(in_flight_dependency)],
+)
+async def bulk_query(
+    *,
+    upload: Annotated[
+        UploadFile,
+        File(
+            title="Table of positions",
+            description=(
+                "VOTable or CSV table with ra, dec and radius columns in"
+                " degrees"
+            ),
+        ),
+    ],
+    params: Annotated[SIAQueryParams, Depends(get_sia_params_dependency)],
+    user: Annotated[str, Depends(auth_dependency)],
+    context: Annotated[RequestContext, Depends(context_dependency)],
+) -> StreamingResponse:
+    cones = parse_cones(await read_upload(upload))
+    bulk_service = context.factory.create_bulk_query_service()
+    chunks = await bulk_service.run_query_votable(
+        cones,
+        params,
+        str(context.request.url),
+        user,
+        is_disconnected=context.request.is_disconnected,
+    )
+    filename = f"{RESULT_NAME}.xml"
+    return StreamingResponse(
+        chunks,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        media_type="application/x-votable+xml",
+    )
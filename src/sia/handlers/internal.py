@@ -8,12 +8,36 @@ These handlers should be used for monitoring, health checks, internal status,
 or other information that should not be visible outside the Kubernetes cluster.
 """
 
-from fastapi import APIRouter
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import ValidationError
+from pydantic_settings import SettingsError
+from rubin.repertoire import DiscoveryClient, discovery_dependency
+from safir.dependencies.logger import logger_dependency
 from safir.metadata import Metadata, get_metadata
+from structlog.stdlib import BoundLogger
 
+from ..bulkhead import bulkheads
 from ..config import config
+from ..cost import QueryLane
+from ..executors import executors
+from ..lifecycle import lifecycle
+from ..loopmonitor import loop_monitor
+from ..models.drain import DrainSummary
+from ..models.reload import ReloadSummary
+from ..models.status import Readiness, Status
+from ..registry import collection_registry
+from ..services.reload import ReloadService
 
-__all__ = ["get_index", "internal_router"]
+__all__ = [
+    "get_index",
+    "get_readiness",
+    "get_status",
+    "internal_router",
+    "post_drain",
+    "post_reload",
+]
 
 internal_router = APIRouter()
 """FastAPI router for all internal handlers."""
@@ -44,3 +68,82 @@ async def get_index() -> Metadata:
         package_name="sia",
         application_name=config.name,
     )
+
+
+@internal_router.get(
+    "/healthcheck/ready",
+    description=(
+        "Report whether this worker is ready to receive traffic. Returns a"
+        " 503 status code until startup warm-up has completed."
+    ),
+    include_in_schema=False,
+    responses={503: {"description": "Not ready", "model": Readiness}},
+    summary="Readiness check",
+)
+async def get_readiness(response: Response) -> Readiness:
+    """GET ``/healthcheck/ready``, for use as a readiness probe."""
+    if not lifecycle.ready:
+        response.status_code = 503
+    return Readiness(ready=lifecycle.ready)
+
+
+@internal_router.get(
+    "/status",
+    description=(
+        "Report internal statistics of this worker, such as the queue depth"
+        " and queue wait time of each thread pool and the number of running"
+        " and queued queries for each collection."
+    ),
+    include_in_schema=False,
+    summary="Worker status",
+)
+async def get_status() -> Status:
+    """GET ``/status``, for monitoring saturation of this worker."""
+    return Status(
+        executors=executors.status(),
+        collections=bulkheads.status(QueryLane.fast),
+        event_loop=loop_monitor.status(),
+        slow_lanes=bulkheads.status(QueryLane.slow),
+    )
+
+
+@internal_router.post(
+    "/drain",
+    description=(
+        "Stop accepting queries, report that this worker is not ready, and"
+        " wait up to the shutdown grace period for queries in progress to"
+        " finish. Intended for use as a pre-stop hook."
+    ),
+    include_in_schema=False,
+    summary="Drain worker",
+)
+async def post_drain(
+    logger: Annotated[BoundLogger, Depends(logger_dependency)],
+) -> DrainSummary:
+    """POST ``/drain``, to drain the worker before it is stopped."""
+    logger.info("Draining in-flight queries", in_flight=lifecycle.in_flight)
+    return await lifecycle.drain(config.shutdown_grace_period)
+
+
+@internal_router.post(
+    "/reload",
+    description=(
+        "Reload the dataset configuration and rebuild the state of any"
+        " collections that changed. Requests already in progress finish"
+        " with the previous state."
+    ),
+    include_in_schema=False,
+    responses={422: {"description": "Invalid configuration"}},
+    summary="Reload configuration",
+)
+async def post_reload(
+    discovery: Annotated[DiscoveryClient, Depends(discovery_dependency)],
+    logger: Annotated[BoundLogger, Depends(logger_dependency)],
+) -> ReloadSummary:
+    """POST ``/reload``, to apply configuration changes without a restart."""
+    reload_service = ReloadService(registry=collection_registry, logger=logger)
+    try:
+        return await reload_service.reload(discovery)
+    except (SettingsError, ValidationError) as e:
+        logger.warning("Invalid configuration, not reloading", error=str(e))
+        raise HTTPException(status_code=422, detail=str(e)) from e
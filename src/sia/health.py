@@ -0,0 +1,134 @@
+"""Tracking of the health of the Butler backend for each collection."""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from .config import config
+
+__all__ = ["CollectionHealth", "HealthTracker", "health_tracker"]
+
+
+@dataclass(frozen=True, slots=True)
+class CollectionHealth:
+    """Result of the most recent availability probe of a collection."""
+
+    available: bool
+    """Whether the Butler server for the collection responded successfully."""
+
+    checked: datetime
+    """When the probe was made."""
+
+    latency: timedelta
+    """How long the probe took."""
+
+    error: str | None = None
+    """Error from the probe, if it failed."""
+
+    failures: int = 0
+    """Number of consecutive failed probes, including this one."""
+
+
+class HealthTracker:
+    """Process-wide record of the health of each collection.
+
+    The record is updated by the background availability prober and read by
+    the availability route and by the circuit breaker in the query service.
+    The circuit for a collection opens once the configured number of
+    consecutive probes have failed and closes again as soon as a probe
+    succeeds.
+    """
+
+    def __init__(self) -> None:
+        self._health: dict[str, CollectionHealth] = {}
+
+    def get(self, name: str) -> CollectionHealth | None:
+        """Return the last known health of a collection.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+
+        Returns
+        -------
+        CollectionHealth or None
+            Result of the last probe, or `None` if it has not been probed.
+        """
+        return self._health.get(name)
+
+    def is_open(self, name: str) -> bool:
+        """Whether queries against a collection should fail fast.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+
+        Returns
+        -------
+        bool
+            `True` if the Butler backend for the collection is known to be
+            down, `False` otherwise.
+        """
+        health = self._health.get(name)
+        if not health:
+            return False
+        return health.failures >= config.circuit_breaker_threshold
+
+    def record(
+        self,
+        name: str,
+        *,
+        checked: datetime,
+        latency: timedelta,
+        error: str | None = None,
+    ) -> CollectionHealth:
+        """Record the result of a probe.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+        checked
+            When the probe was made.
+        latency
+            How long the probe took.
+        error
+            Error from the probe, or `None` if it succeeded.
+
+        Returns
+        -------
+        CollectionHealth
+            Updated health of the collection.
+        """
+        failures = 0
+        if error is not None:
+            previous = self._health.get(name)
+            failures = previous.failures + 1 if previous else 1
+        health = CollectionHealth(
+            available=error is None,
+            checked=checked,
+            latency=latency,
+            error=error,
+            failures=failures,
+        )
+        self._health[name] = health
+        return health
+
+    def reset(self) -> None:
+        """Forget all recorded health."""
+        self._health = {}
+
+    def retain(self, names: set[str]) -> None:
+        """Forget the health of collections other than the given ones.
+
+        Parameters
+        ----------
+        names
+            Names of the collections to keep.
+        """
+        self._health = {n: h for n, h in self._health.items() if n in names}
+
+
+health_tracker = HealthTracker()
+"""Process-wide record of the health of each collection."""
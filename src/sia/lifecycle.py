@@ -0,0 +1,96 @@
+"""Tracking of the worker lifecycle for readiness reporting."""
+
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from datetime import timedelta
+
+from .models.drain import DrainSummary
+
+__all__ = ["Lifecycle", "lifecycle"]
+
+
+class Lifecycle:
+    """Lifecycle state of this worker.
+
+    A worker starts out not ready and becomes ready once the startup warm-up
+    of all configured collections has finished. Readiness is reported on an
+    internal route so that the load balancer does not send traffic to a
+    worker before then.
+
+    On shutdown, the worker drains: it reports that it is no longer ready,
+    new queries are rejected, and queries already in flight are given a
+    grace period to finish before the resources they use are released.
+    """
+
+    def __init__(self) -> None:
+        self._ready = False
+        self._draining = False
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def draining(self) -> bool:
+        """Whether the worker has stopped accepting new queries."""
+        return self._draining
+
+    @property
+    def in_flight(self) -> int:
+        """Number of query requests currently being processed."""
+        return self._in_flight
+
+    @property
+    def ready(self) -> bool:
+        """Whether this worker should receive traffic."""
+        return self._ready and not self._draining
+
+    async def drain(self, grace_period: timedelta) -> DrainSummary:
+        """Stop accepting queries and wait for those in flight to finish.
+
+        Parameters
+        ----------
+        grace_period
+            How long to wait for in-flight queries.
+
+        Returns
+        -------
+        DrainSummary
+            Number of in-flight queries that finished and that were still
+            running at the end of the grace period.
+        """
+        self._draining = True
+        waiting = self._in_flight
+        with suppress(TimeoutError):
+            async with asyncio.timeout(grace_period.total_seconds()):
+                await self._idle.wait()
+        abandoned = min(waiting, self._in_flight)
+        return DrainSummary(completed=waiting - abandoned, abandoned=abandoned)
+
+    def mark_ready(self) -> None:
+        """Mark the worker as ready to receive traffic."""
+        self._ready = True
+
+    def reset(self) -> None:
+        """Return to the initial, not-ready state."""
+        self._ready = False
+        self._draining = False
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count a query request as in flight for its duration."""
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+
+lifecycle = Lifecycle()
+"""Lifecycle state of this worker."""
@@ -0,0 +1,95 @@
+"""Adaptive limit on concurrent Butler queries."""
+
+from .config import config
+
+__all__ = ["AdaptiveLimit"]
+
+_BASELINE_WEIGHT = 0.02
+"""Weight of each query in the long-term moving average of latency."""
+
+_RECENT_WEIGHT = 0.3
+"""Weight of each query in the short-term moving average of latency."""
+
+_BACKOFF = 0.9
+"""Factor by which the limit is reduced when latency rises."""
+
+
+class AdaptiveLimit:
+    """Concurrency limit that adapts to observed Butler query latency.
+
+    The limit follows an additive increase, multiplicative decrease scheme
+    driven by latency. Two moving averages of query latency are kept: a
+    long-term one that tracks normal latency and a short-term one that
+    tracks current latency. When current latency rises above the configured
+    multiple of normal latency, the Butler server is taken to be overloaded
+    and the limit is reduced by a constant factor. Otherwise, if the limit
+    was fully used, it grows by about one per limit's worth of queries, up
+    to the configured maximum.
+
+    Parameters
+    ----------
+    maximum
+        Upper bound on the limit, which is also its initial value.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        self._maximum = maximum
+        self._limit = float(maximum)
+        self._baseline: float | None = None
+        self._recent: float | None = None
+
+    @property
+    def limit(self) -> int:
+        """Current limit on concurrent queries."""
+        return max(1, int(self._limit))
+
+    @property
+    def maximum(self) -> int:
+        """Upper bound on the limit."""
+        return self._maximum
+
+    def observe(self, latency: float, in_flight: int) -> bool:
+        """Adjust the limit based on the latency of a finished query.
+
+        Parameters
+        ----------
+        latency
+            Duration of the query in seconds.
+        in_flight
+            Number of queries running when it finished, including itself.
+
+        Returns
+        -------
+        bool
+            Whether the limit changed.
+        """
+        old_limit = self.limit
+        if self._baseline is None or self._recent is None:
+            self._baseline = latency
+            self._recent = latency
+        else:
+            self._baseline += _BASELINE_WEIGHT * (latency - self._baseline)
+            self._recent += _RECENT_WEIGHT * (latency - self._recent)
+
+        tolerance = config.adaptive_latency_tolerance
+        if self._recent > tolerance * self._baseline:
+            self._limit = max(1.0, self._limit * _BACKOFF)
+        elif in_flight >= self.limit:
+            self._limit = min(self._maximum, self._limit + 1 / self._limit)
+        return self.limit != old_limit
+
+    def set_maximum(self, maximum: int) -> None:
+        """Change the upper bound on the limit.
+
+        If the limit was not reduced because of latency, it follows the new
+        upper bound.
+
+        Parameters
+        ----------
+        maximum
+            New upper bound.
+        """
+        if self._limit >= self._maximum:
+            self._limit = float(maximum)
+        self._maximum = maximum
+        self._limit = min(self._limit, maximum)
@@ -0,0 +1,152 @@
+"""Monitoring of event loop scheduling lag."""
+
+import asyncio
+import itertools
+import math
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import timedelta
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+from structlog.stdlib import BoundLogger
+
+from .config import config
+from .events import Events, SIAEventLoopLag
+from .models.status import LoopLagStatus
+
+__all__ = ["LoopMonitor", "LoopMonitorMiddleware", "loop_monitor"]
+
+_SAMPLE_INTERVAL = 0.25
+"""How often to sample event loop lag, in seconds."""
+
+_WINDOW_SIZE = 1200
+"""Number of recent samples used to compute lag percentiles."""
+
+_MAX_LOGGED_REQUESTS = 10
+"""Maximum number of in-flight requests to list when logging lag."""
+
+
+class LoopMonitor:
+    """Measure how late the event loop runs scheduled callbacks.
+
+    The monitor repeatedly sleeps for a fixed interval and measures how much
+    longer than that interval it took to be woken up. Any delay is time in
+    which the event loop was busy with CPU work, such as template rendering
+    or handling large responses, and could not serve other requests. Recent
+    samples are kept to report lag percentiles. Samples above the configured
+    threshold are logged, along with the requests in flight at the time,
+    and reported as metrics events.
+    """
+
+    def __init__(self) -> None:
+        self._lags: deque[float] = deque(maxlen=_WINDOW_SIZE)
+        self._requests: dict[int, str] = {}
+        self._counter = itertools.count()
+
+    async def run(self, events: Events, logger: BoundLogger) -> None:
+        """Sample event loop lag until cancelled.
+
+        Parameters
+        ----------
+        events
+            Metrics events publishers.
+        logger
+            Logger to use.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(_SAMPLE_INTERVAL)
+            lag = max(0.0, loop.time() - start - _SAMPLE_INTERVAL)
+            self._lags.append(lag)
+            if lag > config.loop_lag_threshold.total_seconds():
+                await self._report(lag, events, logger)
+
+    def reset(self) -> None:
+        """Forget all samples."""
+        self._lags.clear()
+
+    def status(self) -> LoopLagStatus:
+        """Return percentiles of recent event loop lag.
+
+        Returns
+        -------
+        LoopLagStatus
+            Lag statistics over the recent samples.
+        """
+        lags = sorted(self._lags)
+        return LoopLagStatus(
+            samples=len(lags),
+            p50_seconds=self._percentile(lags, 50),
+            p95_seconds=self._percentile(lags, 95),
+            p99_seconds=self._percentile(lags, 99),
+            max_seconds=lags[-1] if lags else 0.0,
+        )
+
+    @contextmanager
+    def track(self, description: str) -> Iterator[None]:
+        """Record a request as in flight for its duration.
+
+        Parameters
+        ----------
+        description
+            Description of the request to include when logging lag.
+        """
+        key = next(self._counter)
+        self._requests[key] = description
+        try:
+            yield
+        finally:
+            del self._requests[key]
+
+    async def _report(
+        self, lag: float, events: Events, logger: BoundLogger
+    ) -> None:
+        """Log and publish a lag sample above the threshold."""
+        requests = list(self._requests.values())
+        logger.warning(
+            "Event loop lag above threshold",
+            lag_seconds=round(lag, 3),
+            in_flight=len(requests),
+            requests=requests[:_MAX_LOGGED_REQUESTS],
+        )
+        await events.sia_event_loop_lag.publish(
+            SIAEventLoopLag(
+                lag=timedelta(seconds=lag), in_flight=len(requests)
+            )
+        )
+
+    @staticmethod
+    def _percentile(lags: list[float], percentile: float) -> float:
+        """Return a percentile of sorted lag samples, or 0 if none."""
+        if not lags:
+            return 0.0
+        index = math.ceil(percentile / 100 * len(lags)) - 1
+        return lags[max(0, index)]
+
+
+class LoopMonitorMiddleware:
+    """Record in-flight HTTP requests for event loop lag reports.
+
+    Parameters
+    ----------
+    app
+        ASGI application to wrap.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self._app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+        with loop_monitor.track(f"{scope['method']} {scope['path']}"):
+            await self._app(scope, receive, send)
+
+
+loop_monitor = LoopMonitor()
+"""Process-wide event loop lag monitor."""
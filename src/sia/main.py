@@ -7,16 +7,19 @@ constructed when this module is loaded and is not deferred until a function is
 called.
 """
 
+import asyncio
 import json
+import signal
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from importlib.metadata import metadata, version
 
 import structlog
 from fastapi import FastAPI, Request, Response
 from fastapi.exceptions import RequestValidationError
 from fastapi.openapi.utils import get_openapi
-from rubin.repertoire import discovery_dependency
+from httpx import AsyncClient
+from rubin.repertoire import DiscoveryClient, discovery_dependency
 from safir.dependencies.http_client import http_client_dependency
 from safir.logging import configure_logging, configure_uvicorn_logging
 from safir.middleware.ivoa import (
@@ -27,13 +30,26 @@ from safir.middleware.x_forwarded import XForwardedMiddleware
 from safir.slack.webhook import SlackRouteErrorHandler
 
 from . import __version__
+from .bulkhead import bulkheads
 from .config import config
 from .dependencies.context import context_dependency
 from .errors import votable_exception_handler
 from .exceptions import VOTableError
+from .executors import executors
 from .handlers.external import external_router
 from .handlers.internal import internal_router
+from .health import health_tracker
+from .lifecycle import lifecycle
+from .loopmonitor import LoopMonitorMiddleware, loop_monitor
+from .registry import collection_registry
 from .sentry import enable_sentry
+from .services.availability import AvailabilityService
+from .services.coverage import CoverageService
+from .services.reload import ReloadService
+from .services.warmstart import WarmStartService
+from .services.warmup import WarmupService
+from .shadow import ShadowMiddleware, shadow_runner
+from .storage.snapshot import SnapshotStore
 
 __all__ = ["app"]
 
@@ -41,6 +57,61 @@ __all__ = ["app"]
 enable_sentry(__version__)
 
 
+async def _start_up(
+    discovery: DiscoveryClient,
+    http_client: AsyncClient,
+    warm_start: WarmStartService | None,
+    *,
+    restored: bool,
+) -> None:
+    """Warm up collections, report readiness, and keep them refreshed."""
+    logger = structlog.get_logger("sia")
+    if config.warmup_enabled:
+        warmup = WarmupService(registry=collection_registry, logger=logger)
+        await warmup.warm_up(discovery)
+    lifecycle.mark_ready()
+
+    # Probe the availability of every collection and build their coverage
+    # in the background.
+    availability = AvailabilityService(http_client, health_tracker, logger)
+    coverage = CoverageService(registry=collection_registry, logger=logger)
+    await asyncio.gather(
+        availability.run_probes(collection_registry),
+        coverage.run_builds(),
+        _refresh(discovery, warm_start, restored=restored),
+    )
+
+
+async def _refresh(
+    discovery: DiscoveryClient,
+    warm_start: WarmStartService | None,
+    *,
+    restored: bool,
+) -> None:
+    """Update the warm-start snapshot and keep collections refreshed."""
+    # If state was restored from the snapshot, it still needs to be
+    # revalidated. Otherwise, the snapshot is refreshed from the newly
+    # retrieved state.
+    if warm_start:
+        if restored:
+            await warm_start.revalidate(discovery)
+        else:
+            await warm_start.save()
+
+    # Pick up changes to service discovery from now on.
+    await collection_registry.run_refresh(discovery)
+
+
+async def _reload(discovery: DiscoveryClient) -> None:
+    """Reload the configuration in response to a signal."""
+    logger = structlog.get_logger("sia")
+    reload_service = ReloadService(registry=collection_registry, logger=logger)
+    try:
+        await reload_service.reload(discovery)
+    except Exception:
+        logger.exception("Unable to reload configuration")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
     """Set up and tear down the application."""
@@ -51,8 +122,64 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
     await event_manager.initialize()
     await context_dependency.initialize(event_manager=event_manager)
 
+    # Serve from the warm-start snapshot, if configured, and then warm up all
+    # collections in the background. The worker reports readiness once this
+    # is complete.
+    warm_start = None
+    restored = False
+    if config.snapshot_path:
+        warm_start = WarmStartService(
+            store=SnapshotStore(config.snapshot_path, logger),
+            registry=collection_registry,
+            logger=logger,
+        )
+        restored = warm_start.restore()
+    http_client = await http_client_dependency()
+    discovery = await discovery_dependency(http_client)
+    start_up = _start_up(discovery, http_client, warm_start, restored=restored)
+    start_up_task = asyncio.create_task(start_up)
+
+    # Reload the configuration on SIGHUP. Keep references to the reload tasks
+    # so that they are not garbage-collected while running.
+    loop = asyncio.get_running_loop()
+    reload_tasks: set[asyncio.Task[None]] = set()
+
+    def on_sighup() -> None:
+        task = asyncio.create_task(_reload(discovery))
+        reload_tasks.add(task)
+        task.add_done_callback(reload_tasks.discard)
+
+    loop.add_signal_handler(signal.SIGHUP, on_sighup)
+
+    # Watch for CPU work blocking the event loop.
+    monitor = loop_monitor.run(context_dependency.events, logger)
+    monitor_task = asyncio.create_task(monitor)
+
     yield
 
+    # Stop accepting queries and give those in progress a chance to finish
+    # before releasing the resources they use.
+    drain = await lifecycle.drain(config.shutdown_grace_period)
+    logger.info(
+        "Drained in-flight queries",
+        completed=drain.completed,
+        abandoned=drain.abandoned,
+    )
+    loop.remove_signal_handler(signal.SIGHUP)
+    for task in reload_tasks:
+        task.cancel()
+    lifecycle.reset()
+    health_tracker.reset()
+    bulkheads.reset()
+    start_up_task.cancel()
+    monitor_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await start_up_task
+    with suppress(asyncio.CancelledError):
+        await monitor_task
+    loop_monitor.reset()
+    await shadow_runner.aclose()
+    executors.shutdown()
     await event_manager.aclose()
     await http_client_dependency.aclose()
     logger.debug("SIA shut down complete.")
@@ -117,6 +244,8 @@ app.include_router(external_router, prefix=f"{config.path_prefix}")
 
 # Add middleware.
 app.add_middleware(XForwardedMiddleware)
+app.add_middleware(LoopMonitorMiddleware)
+app.add_middleware(ShadowMiddleware)
 
 
 # Configure Slack alerts.
@@ -0,0 +1,43 @@
+"""Load-adaptive default MAXREC for queries that do not set one."""
+
+from .config import config
+from .registry import CollectionLimits
+
+__all__ = ["default_maxrec"]
+
+_LOW_LOAD = 0.5
+"""Load below which queries get the full default MAXREC."""
+
+
+def default_maxrec(limits: CollectionLimits, load: float) -> int:
+    """Choose the MAXREC for a query that did not specify one.
+
+    While a collection is lightly loaded, queries without MAXREC get the
+    default MAXREC for that collection. As the load rises from half of its
+    concurrency limit to fully using it, the default shrinks geometrically
+    towards the configured minimum, which applies once queries are
+    queueing. Queries that specify MAXREC are unaffected, and a query cut
+    short by the default still reports an overflow in its VOTable, so
+    clients that need more results can ask for them explicitly.
+
+    Parameters
+    ----------
+    limits
+        Limits of the collection being queried.
+    load
+        Running and queued queries as a fraction of the concurrency limit
+        of the collection.
+
+    Returns
+    -------
+    int
+        MAXREC to use for the query.
+    """
+    nominal = limits.default_maxrec
+    minimum = min(config.min_default_maxrec, nominal)
+    if load <= _LOW_LOAD:
+        return nominal
+    if load >= 1:
+        return minimum
+    fraction = (load - _LOW_LOAD) / (1 - _LOW_LOAD)
+    return max(minimum, round(nominal * (minimum / nominal) ** fraction))
@@ -0,0 +1,21 @@
+"""Models for draining in-flight requests."""
+
+from pydantic import BaseModel, Field
+
+__all__ = ["DrainSummary"]
+
+
+class DrainSummary(BaseModel):
+    """Outcome of waiting for in-flight query requests to finish."""
+
+    completed: int = Field(
+        ...,
+        title="Completed requests",
+        description="Requests in flight at the start that finished in time",
+    )
+
+    abandoned: int = Field(
+        ...,
+        title="Abandoned requests",
+        description="Requests still in flight when the grace period ended",
+    )
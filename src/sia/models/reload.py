@@ -0,0 +1,29 @@
+"""Models for configuration reloads."""
+
+from pydantic import BaseModel, Field
+
+__all__ = ["ReloadSummary"]
+
+
+class ReloadSummary(BaseModel):
+    """Summary of the changes made by a configuration reload."""
+
+    added: list[str] = Field(
+        [], title="Added datasets", description="Newly configured datasets"
+    )
+
+    removed: list[str] = Field(
+        [], title="Removed datasets", description="Datasets no longer served"
+    )
+
+    updated: list[str] = Field(
+        [],
+        title="Updated datasets",
+        description="Datasets whose runtime state was rebuilt",
+    )
+
+    ignored: list[str] = Field(
+        [],
+        title="Ignored settings",
+        description="Changed settings that only take effect after a restart",
+    )
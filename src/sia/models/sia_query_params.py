@@ -139,7 +139,8 @@ class SIAQueryParams(BaseQueryParams):
     instrument
         Name of the instrument.
     maxrec
-        Maximum number of records in the response.
+        Maximum number of records in the response. If not given, the
+        service chooses a default based on the collection and its load.
     responseformat
         Format of the response.
 
@@ -351,11 +352,21 @@ class SIAQueryParams(BaseQueryParams):
             if attr not in ["maxrec", "responseformat"]
         )
 
+    def is_id_lookup(self) -> bool:
+        """Check if the query only looks up datasets by ID.
+
+        This is the case if ID is set and all other params except maxrec and
+        responseformat are None.
+        """
+        return self.id is not None and all(
+            getattr(self, attr) is None
+            for attr in self.__annotations__
+            if attr not in ["id", "maxrec", "responseformat"]
+        )
+
     def __post_init__(self) -> None:
         """Validate the form parameters."""
-        if self.maxrec is None:
-            self.maxrec = MAXREC_LIMIT
-        else:
+        if self.maxrec is not None:
             self.maxrec = min(int(self.maxrec), MAXREC_LIMIT)
 
     def to_dict(self) -> dict[str, Any]:
@@ -0,0 +1,45 @@
+"""Models for the warm-start snapshot."""
+
+from datetime import datetime
+
+from lsst.dax.obscore import ExporterConfig
+from pydantic import BaseModel, Field
+
+__all__ = ["WarmStartSnapshot"]
+
+
+class WarmStartSnapshot(BaseModel):
+    """Last known per-collection state, persisted across restarts.
+
+    Newly-started workers load this snapshot so that they can answer queries
+    immediately, without waiting on service discovery or on retrieving and
+    validating the ObsCore configuration for each collection.
+    """
+
+    created: datetime = Field(
+        ..., title="Creation time", description="When the snapshot was taken"
+    )
+
+    butler_repositories: dict[str, str] = Field(
+        ...,
+        title="Butler repositories",
+        description="Mapping of dataset label to Butler configuration URL",
+    )
+
+    datalink_urls: dict[str, str | None] = Field(
+        ...,
+        title="DataLink URLs",
+        description="Mapping of dataset label to DataLink links service URL",
+    )
+
+    obscore_configs: dict[str, ExporterConfig] = Field(
+        ...,
+        title="ObsCore configurations",
+        description="Mapping of dataset label to validated exporter config",
+    )
+
+    instruments: dict[str, list[str]] = Field(
+        {},
+        title="Instruments",
+        description="Mapping of dataset label to known instrument names",
+    )
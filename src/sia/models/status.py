@@ -0,0 +1,112 @@
+"""Models for internal status routes."""
+
+from pydantic import BaseModel, Field
+
+__all__ = ["BulkheadStatus", "ExecutorStatus", "Readiness", "Status"]
+
+
+class Readiness(BaseModel):
+    """Readiness of this worker to receive traffic."""
+
+    ready: bool = Field(..., title="Whether the worker is ready")
+
+
+class BulkheadStatus(BaseModel):
+    """Query limits and usage for a single collection."""
+
+    concurrency: int = Field(..., title="Configured concurrent query limit")
+
+    limit: int = Field(
+        ...,
+        title="Current concurrent query limit",
+        description="Limit after adapting to observed Butler query latency",
+    )
+
+    queue: int = Field(..., title="Queued query limit")
+
+    active: int = Field(..., title="Queries currently running")
+
+    queued: int = Field(..., title="Queries waiting to run")
+
+    users: int = Field(..., title="Users with running or waiting queries")
+
+    service_time_seconds: float | None = Field(
+        ...,
+        title="Query duration",
+        description="Moving average of query duration, in seconds",
+    )
+
+    estimated_wait_seconds: float | None = Field(
+        ...,
+        title="Estimated wait",
+        description="Estimated wait for a newly-arrived query, in seconds",
+    )
+
+
+class ExecutorStatus(BaseModel):
+    """Saturation statistics for a thread pool."""
+
+    max_workers: int = Field(..., title="Number of threads")
+
+    active: int = Field(..., title="Calls currently running")
+
+    queued: int = Field(
+        ..., title="Queue depth", description="Calls waiting for a thread"
+    )
+
+    completed: int = Field(..., title="Calls completed since startup")
+
+    wait_mean_seconds: float = Field(
+        ...,
+        title="Mean queue wait",
+        description="Mean time calls spent waiting for a thread, in seconds",
+    )
+
+    wait_max_seconds: float = Field(
+        ...,
+        title="Maximum queue wait",
+        description="Longest time a call waited for a thread, in seconds",
+    )
+
+
+class LoopLagStatus(BaseModel):
+    """Statistics of recent event loop scheduling lag."""
+
+    samples: int = Field(..., title="Number of recent lag samples")
+
+    p50_seconds: float = Field(..., title="Median lag in seconds")
+
+    p95_seconds: float = Field(..., title="95th percentile lag in seconds")
+
+    p99_seconds: float = Field(..., title="99th percentile lag in seconds")
+
+    max_seconds: float = Field(..., title="Maximum lag in seconds")
+
+
+class Status(BaseModel):
+    """Internal status of this worker."""
+
+    executors: dict[str, ExecutorStatus] = Field(
+        ..., title="Thread pools", description="Statistics by thread pool"
+    )
+
+    collections: dict[str, BulkheadStatus] = Field(
+        ...,
+        title="Collections",
+        description="Query limits and usage by collection",
+    )
+
+    event_loop: LoopLagStatus = Field(
+        ...,
+        title="Event loop lag",
+        description="How late the event loop runs scheduled callbacks",
+    )
+
+    slow_lanes: dict[str, BulkheadStatus] = Field(
+        ...,
+        title="Slow lanes",
+        description=(
+            "Query limits and usage for queries estimated to be expensive,"
+            " by collection"
+        ),
+    )
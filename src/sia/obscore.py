@@ -0,0 +1,103 @@
+"""Conversion of ObsCore rows held in memory to VOTable results."""
+
+from collections.abc import Iterator
+from typing import Self, override
+
+import pyarrow as pa
+from astropy.io.votable.tree import VOTableFile
+from lsst.daf.butler.registry.obscore import (
+    ObsCoreSchema,
+    SpatialObsCorePlugin,
+)
+from lsst.dax.obscore import ExporterConfig, ObscoreExporter
+
+__all__ = ["TableExporter", "empty_result"]
+
+
+class TableExporter(ObscoreExporter):
+    """ObsCore exporter that exports rows already held in memory.
+
+    This reuses the conversion of the exporter to VOTable, so that results
+    not produced by a Butler query have the same metadata as results from a
+    Butler query. Only the source of the records is replaced, and the Butler
+    is not used. This relies on private methods of the exporter, so the
+    supported versions of ``lsst-dax-obscore`` are pinned and the tests
+    check that the fields match those of a Butler query.
+
+    Parameters
+    ----------
+    config
+        ObsCore exporter configuration of the collection.
+    table
+        Rows to export.
+    overflow
+        Whether the rows were cut at MAXREC.
+    """
+
+    def __init__(
+        self, config: ExporterConfig, table: pa.Table, *, overflow: bool
+    ) -> None:
+        self.config = config
+        self.schema = table.schema
+        self._rows = table
+        self._overflow = overflow
+
+    @classmethod
+    def empty(cls, config: ExporterConfig) -> Self:
+        """Create an exporter with no rows.
+
+        The columns are those a Butler query would return for the same
+        configuration.
+
+        Parameters
+        ----------
+        config
+            ObsCore exporter configuration of the collection.
+
+        Returns
+        -------
+        TableExporter
+            Exporter with no rows.
+        """
+        plugins = SpatialObsCorePlugin.load_plugins(
+            config.spatial_plugins, None
+        )
+        obscore = ObsCoreSchema(config=config, spatial_plugins=plugins)
+        exporter = cls(config, pa.table({}), overflow=False)
+        exporter.schema = exporter._make_schema(obscore.table_spec)
+        exporter._rows = exporter.schema.empty_table()
+        return exporter
+
+    @override
+    def _make_record_batches(
+        self, batch_size: int = 10_000, limit: int | None = None
+    ) -> Iterator[tuple[pa.RecordBatch, bool]]:
+        for batch in self._rows.to_batches(max_chunksize=batch_size):
+            yield batch, self._overflow
+
+
+def empty_result(
+    config: ExporterConfig,
+    *,
+    query_url: str | None = None,
+    query_string: str | None = None,
+) -> VOTableFile:
+    """Build a query result with no rows.
+
+    Parameters
+    ----------
+    config
+        ObsCore exporter configuration of the collection.
+    query_url
+        URL the user sent the query to, included in the result.
+    query_string
+        Human-readable query, included in the result.
+
+    Returns
+    -------
+    VOTableFile
+        Result with the same metadata as a Butler query that matched
+        nothing.
+    """
+    exporter = TableExporter.empty(config)
+    return exporter.to_votable(query_url=query_url, query_string=query_string)
@@ -0,0 +1,523 @@
+"""Registry of precomputed per-collection runtime state."""
+
+import asyncio
+from dataclasses import dataclass, replace
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from urllib.parse import urlparse, urlunparse
+
+import structlog
+from lsst.daf.butler import ButlerConfig, LabeledButlerFactory
+from lsst.dax.obscore import ExporterConfig
+from rubin.repertoire import DiscoveryClient
+
+from .config import config
+from .constants import DATALINK_VERSION
+from .coverage import Coverage
+from .exceptions import FatalFaultError, UsageFaultError
+from .executors import executors
+from .models.data_collections import ButlerDataCollection
+from .models.sia_query_params import MAXREC_LIMIT
+from .models.snapshot import WarmStartSnapshot
+from .replica import ObsCoreReplica
+
+__all__ = [
+    "CollectionLimits",
+    "CollectionRegistry",
+    "CollectionRuntime",
+    "collection_registry",
+]
+
+logger = structlog.get_logger(config.name)
+
+_COVERAGE_SOURCES = {"butler_url", "replica"}
+"""Parts of the runtime state from which the coverage is built."""
+
+
+@dataclass(frozen=True, slots=True)
+class CollectionLimits:
+    """Limits applied to queries against a collection."""
+
+    maxrec: int
+    """Maximum number of records a query may return."""
+
+    default_maxrec: int
+    """Records returned by a query without MAXREC when lightly loaded."""
+
+    concurrency: int
+    """Maximum number of queries that may run at the same time."""
+
+    queue: int
+    """Maximum number of queries that may wait to run."""
+
+    slow_concurrency: int
+    """Maximum number of slow-lane queries that may run at the same time."""
+
+    slow_queue: int
+    """Maximum number of slow-lane queries that may wait to run."""
+
+    timeout: timedelta
+    """Deadline for queries, including time spent waiting to run."""
+
+
+@dataclass(frozen=True, slots=True)
+class CollectionRuntime:
+    """Immutable runtime state for a single collection.
+
+    Instances are never modified. When any part of the state changes, a new
+    instance is built and swapped into the registry, so a request that has
+    already looked up a collection keeps a consistent view of it.
+    """
+
+    collection: ButlerDataCollection
+    """Static configuration of the collection."""
+
+    butler_url: str
+    """URL of the Butler configuration, from service discovery."""
+
+    butler_factory: LabeledButlerFactory
+    """Factory for Butler clients for this collection."""
+
+    datalink_url: str | None
+    """URL of the DataLink links service, from service discovery."""
+
+    exporter_config: ExporterConfig
+    """ObsCore exporter configuration with the DataLink URL applied."""
+
+    limits: CollectionLimits
+    """Limits applied to queries against this collection."""
+
+    instruments: tuple[str, ...] | None = None
+    """Instruments known to the Butler, if already retrieved."""
+
+    replica: ObsCoreReplica | None = None
+    """Local snapshot of the ObsCore table, if configured."""
+
+    coverage: Coverage | None = None
+    """Sky coverage of the data products, if already built."""
+
+    @property
+    def name(self) -> str:
+        """Name of the collection."""
+        return self.collection.name
+
+
+def _load_exporter_config(
+    collection: ButlerDataCollection, datalink_url: str | None
+) -> ExporterConfig:
+    """Retrieve the ObsCore configuration and build the exporter config.
+
+    This makes HTTP requests with a sync library and therefore must not be
+    called from the main event loop thread.
+    """
+    config_data = ButlerConfig(str(collection.config))
+    exporter_config = ExporterConfig.model_validate(config_data)
+
+    # We normally should find the datalink_url_fmt attribute for each dataset
+    # type. If it doesn't exist this doesn't seem to be a critical issue.
+    # Otherwise, preserve its query arguments, but replace the rest of the URL
+    # with the URL from service discovery.
+    if datalink_url:
+        new_url = urlparse(datalink_url)
+        new_netloc = new_url.hostname or ""
+        if new_url.port:
+            new_netloc = f"{new_netloc}:{new_url.port}"
+        for settings in exporter_config.dataset_types.values():
+            if settings.datalink_url_fmt:
+                old_url = urlparse(str(settings.datalink_url_fmt))
+                merged_url = old_url._replace(
+                    scheme=new_url.scheme,
+                    netloc=new_netloc,
+                    path=new_url.path,
+                )
+                settings.datalink_url_fmt = urlunparse(merged_url)
+
+    return exporter_config
+
+
+async def _load_replica(name: str) -> ObsCoreReplica | None:
+    """Load the ObsCore replica for a collection, if one is configured."""
+    path = config.settings_for(name).replica
+    if path is None:
+        return None
+    replica = await executors.dependency.run(ObsCoreReplica.from_parquet, path)
+    logger.info(
+        "Loaded ObsCore replica",
+        collection=name,
+        path=str(path),
+        rows=len(replica),
+    )
+    return replica
+
+
+def _limits_for(name: str) -> CollectionLimits:
+    """Determine the query limits for a collection from the configuration."""
+    settings = config.settings_for(name)
+    maxrec = MAXREC_LIMIT
+    if settings.maxrec_limit is not None:
+        maxrec = min(settings.maxrec_limit, MAXREC_LIMIT)
+    return CollectionLimits(
+        maxrec=maxrec,
+        default_maxrec=min(settings.default_maxrec or maxrec, maxrec),
+        concurrency=settings.max_concurrent_queries,
+        queue=settings.max_queued_queries,
+        slow_concurrency=settings.max_concurrent_slow_queries,
+        slow_queue=settings.max_queued_slow_queries,
+        timeout=settings.query_timeout or config.query_timeout,
+    )
+
+
+class CollectionRegistry:
+    """Process-wide registry of per-collection runtime state.
+
+    The registry maps collection names to `CollectionRuntime` objects so that
+    handling a request needs only a single dictionary lookup. The mapping is
+    replaced as a whole whenever it changes rather than modified in place.
+    """
+
+    def __init__(self) -> None:
+        self._collections: dict[str, CollectionRuntime] = {}
+        self._building: dict[str, asyncio.Future[CollectionRuntime]] = {}
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def collections(self) -> dict[str, CollectionRuntime]:
+        """Current runtime state, by collection name."""
+        return self._collections
+
+    def get(self, name: str) -> CollectionRuntime | None:
+        """Return the runtime state for a collection, if it has been built.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+
+        Returns
+        -------
+        CollectionRuntime or None
+            Runtime state, or `None` if it has not yet been built.
+        """
+        return self._collections.get(name)
+
+    async def resolve(
+        self, name: str, discovery: DiscoveryClient
+    ) -> CollectionRuntime:
+        """Return the runtime state for a collection, building it if needed.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+        discovery
+            Service discovery client.
+
+        Returns
+        -------
+        CollectionRuntime
+            Runtime state for that collection.
+
+        Raises
+        ------
+        FatalFaultError
+            Raised if the collection was not found in service discovery.
+        UsageFaultError
+            Raised if the collection is not configured.
+        """
+        if runtime := self._collections.get(name):
+            return runtime
+        if name not in config.datasets:
+            raise UsageFaultError(f"Collection '{name}' not found", 404)
+
+        # Share a single build between concurrent requests for a collection
+        # that is not yet in the registry.
+        if building := self._building.get(name):
+            return await building
+        future = asyncio.get_running_loop().create_future()
+        self._building[name] = future
+        try:
+            repositories = await discovery.butler_repositories()
+            if name not in repositories:
+                msg = f"No Butler configuration found for {name}"
+                raise FatalFaultError(msg)
+            runtime = await self._build(name, repositories[name], discovery)
+            self._install(runtime)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(runtime)
+            return runtime
+        finally:
+            del self._building[name]
+
+    async def ensure(self, discovery: DiscoveryClient) -> None:
+        """Build the runtime state of any configured collection lacking one.
+
+        Collections that fail to build are logged and left to be built by the
+        first request for them.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+        """
+        missing = [d for d in config.datasets if d not in self._collections]
+        results = await asyncio.gather(
+            *(self.resolve(d, discovery) for d in missing),
+            return_exceptions=True,
+        )
+        for name, result in zip(missing, results, strict=True):
+            if isinstance(result, Exception):
+                msg = "Unable to build collection"
+                error = f"{type(result).__name__}: {result!s}"
+                logger.warning(msg, collection=name, error=error)
+            elif isinstance(result, BaseException):
+                raise result
+
+    async def refresh(
+        self, discovery: DiscoveryClient, *, reload: bool = False
+    ) -> None:
+        """Rebuild the runtime state of collections that have changed.
+
+        A collection is rebuilt if its service discovery information or
+        configuration changed. All rebuilt collections are swapped into the
+        registry at once, and collections that are no longer configured are
+        dropped. A collection that fails to rebuild keeps its previous state,
+        and the error is logged. Only one refresh runs at a time.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+        reload
+            If `True`, also reload the ObsCore configuration of every
+            collection even if nothing else changed.
+        """
+        async with self._refresh_lock:
+            await self._refresh(discovery, reload=reload)
+
+    def prune(self) -> None:
+        """Drop the runtime state of collections that are not configured."""
+        collections = {
+            n: r for n, r in self._collections.items() if n in config.datasets
+        }
+        if len(collections) != len(self._collections):
+            self._collections = collections
+
+    async def run_refresh(self, discovery: DiscoveryClient) -> None:
+        """Refresh the registry periodically until cancelled.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+        """
+        while True:
+            interval = config.registry_refresh_interval.total_seconds()
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(discovery)
+            except Exception as e:
+                msg = "Unable to refresh collections"
+                logger.warning(msg, error=f"{type(e).__name__}: {e!s}")
+
+    def seed(self, snapshot: WarmStartSnapshot) -> list[str]:
+        """Populate the registry from a warm-start snapshot.
+
+        Parameters
+        ----------
+        snapshot
+            Previously stored snapshot.
+
+        Returns
+        -------
+        list of str
+            Names of the collections restored from the snapshot.
+        """
+        collections = dict(self._collections)
+        for name in config.datasets:
+            butler_url = snapshot.butler_repositories.get(name)
+            exporter_config = snapshot.obscore_configs.get(name)
+            if not butler_url or not exporter_config:
+                continue
+            if name not in snapshot.datalink_urls:
+                continue
+            instruments = snapshot.instruments.get(name)
+            collections[name] = CollectionRuntime(
+                collection=ButlerDataCollection(
+                    config=config.obscore_config[name], name=name
+                ),
+                butler_url=butler_url,
+                butler_factory=LabeledButlerFactory({name: butler_url}),
+                datalink_url=snapshot.datalink_urls[name],
+                exporter_config=exporter_config,
+                limits=_limits_for(name),
+                instruments=tuple(instruments) if instruments else None,
+            )
+        self._collections = collections
+        return sorted(set(collections) & set(snapshot.butler_repositories))
+
+    def set_instruments(self, name: str, instruments: list[str]) -> None:
+        """Record the instruments known to the Butler for a collection.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+        instruments
+            Names of the instruments.
+        """
+        if runtime := self._collections.get(name):
+            runtime = replace(runtime, instruments=tuple(instruments))
+            self._install(runtime)
+
+    def set_coverage(self, name: str, coverage: Coverage | None) -> None:
+        """Record the sky coverage of a collection.
+
+        Parameters
+        ----------
+        name
+            Name of the collection.
+        coverage
+            Coverage of the data products, or `None` if it is not known.
+        """
+        if runtime := self._collections.get(name):
+            runtime = replace(runtime, coverage=coverage)
+            self._install(runtime)
+
+    def snapshot(self) -> WarmStartSnapshot:
+        """Capture the current state as a warm-start snapshot.
+
+        Returns
+        -------
+        WarmStartSnapshot
+            Snapshot of the current state.
+        """
+        collections = self._collections.values()
+        return WarmStartSnapshot(
+            created=datetime.now(tz=UTC),
+            butler_repositories={r.name: r.butler_url for r in collections},
+            datalink_urls={r.name: r.datalink_url for r in collections},
+            obscore_configs={r.name: r.exporter_config for r in collections},
+            instruments={
+                r.name: list(r.instruments)
+                for r in collections
+                if r.instruments is not None
+            },
+        )
+
+    async def _build(
+        self,
+        name: str,
+        butler_url: str,
+        discovery: DiscoveryClient,
+        *,
+        reload: bool = False,
+    ) -> CollectionRuntime:
+        """Build the runtime state for a collection.
+
+        Parts of the existing state that are unaffected by any changes are
+        reused, and the existing state is returned as is if nothing changed.
+        """
+        existing = self._collections.get(name)
+        collection = ButlerDataCollection(
+            config=config.obscore_config[name], name=name
+        )
+        datalink_url = await discovery.url_for_data(
+            "datalink", name, version=DATALINK_VERSION
+        )
+        limits = _limits_for(name)
+        if not existing:
+            exporter_config = await executors.dependency.run(
+                _load_exporter_config, collection, datalink_url
+            )
+            return CollectionRuntime(
+                collection=collection,
+                butler_url=butler_url,
+                butler_factory=LabeledButlerFactory({name: butler_url}),
+                datalink_url=datalink_url,
+                exporter_config=exporter_config,
+                limits=limits,
+                replica=await _load_replica(name),
+            )
+
+        changes: dict[str, Any] = {}
+        if (
+            reload
+            or existing.collection != collection
+            or existing.datalink_url != datalink_url
+        ):
+            changes["collection"] = collection
+            changes["datalink_url"] = datalink_url
+            changes["exporter_config"] = await executors.dependency.run(
+                _load_exporter_config, collection, datalink_url
+            )
+        if existing.butler_url != butler_url:
+            changes["butler_url"] = butler_url
+            changes["butler_factory"] = LabeledButlerFactory(
+                {name: butler_url}
+            )
+            changes["instruments"] = None
+        if existing.limits != limits:
+            changes["limits"] = limits
+        replica_path = existing.replica.path if existing.replica else None
+        if reload or replica_path != config.settings_for(name).replica:
+            changes["replica"] = await _load_replica(name)
+
+        # The coverage may no longer match the data, so stop using it until
+        # it is rebuilt.
+        if existing.coverage and (
+            reload or changes.keys() & _COVERAGE_SOURCES
+        ):
+            changes["coverage"] = None
+        return replace(existing, **changes) if changes else existing
+
+    async def _refresh(
+        self, discovery: DiscoveryClient, *, reload: bool
+    ) -> None:
+        """Rebuild changed collections, without locking."""
+        before = self._collections
+        repositories = await discovery.butler_repositories()
+        names = [d for d in config.datasets if d in repositories]
+        for name in set(config.datasets) - set(names):
+            msg = "No Butler configuration found for collection"
+            logger.warning(msg, collection=name)
+        results = await asyncio.gather(
+            *(
+                self._build(name, repositories[name], discovery, reload=reload)
+                for name in names
+            ),
+            return_exceptions=True,
+        )
+
+        # Collections that did not change keep whatever state they have now,
+        # which may have been updated while the refresh was running.
+        collections = {}
+        for name, result in zip(names, results, strict=True):
+            if isinstance(result, CollectionRuntime):
+                if result is before.get(name):
+                    collections[name] = self._collections.get(name, result)
+                else:
+                    collections[name] = result
+            elif isinstance(result, Exception):
+                if name in self._collections:
+                    collections[name] = self._collections[name]
+                msg = "Unable to refresh collection"
+                error = f"{type(result).__name__}: {result!s}"
+                logger.warning(msg, collection=name, error=error)
+            else:
+                raise result
+        self._collections = collections
+
+    def _install(self, runtime: CollectionRuntime) -> None:
+        """Swap the runtime state for one collection into the registry."""
+        self._collections = {**self._collections, runtime.name: runtime}
+
+
+collection_registry = CollectionRegistry()
+"""Process-wide registry of per-collection runtime state."""
@@ -0,0 +1,330 @@
+"""Local replicas of ObsCore tables for answering queries in memory."""
+
+import math
+from collections.abc import Collection, Sequence
+from pathlib import Path
+from typing import Self
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from astropy.io.votable.tree import VOTableFile
+from astropy.time import Time
+from lsst.daf.butler import Butler, Timespan
+from lsst.dax.obscore import ExporterConfig
+from lsst.dax.obscore.siav2 import Interval, SIAv2Parameters
+from lsst.sphgeom import Angle, Circle, LonLat, Region, UnitVector3d
+from pyarrow import parquet
+
+from .coverage import Coverage
+from .obscore import TableExporter
+
+__all__ = ["ObsCoreReplica"]
+
+_DID_COLUMN = "obs_publisher_did"
+"""Column that uniquely identifies a data product in ObsCore results."""
+
+_ID_PATTERN = r"(?:[?&]id=|^butler://[^/]*/)(?P<id>[0-9A-Fa-f-]+)"
+"""Pattern for the dataset ID in a Butler dataset URI."""
+
+
+class ObsCoreReplica:
+    """Snapshot of the ObsCore table of a collection, queried in memory.
+
+    The snapshot is a Parquet file as written by the ObsCore exporter, which
+    is memory-mapped rather than read. The columns used for constraints are
+    converted to NumPy arrays when the snapshot is loaded, with sorted
+    indexes on dataset ID, declination and start time, so that a query is
+    answered by vectorized filtering without any Butler query.
+
+    The constraints are applied the same way as by the Butler query, based
+    on the ObsCore columns rather than the Butler dimension records. POS
+    matches data products whose bounding circle, given by ``s_ra``,
+    ``s_dec`` and ``s_fov``, overlaps the region, and BAND matches those
+    whose ``em_min`` to ``em_max`` range overlaps the interval. ID matches
+    data products by the dataset ID in ``obs_publisher_did``, ignoring the
+    repository label, as the Butler does.
+
+    Parameters
+    ----------
+    path
+        Path to the snapshot.
+    table
+        Contents of the snapshot.
+    """
+
+    def __init__(self, path: Path, table: pa.Table) -> None:
+        self.path = path
+        self._table = table
+
+        ids = _dataset_ids(table)
+        self._id_order = np.argsort(ids, kind="stable")
+        self._ids_sorted = ids[self._id_order]
+
+        ra = np.radians(_float_column(table, "s_ra"))
+        dec = _float_column(table, "s_dec")
+        lat = np.radians(dec)
+        self._vectors = np.column_stack(
+            (np.cos(lat) * np.cos(ra), np.cos(lat) * np.sin(ra), np.sin(lat))
+        )
+        self._radius = np.nan_to_num(_float_column(table, "s_fov") / 2)
+        self._max_radius = float(self._radius.max(initial=0))
+        self._dec_order = np.argsort(dec, kind="stable")
+        self._dec_sorted = dec[self._dec_order]
+
+        t_min = _float_column(table, "t_min")
+        self._t_max = _float_column(table, "t_max")
+        self._t_min_order = np.argsort(t_min, kind="stable")
+        self._t_min_sorted = t_min[self._t_min_order]
+
+        self._em_min = _float_column(table, "em_min")
+        self._em_max = _float_column(table, "em_max")
+        self._exptime = _float_column(table, "t_exptime")
+        self._calib = _float_column(table, "calib_level")
+
+    @classmethod
+    def from_parquet(cls, path: Path) -> Self:
+        """Load a snapshot.
+
+        This reads files and therefore must not be called from the main event
+        loop thread.
+
+        Parameters
+        ----------
+        path
+            Path to the Parquet snapshot.
+
+        Returns
+        -------
+        ObsCoreReplica
+            Loaded replica.
+        """
+        return cls(path, parquet.read_table(path, memory_map=True))
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def coverage(self, level: int) -> Coverage:
+        """Build the sky coverage of the data products in the replica.
+
+        This is CPU-bound and therefore should not be called from the main
+        event loop thread.
+
+        Parameters
+        ----------
+        level
+            HEALPix level of the coverage.
+
+        Returns
+        -------
+        Coverage
+            Coverage of the bounding circles of the data products.
+        """
+        return Coverage.from_circles(
+            _float_column(self._table, "s_ra"),
+            _float_column(self._table, "s_dec"),
+            self._radius,
+            level,
+        )
+
+    def query(
+        self,
+        params: SIAv2Parameters,
+        exporter_config: ExporterConfig,
+        *,
+        query_url: str | None = None,
+        query_string: str | None = None,
+    ) -> VOTableFile:
+        """Run a query against the replica.
+
+        This is CPU-bound and therefore should not be called from the main
+        event loop thread.
+
+        Parameters
+        ----------
+        params
+            Parameters of the query.
+        exporter_config
+            ObsCore exporter configuration of the collection, used for the
+            metadata of the result.
+        query_url
+            URL the user sent the query to, included in the result.
+        query_string
+            Human-readable query, included in the result.
+
+        Returns
+        -------
+        VOTableFile
+            Result, in the same form as a Butler query.
+        """
+        rows = self.select(params)
+        overflow = params.maxrec is not None and len(rows) > params.maxrec
+        if overflow:
+            rows = rows[: params.maxrec]
+        exporter = TableExporter(
+            exporter_config, self._table.take(rows), overflow=overflow
+        )
+        return exporter.to_votable(
+            query_url=query_url, query_string=query_string
+        )
+
+    def select(self, params: SIAv2Parameters) -> np.ndarray:
+        """Find the rows matching the constraints of a query.
+
+        Parameters
+        ----------
+        params
+            Parameters of the query. MAXREC is ignored.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the matching rows, in the order of the snapshot.
+        """
+        match = np.ones(len(self._table), dtype=bool)
+        if params.id:
+            match[:] = False
+            match[self._find_ids(params.id)] = True
+        if params.pos:
+            match &= self._match_pos(params.pos)
+        if params.time:
+            match &= self._match_time(params.time)
+        if params.band:
+            match &= _overlaps(self._em_min, self._em_max, params.band)
+        if params.exptime:
+            match &= _within(self._exptime, params.exptime)
+        if params.calib:
+            match &= np.isin(self._calib, list(params.calib))
+        if params.dptype:
+            match &= self._is_in("dataproduct_type", params.dptype)
+        if params.dpsubtype:
+            match &= self._is_in("dataproduct_subtype", params.dpsubtype)
+        if params.instrument:
+            match &= self._is_in("instrument_name", params.instrument)
+        return np.flatnonzero(match)
+
+    def _find_ids(self, uris: Sequence[str]) -> np.ndarray:
+        """Find the rows for any of the dataset URIs.
+
+        Raises `ValueError` for URIs that are not Butler dataset URIs, as
+        the Butler query does.
+        """
+        ids = [Butler.parse_dataset_uri(u).dataset_id.hex for u in uris]
+        keys = np.array(ids, dtype="S32")
+        starts = np.searchsorted(self._ids_sorted, keys, "left")
+        ends = np.searchsorted(self._ids_sorted, keys, "right")
+        rows = [self._id_order[s:e] for s, e in zip(starts, ends, strict=True)]
+        return np.concatenate(rows)
+
+    def _is_in(self, name: str, values: Collection[str]) -> np.ndarray:
+        """Match rows whose value of a string column is one of the values."""
+        if name not in self._table.column_names:
+            return np.zeros(len(self._table), dtype=bool)
+        value_set = pa.array(list(values), type=pa.string())
+        result = pc.is_in(self._table[name], value_set=value_set)
+        return pc.fill_null(result, False).to_numpy()
+
+    def _match_pos(self, regions: Sequence[Region]) -> np.ndarray:
+        """Match rows overlapping any of the regions."""
+        match = np.zeros(len(self._table), dtype=bool)
+        for region in regions:
+            circle = region.getBoundingCircle()
+            center = circle.getCenter()
+            dec = LonLat(center).getLat().asDegrees()
+            radius = circle.getOpeningAngle().asDegrees()
+
+            # Use the declination index to find rows that may be close enough,
+            # then check their separation from the bounding circle.
+            reach = radius + self._max_radius
+            start = np.searchsorted(self._dec_sorted, dec - reach, "left")
+            end = np.searchsorted(self._dec_sorted, dec + reach, "right")
+            rows = self._dec_order[start:end]
+            cos = self._vectors[rows] @ (center.x(), center.y(), center.z())
+            separation = np.degrees(np.arccos(np.clip(cos, -1, 1)))
+            rows = rows[separation <= radius + self._radius[rows]]
+
+            # Bounding circles are exact for circles, but other regions have
+            # to be checked individually.
+            if not isinstance(region, Circle):
+                rows = rows[[self._overlaps(region, r) for r in rows]]
+            match[rows] = True
+        return match
+
+    def _match_time(self, times: Sequence[Timespan | Time]) -> np.ndarray:
+        """Match rows overlapping any of the times."""
+        match = np.zeros(len(self._table), dtype=bool)
+        for time in times:
+            if isinstance(time, Timespan):
+                if time.isEmpty():
+                    continue
+                begin = -math.inf
+                if isinstance(time.begin, Time):
+                    begin = time.begin.utc.mjd
+                end = math.inf
+                if isinstance(time.end, Time):
+                    end = time.end.utc.mjd
+                index = np.searchsorted(self._t_min_sorted, end, "left")
+                rows = self._t_min_order[:index]
+                rows = rows[self._t_max[rows] > begin]
+            else:
+                mjd = time.utc.mjd
+                index = np.searchsorted(self._t_min_sorted, mjd, "right")
+                rows = self._t_min_order[:index]
+                rows = rows[self._t_max[rows] > mjd]
+            match[rows] = True
+        return match
+
+    def _overlaps(self, region: Region, row: int) -> bool:
+        """Check whether the bounding circle of a row overlaps a region."""
+        center = UnitVector3d(*self._vectors[row])
+        circle = Circle(center, Angle.fromDegrees(self._radius[row]))
+        return region.overlaps(circle) is not False
+
+
+def _dataset_ids(table: pa.Table) -> np.ndarray:
+    """Extract the dataset IDs from the ``obs_publisher_did`` column.
+
+    IDs are returned as lowercase hexadecimal without dashes, with an empty
+    string for rows without a dataset URI.
+    """
+    if _DID_COLUMN not in table.column_names:
+        return np.zeros(len(table), dtype="S32")
+    dids = pc.fill_null(table[_DID_COLUMN], "")
+    ids = pc.struct_field(pc.extract_regex(dids, _ID_PATTERN), "id")
+    ids = pc.replace_substring(pc.utf8_lower(pc.fill_null(ids, "")), "-", "")
+    return ids.to_numpy(zero_copy_only=False).astype("S32")
+
+
+def _float_column(table: pa.Table, name: str) -> np.ndarray:
+    """Convert a numeric column to floats, with NaN for missing values."""
+    if name not in table.column_names:
+        return np.full(len(table), np.nan)
+    column = pc.cast(table[name], pa.float64())
+    return pc.fill_null(column, np.nan).to_numpy()
+
+
+def _overlaps(
+    lower: np.ndarray, upper: np.ndarray, intervals: Sequence[Interval]
+) -> np.ndarray:
+    """Match rows whose range overlaps any of the intervals."""
+    match = np.zeros(len(lower), dtype=bool)
+    for interval in intervals:
+        match |= (lower <= interval.end) & (upper >= interval.start)
+    return match
+
+
+def _within(values: np.ndarray, intervals: Sequence[Interval]) -> np.ndarray:
+    """Match rows whose value is strictly within any of the intervals.
+
+    Infinite bounds are not applied, so that rows without a value match an
+    unbounded interval, as in the Butler query.
+    """
+    match = np.zeros(len(values), dtype=bool)
+    for interval in intervals:
+        within = np.ones(len(values), dtype=bool)
+        if math.isfinite(interval.start):
+            within &= values > interval.start
+        if math.isfinite(interval.end):
+            within &= values < interval.end
+        match |= within
+    return match
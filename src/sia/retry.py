@@ -0,0 +1,264 @@
+"""Retries and hedging for idempotent Butler calls."""
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from collections.abc import Callable
+from datetime import timedelta
+
+from lsst.daf.butler.remote_butler import ButlerServerError  # type: ignore[attr-defined]
+from structlog.stdlib import BoundLogger
+
+from .config import config
+from .executors import InstrumentedExecutor
+
+__all__ = [
+    "ButlerLatencies",
+    "ButlerRetrier",
+    "LatencyWindow",
+    "butler_latencies",
+    "is_transient",
+]
+
+_MAX_BACKOFF = 10.0
+"""Upper bound on the delay before a retry, in seconds."""
+
+_WINDOW_SIZE = 200
+"""Number of recent Butler call latencies used to compute percentiles."""
+
+_MIN_SAMPLES = 20
+"""Number of latencies required before hedging is attempted."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Determine whether a Butler failure is worth retrying.
+
+    Connection failures and 5xx responses from the Butler server are
+    transient. Everything else, including errors in the query itself that
+    the server reports back, would fail the same way again.
+
+    Parameters
+    ----------
+    exc
+        Exception raised by the Butler call.
+
+    Returns
+    -------
+    bool
+        Whether the call may succeed if retried.
+    """
+    if not isinstance(exc, ButlerServerError):
+        return False
+    return exc.status_code is None or exc.status_code >= 500
+
+
+class LatencyWindow:
+    """Latencies of recent successful Butler calls of one kind."""
+
+    def __init__(self) -> None:
+        self._latencies: deque[float] = deque(maxlen=_WINDOW_SIZE)
+
+    def percentile(self, percentile: float) -> float | None:
+        """Return a percentile of recent latencies.
+
+        Parameters
+        ----------
+        percentile
+            Percentile to compute, between 0 and 100.
+
+        Returns
+        -------
+        float or None
+            Latency in seconds, or `None` if too few calls have been seen.
+        """
+        if len(self._latencies) < _MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        index = math.ceil(percentile / 100 * len(latencies)) - 1
+        return latencies[max(0, index)]
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a successful call.
+
+        Parameters
+        ----------
+        latency
+            Time spent in the call, excluding any wait for a thread, in
+            seconds.
+        """
+        self._latencies.append(latency)
+
+
+class ButlerLatencies:
+    """Process-wide latency windows, by collection and kind of call."""
+
+    def __init__(self) -> None:
+        self._windows: dict[tuple[str, str], LatencyWindow] = {}
+
+    def get(self, collection: str, operation: str) -> LatencyWindow:
+        """Return the latency window for a kind of call to a collection.
+
+        Parameters
+        ----------
+        collection
+            Name of the collection.
+        operation
+            Kind of Butler call.
+
+        Returns
+        -------
+        LatencyWindow
+            Latencies of recent calls, created if needed.
+        """
+        key = (collection, operation)
+        if key not in self._windows:
+            self._windows[key] = LatencyWindow()
+        return self._windows[key]
+
+    def reset(self) -> None:
+        """Forget all latencies."""
+        self._windows = {}
+
+
+class ButlerRetrier:
+    """Run an idempotent Butler call with retries and optional hedging.
+
+    Calls that fail with a transient error are retried with exponential
+    backoff and full jitter, up to the configured number of retries. No
+    retry is attempted if its delay would take it past the deadline.
+
+    If hedging is enabled and enough calls have been seen to know the
+    configured latency percentile, a second attempt is started when the
+    first has run for longer than that percentile, and whichever finishes
+    first successfully is used. The other is abandoned. Since a call
+    already running in a thread cannot be interrupted, it still finishes in
+    the background, so hedging trades Butler server load for lower tail
+    latency.
+
+    Parameters
+    ----------
+    executor
+        Thread pool in which to run the call.
+    latencies
+        Latencies of recent calls of the same kind, used for hedging.
+    logger
+        Logger to use.
+    deadline
+        Event loop time after which no retry should be started, if any.
+    """
+
+    def __init__(
+        self,
+        executor: InstrumentedExecutor,
+        latencies: LatencyWindow,
+        logger: BoundLogger,
+        *,
+        deadline: float | None = None,
+    ) -> None:
+        self._executor = executor
+        self._latencies = latencies
+        self._logger = logger
+        self._deadline = deadline
+
+    async def run[**P, T](
+        self, func: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> tuple[T, timedelta]:
+        """Run a Butler call, retrying transient failures.
+
+        Parameters
+        ----------
+        func
+            Blocking function that makes the Butler call.
+        *args
+            Positional arguments to the function.
+        **kwargs
+            Keyword arguments to the function.
+
+        Returns
+        -------
+        tuple of T and datetime.timedelta
+            Return value of the function and the time the successful attempt
+            spent waiting for a free thread.
+
+        Raises
+        ------
+        Exception
+            The exception from the last attempt, if no attempt succeeded.
+        """
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(func, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e) or attempt >= config.butler_retries:
+                    raise
+                base = config.butler_retry_backoff.total_seconds()
+                backoff = min(_MAX_BACKOFF, base * 2**attempt)
+                delay = random.uniform(0, backoff)  # noqa: S311
+                if self._deadline and loop.time() + delay >= self._deadline:
+                    raise
+                attempt += 1
+                self._logger.warning(
+                    "Retrying Butler call after transient failure",
+                    attempt=attempt,
+                    delay_seconds=round(delay, 3),
+                    error=f"{type(e).__name__}: {e!s}",
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt[**P, T](
+        self, func: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> tuple[T, timedelta]:
+        """Make one attempt at the call, hedging it if it is slow."""
+        threshold = None
+        if config.butler_hedge_percentile is not None:
+            percentile = config.butler_hedge_percentile
+            threshold = self._latencies.percentile(percentile)
+
+        if threshold is None:
+            return await self._timed(func, *args, **kwargs)
+        primary = asyncio.create_task(self._timed(func, *args, **kwargs))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self._logger.info(
+            "Starting hedged Butler call",
+            threshold_seconds=round(threshold, 3),
+        )
+        hedge = asyncio.create_task(self._timed(func, *args, **kwargs))
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed[**P, T](
+        self, func: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> tuple[T, timedelta]:
+        """Run the call and record its latency if it succeeds."""
+        start = time.monotonic()
+        result, wait = await self._executor.run_timed(func, *args, **kwargs)
+        latency = time.monotonic() - start - wait.total_seconds()
+        self._latencies.record(latency)
+        return result, wait
+
+
+butler_latencies = ButlerLatencies()
+"""Process-wide latencies of recent Butler calls."""
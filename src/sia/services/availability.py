@@ -1,39 +1,129 @@
 """Service for checking the availability of the system."""
 
-from httpx import AsyncClient, HTTPError
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+
+from httpx import AsyncClient
+from structlog.stdlib import BoundLogger
 from vo_models.vosi.availability import Availability
 
+from ..config import config
+from ..health import CollectionHealth, HealthTracker
+from ..registry import CollectionRegistry, CollectionRuntime
+
 __all__ = ["AvailabilityService"]
 
 
 class AvailabilityService:
     """Service for checking the availability of the system.
 
+    The Butler server for each collection is probed periodically in the
+    background and the results are recorded in the health tracker, from
+    which availability requests are answered.
+
     Parameters
     ----------
     http_client
         HTTP client to use for health checks.
+    health
+        Record of the health of each collection.
+    logger
+        Logger to use.
     """
 
-    def __init__(self, http_client: AsyncClient) -> None:
+    def __init__(
+        self,
+        http_client: AsyncClient,
+        health: HealthTracker,
+        logger: BoundLogger,
+    ) -> None:
         self._client = http_client
+        self._health = health
+        self._logger = logger
 
-    async def get_availability(self, butler_url: str) -> Availability:
+    async def get_availability(
+        self, collection: CollectionRuntime
+    ) -> Availability:
         """Check the availability of the system.
 
+        The last probe result is used if there is one. Otherwise, the Butler
+        server is probed immediately.
+
         Parameters
         ----------
-        butler_url
-            URL to check the health of the underlying Butler server.
+        collection
+            Collection to check the health of the underlying Butler server.
 
         Returns
         -------
         Availability
             The availability of the service.
         """
+        health = self._health.get(collection.name)
+        if not health:
+            health = await self.probe(collection)
+        if health.available:
+            return Availability(available=True)
+        return Availability(note=[health.error or ""], available=False)
+
+    async def probe(self, collection: CollectionRuntime) -> CollectionHealth:
+        """Probe the Butler server for a collection and record the result.
+
+        Parameters
+        ----------
+        collection
+            Collection to probe.
+
+        Returns
+        -------
+        CollectionHealth
+            Newly-recorded health of the collection.
+        """
+        timeout = config.availability_probe_timeout.total_seconds()
+        was_open = self._health.is_open(collection.name)
+        checked = datetime.now(tz=UTC)
+        start = time.perf_counter()
+        error = None
         try:
-            r = await self._client.get(butler_url)
+            r = await self._client.get(collection.butler_url, timeout=timeout)
             r.raise_for_status()
-            return Availability(available=True)
-        except HTTPError as exc:
-            return Availability(note=[str(exc)], available=False)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        latency = timedelta(seconds=time.perf_counter() - start)
+        health = self._health.record(
+            collection.name, checked=checked, latency=latency, error=error
+        )
+        is_open = self._health.is_open(collection.name)
+        if is_open and not was_open:
+            msg = "Butler server unavailable, rejecting queries"
+            self._logger.warning(msg, collection=collection.name, error=error)
+        elif was_open and not is_open:
+            msg = "Butler server available again, accepting queries"
+            self._logger.info(msg, collection=collection.name)
+        return health
+
+    async def probe_all(self, registry: CollectionRegistry) -> None:
+        """Probe the Butler servers of all known collections concurrently.
+
+        Parameters
+        ----------
+        registry
+            Registry of per-collection runtime state.
+        """
+        collections = list(registry.collections.values())
+        self._health.retain({c.name for c in collections})
+        await asyncio.gather(*(self.probe(c) for c in collections))
+
+    async def run_probes(self, registry: CollectionRegistry) -> None:
+        """Probe all collections periodically until cancelled.
+
+        Parameters
+        ----------
+        registry
+            Registry of per-collection runtime state.
+        """
+        while True:
+            await self.probe_all(registry)
+            interval = config.availability_probe_interval.total_seconds()
+            await asyncio.sleep(interval)
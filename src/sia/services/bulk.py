@@ -0,0 +1,242 @@
+"""Run an SIA query for each position in an uploaded table."""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from dataclasses import replace
+from xml.sax.saxutils import escape
+
+from astropy.io.votable.tree import VOTableFile
+from structlog.stdlib import BoundLogger
+
+from ..config import config
+from ..executors import executors
+from ..models.sia_query_params import SIAQueryParams
+from ..upload import Cone
+from ..votable import (
+    add_column,
+    merge_results,
+    query_status,
+    set_query_status,
+    to_xml,
+)
+from .query import QueryService
+
+__all__ = ["ROW_COLUMN", "BulkQueryService"]
+
+ROW_COLUMN = "upload_row"
+"""Column linking each result row to its position in the uploaded table."""
+
+_TABLE_END = b"</TABLE>"
+_TABLEDATA_START = b"<TABLEDATA>"
+_TABLEDATA_END = b"</TABLEDATA>"
+
+
+class BulkQueryService:
+    """Run an SIA query for each position in an uploaded table.
+
+    Each position is queried separately through a normal query service, so
+    it is subject to the same deadline as any other query. Positions are
+    queried in batches, concurrently within a batch, and the rows for each
+    batch are streamed to the client as soon as the batch finishes. Each
+    batch holds a single slot in the slow lane of the collection, so it is
+    queued fairly against other users as one query.
+
+    Parameters
+    ----------
+    create_query_service
+        Called to create the query service for each position.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self,
+        create_query_service: Callable[[], QueryService],
+        logger: BoundLogger,
+    ) -> None:
+        self._create_query_service = create_query_service
+        self._logger = logger
+
+    async def run_query_votable(
+        self,
+        cones: Sequence[Cone],
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        *,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Start the bulk query and return the VOTable as a stream.
+
+        The first batch is run before returning, so that errors that affect
+        every position, such as an unavailable Butler server, are raised
+        normally. Errors in later batches end the table early and are
+        reported in a trailing ``QUERY_STATUS`` info element with a value of
+        ``ERROR``. If the results for any position overflowed MAXREC, a
+        trailing ``QUERY_STATUS`` info element with a value of ``OVERFLOW``
+        is added.
+
+        Parameters
+        ----------
+        cones
+            Positions to query. Must not be empty.
+        raw_params
+            Parameters for the SIAv2 query, other than POS, which are applied
+            to every position.
+        query_url
+            URL the user sent the query to, which has to be reflected in the
+            VOTable output.
+        user
+            Authenticated username.
+        is_disconnected
+            If given, called periodically to check whether the client has
+            disconnected.
+
+        Returns
+        -------
+        AsyncIterator of bytes
+            Chunks of the resulting VOTable. The rows have an additional
+            ``upload_row`` column giving the index of the matching position
+            in the uploaded table, starting from 0.
+
+        Raises
+        ------
+        TransientFaultError
+            Raised if the query for any position in the first batch failed
+            with this error.
+        UsageFaultError
+            Raised if the client disconnected before the first batch
+            finished.
+        """
+        size = config.bulk_batch_size
+        batches = [cones[i : i + size] for i in range(0, len(cones), size)]
+        self._logger = self._logger.bind(
+            positions=len(cones), batches=len(batches)
+        )
+        self._logger.info("Starting bulk SIA query")
+        start = time.monotonic()
+
+        async def run(index: int) -> tuple[bytes, bool]:
+            return await self._run_batch(
+                index,
+                batches[index],
+                raw_params=raw_params,
+                query_url=query_url,
+                user=user,
+                is_disconnected=is_disconnected,
+            )
+
+        xml, overflow = await run(0)
+        prefix, rows, suffix = _split(xml)
+
+        async def stream() -> AsyncIterator[bytes]:
+            yield prefix
+            yield rows
+            status = "OVERFLOW" if overflow else None
+            message = ""
+            for index in range(1, len(batches)):
+                try:
+                    xml, batch_overflow = await run(index)
+                except Exception as e:
+                    self._logger.warning(
+                        "Bulk SIA query failed", batch=index, error=str(e)
+                    )
+                    status, message = "ERROR", str(e)
+                    break
+                if batch_overflow:
+                    status = "OVERFLOW"
+                yield _split(xml)[1]
+            yield _close(suffix, status, message)
+            self._logger.info(
+                "Bulk SIA query completed",
+                total_duration_seconds=round(time.monotonic() - start, 3),
+            )
+
+        return stream()
+
+    async def _run_batch(
+        self,
+        index: int,
+        cones: Sequence[Cone],
+        *,
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        is_disconnected: Callable[[], Awaitable[bool]] | None,
+    ) -> tuple[bytes, bool]:
+        """Query one batch of positions.
+
+        Returns the serialized results and whether any of them overflowed.
+        """
+        offset = index * config.bulk_batch_size
+        semaphore = asyncio.Semaphore(config.bulk_concurrency)
+
+        async def run_one(cone: Cone) -> VOTableFile:
+            params = replace(raw_params, pos=[cone.to_pos()])
+            async with semaphore:
+                service = self._create_query_service()
+                return await service.run_query(
+                    params, query_url, user, hold_slot=False
+                )
+
+        # The whole batch runs in one slot, watched for disconnects once,
+        # so that its positions are not queued and shed one by one.
+        batch_service = self._create_query_service()
+        async with batch_service.batch_slot(
+            user, is_disconnected=is_disconnected
+        ):
+            tasks = [asyncio.create_task(run_one(c)) for c in cones]
+            try:
+                results = await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        rows = range(offset, offset + len(cones))
+        xml, overflow = await executors.serialization.run(
+            _serialize_batch, results, rows
+        )
+        self._logger.info(
+            "Bulk SIA query batch completed",
+            batch=index,
+            overflow=overflow,
+        )
+        return xml, overflow
+
+
+def _close(suffix: bytes, status: str | None, message: str = "") -> bytes:
+    """Close the result table, adding a trailing query status if given."""
+    info = b""
+    if status:
+        element = f'<INFO name="QUERY_STATUS" value="{status}">'
+        info = f"{element}{escape(message)}</INFO>".encode()
+    end = len(_TABLE_END)
+    closing = _TABLEDATA_END + b"</DATA>"
+    return closing + suffix[:end] + info + suffix[end:]
+
+
+def _serialize_batch(
+    results: Sequence[VOTableFile], rows: Sequence[int]
+) -> tuple[bytes, bool]:
+    """Label the results for a batch with their rows and serialize them."""
+    for votable, row in zip(results, rows, strict=True):
+        add_column(votable, ROW_COLUMN, row)
+    merged = merge_results(results, None, deduplicate=False)
+    overflow = query_status(merged) == "OVERFLOW"
+    set_query_status(merged, "OK")
+    return to_xml(merged), overflow
+
+
+def _split(xml: bytes) -> tuple[bytes, bytes, bytes]:
+    """Split a serialized result around its rows.
+
+    Returns the document up to the start of the rows, including the opening
+    of the table data, the rows, and the document from the end of the table.
+    """
+    end = xml.index(_TABLE_END)
+    start = xml.find(_TABLEDATA_START)
+    if start < 0:
+        return xml[:end] + b"<DATA>" + _TABLEDATA_START, b"", xml[end:]
+    start += len(_TABLEDATA_START)
+    return xml[:start], xml[start : xml.index(_TABLEDATA_END)], xml[end:]
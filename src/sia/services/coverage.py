@@ -0,0 +1,154 @@
+"""Build the sky coverage of collections in the background."""
+
+import asyncio
+
+import numpy as np
+from lsst.daf.butler import Butler
+from lsst.sphgeom import LonLat
+from structlog.stdlib import BoundLogger
+
+from ..config import config
+from ..coverage import Coverage
+from ..executors import executors
+from ..registry import CollectionRegistry, CollectionRuntime
+from ..replica import ObsCoreReplica
+
+__all__ = ["CoverageService"]
+
+
+class CoverageService:
+    """Build the sky coverage of collections in the background.
+
+    The coverage of a collection is built from the regions of a Butler
+    dimension, if one is configured for it, or otherwise from its ObsCore
+    replica, if it has one. Collections with neither have no coverage.
+    Coverage built from a replica is only rebuilt when the replica changes.
+
+    Parameters
+    ----------
+    registry
+        Registry of per-collection runtime state.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self, *, registry: CollectionRegistry, logger: BoundLogger
+    ) -> None:
+        self._registry = registry
+        self._logger = logger
+        self._replicas: dict[str, tuple[ObsCoreReplica, Coverage]] = {}
+
+    async def build(self, collection: CollectionRuntime) -> Coverage | None:
+        """Build the coverage of a collection.
+
+        Parameters
+        ----------
+        collection
+            Collection to build the coverage of.
+
+        Returns
+        -------
+        Coverage or None
+            Coverage of the collection, or `None` if it cannot be built.
+        """
+        name = collection.name
+        level = config.coverage_level
+        dimension = config.settings_for(name).coverage_dimension
+        if dimension:
+            if not config.service_token:
+                return None
+            token = config.service_token.get_secret_value()
+            butler = await executors.dependency.run(
+                collection.butler_factory.create_butler,
+                label=name,
+                access_token=token,
+            )
+            return await executors.query.run(
+                self._build_from_butler, butler, dimension, level
+            )
+
+        replica = collection.replica
+        if not replica:
+            return None
+        if cached := self._replicas.get(name):
+            cached_replica, coverage = cached
+            if cached_replica is replica and coverage.level == level:
+                return coverage
+        coverage = await executors.dependency.run(replica.coverage, level)
+        self._replicas[name] = (replica, coverage)
+        return coverage
+
+    async def build_all(self) -> None:
+        """Build the coverage of all known collections concurrently.
+
+        Collections whose coverage fails to build keep their previous
+        coverage, and the error is logged.
+        """
+        collections = list(self._registry.collections.values())
+        results = await asyncio.gather(
+            *(self.build(c) for c in collections), return_exceptions=True
+        )
+        for collection, result in zip(collections, results, strict=True):
+            name = collection.name
+            if isinstance(result, Exception):
+                self._logger.warning(
+                    "Unable to build coverage",
+                    collection=name,
+                    error=f"{type(result).__name__}: {result!s}",
+                )
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            self._registry.set_coverage(name, result)
+            if result:
+                self._logger.info(
+                    "Built coverage",
+                    collection=name,
+                    level=result.level,
+                    ranges=len(result),
+                    sky_fraction=round(result.sky_fraction, 6),
+                )
+        self._replicas = {
+            n: c for n, c in self._replicas.items() if n in config.datasets
+        }
+
+    async def run_builds(self) -> None:
+        """Build the coverage of all collections periodically until cancelled.
+
+        The first build starts immediately.
+        """
+        while True:
+            await self.build_all()
+            interval = config.coverage_refresh_interval.total_seconds()
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _build_from_butler(
+        butler: Butler, dimension: str, level: int
+    ) -> Coverage:
+        """Build the coverage of the regions of a dimension.
+
+        Regions are replaced by their bounding circles. Records without a
+        region are ignored, since no POS constraint can match them.
+        """
+        records = butler.query_dimension_records(
+            dimension, limit=None, explain=False
+        )
+        circles = []
+        for record in records:
+            if record.region is None:
+                continue
+            circle = record.region.getBoundingCircle()
+            center = LonLat(circle.getCenter())
+            circles.append(
+                (
+                    center.getLon().asDegrees(),
+                    center.getLat().asDegrees(),
+                    circle.getOpeningAngle().asDegrees(),
+                )
+            )
+        array = np.array(circles, dtype=float).reshape(-1, 3)
+        return Coverage.from_circles(
+            array[:, 0], array[:, 1], array[:, 2], level
+        )
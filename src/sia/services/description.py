@@ -3,11 +3,14 @@
 import asyncio
 
 from lsst.daf.butler import Butler
-from lsst.dax.obscore import ExporterConfig
+from structlog.stdlib import BoundLogger
 
 from ..constants import BASE_RESOURCE_IDENTIFIER
+from ..executors import executors
 from ..models.description import SelfDescription
 from ..models.sia_query_params import BandInfo
+from ..registry import CollectionRegistry, CollectionRuntime
+from ..retry import ButlerRetrier, butler_latencies
 
 __all__ = ["SelfDescriptionService"]
 
@@ -23,13 +26,27 @@ class SelfDescriptionService:
     ----------
     butler
         Butler instance for this collection.
-    obscore_config
-        ObsCore exporter configuration for this collection.
+    collection
+        Runtime state of this collection.
+    registry
+        Registry in which to cache the instruments for this collection, if
+        they have to be retrieved from the Butler.
+    logger
+        Logger to use.
     """
 
-    def __init__(self, butler: Butler, obscore_config: ExporterConfig) -> None:
+    def __init__(
+        self,
+        butler: Butler,
+        collection: CollectionRuntime,
+        registry: CollectionRegistry,
+        logger: BoundLogger,
+    ) -> None:
         self._butler = butler
-        self._obscore_config = obscore_config
+        self._collection = collection
+        self._registry = registry
+        self._logger = logger
+        self._obscore_config = collection.exporter_config
 
     async def get_description(self) -> SelfDescription:
         """Return self-description metadata for the SIAv2 service.
@@ -40,9 +57,22 @@ class SelfDescriptionService:
             Self-description metadata suitable for producing a templated
             response.
         """
-        instruments = await asyncio.to_thread(
-            self._butler.query_dimension_records, "instrument"
-        )
+        if self._collection.instruments is not None:
+            instruments = list(self._collection.instruments)
+        else:
+            loop = asyncio.get_running_loop()
+            timeout = self._collection.limits.timeout.total_seconds()
+            retrier = ButlerRetrier(
+                executors.query,
+                butler_latencies.get(self._collection.name, "instruments"),
+                self._logger,
+                deadline=loop.time() + timeout,
+            )
+            records, _ = await retrier.run(
+                self._butler.query_dimension_records, "instrument"
+            )
+            instruments = [r.name for r in records]
+            self._registry.set_instruments(self._collection.name, instruments)
 
         label = self._obscore_config.obs_collection
         bands = [
@@ -57,7 +87,7 @@ class SelfDescriptionService:
         }
 
         return SelfDescription(
-            instruments=[i.name for i in instruments],
+            instruments=instruments,
             collections=[label] if label else [],
             resource_identifier=f"{BASE_RESOURCE_IDENTIFIER}/{label}",
             facility_name=self._obscore_config.facility_name.strip(),
@@ -0,0 +1,115 @@
+"""Run an SIA query against several collections and merge the results."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Mapping
+
+from structlog.stdlib import BoundLogger
+
+from ..exceptions import UsageFaultError
+from ..executors import executors
+from ..models.sia_query_params import SIAQueryParams
+from ..votable import column_names, merge_collections, to_xml
+from .query import QueryService
+
+__all__ = ["FederatedQueryService"]
+
+
+class FederatedQueryService:
+    """Run an SIA query against several collections and merge the results.
+
+    The query runs against every collection concurrently, each through the
+    normal query service for that collection and so subject to its limits,
+    lanes and deadline. The wall time is that of the slowest collection.
+
+    Parameters
+    ----------
+    services
+        Query service for each collection, keyed by collection name.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self, services: Mapping[str, QueryService], logger: BoundLogger
+    ) -> None:
+        self._services = services
+        self._logger = logger
+
+    async def run_query_votable(
+        self,
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        *,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> bytes:
+        """Process the SIAv2 query and generate a merged VOTable (as bytes).
+
+        The results are merged with a ``collection_name`` column identifying
+        the source collection of each row. If MAXREC was given, the merged
+        result is cut to MAXREC rows. If the query against any collection
+        fails, the whole query fails.
+
+        Parameters
+        ----------
+        raw_params
+            Parameters for the SIAv2 query.
+        query_url
+            URL the user sent the query to, which has to be reflected in the
+            VOTable output.
+        user
+            Authenticated username, used for fair queuing of queries and for
+            metrics events.
+        is_disconnected
+            If given, called periodically to check whether the client has
+            disconnected.
+
+        Returns
+        -------
+        bytes
+            Resulting VOTable.
+
+        Raises
+        ------
+        TransientFaultError
+            Raised if the query against any collection failed with this
+            error.
+        UsageFaultError
+            Raised if the client disconnected before the query finished or
+            if the collections have different ObsCore columns.
+        """
+        start = time.monotonic()
+        tasks = {
+            name: asyncio.create_task(
+                service.run_query(
+                    raw_params,
+                    query_url,
+                    user,
+                    is_disconnected=is_disconnected,
+                )
+            )
+            for name, service in self._services.items()
+        }
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        results = {name: task.result() for name, task in tasks.items()}
+
+        if len({column_names(v) for v in results.values()}) > 1:
+            names = ", ".join(results)
+            msg = f"Collections {names} have different columns"
+            raise UsageFaultError(msg)
+        votable = await executors.serialization.run(
+            merge_collections, results, raw_params.maxrec
+        )
+        result = await executors.serialization.run(to_xml, votable)
+        self._logger.info(
+            "Federated SIA query completed",
+            collections=list(results),
+            total_duration_seconds=round(time.monotonic() - start, 3),
+        )
+        return result
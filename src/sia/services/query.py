@@ -1,21 +1,62 @@
 """Run an SIA query and return the results as a VOTable."""
 
 import asyncio
-import io
+import random
 import time
 import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from contextlib import (
+    AbstractAsyncContextManager,
+    asynccontextmanager,
+    nullcontext,
+)
+from datetime import timedelta
 
-from lsst.daf.butler import Butler
+from astropy.io.votable.tree import VOTableFile
+from lsst.daf.butler import Butler, DatasetRef
 from lsst.dax.obscore import ExporterConfig, siav2
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+from numpy import ma
 from safir.sentry import duration
 from structlog.stdlib import BoundLogger
 
-from ..events import Events, SIAQueryFailed, SIAQuerySucceeded
+from ..bulkhead import BulkheadFullError, Bulkheads
+from ..config import config
+from ..cost import CostEstimator, QueryCost, QueryLane
+from ..events import (
+    Events,
+    SIAConcurrencyLimitChanged,
+    SIAQueryCancelled,
+    SIAQueryFailed,
+    SIAQuerySucceeded,
+    SIAShadowQueryCompared,
+)
+from ..exceptions import TransientFaultError, UsageFaultError
+from ..executors import executors
+from ..health import HealthTracker
+from ..maxrec import default_maxrec
 from ..models.sia_query_params import SIAQueryParams
+from ..obscore import empty_result
+from ..registry import CollectionRuntime
+from ..retry import ButlerRetrier, butler_latencies
 from ..sentry import capturing_start_span
+from ..shadow import (
+    ShadowComparison,
+    compare_results,
+    extract_keys,
+    shadow_runner,
+)
+from ..sharding import plan_subqueries
+from ..votable import merge_results, publisher_dids, query_status, to_xml
 
 __all__ = ["QueryService"]
 
+_DISCONNECT_POLL_INTERVAL = 1.0
+"""How often to check whether the client has disconnected, in seconds."""
+
+_SHADOW_USER = "<shadow>"
+"""User that shadow queries are accounted to in the bulkheads."""
+
 
 class QueryService:
     """Run an SIA query and return the results as a VOTable.
@@ -24,8 +65,15 @@ class QueryService:
     ----------
     butler
         Butler for this data collection.
-    obscore_config
-        ObsCore exporter configuration for this data collection.
+    collection
+        Runtime state of this data collection.
+    health
+        Record of the health of each collection, used to reject queries
+        immediately while the Butler server is known to be down.
+    bulkheads
+        Per-collection limits on concurrent queries, one for each lane.
+    costs
+        Query cost estimator, used to choose the lane for each query.
     events
         Metrics events publishers.
     logger
@@ -36,20 +84,47 @@ class QueryService:
         self,
         *,
         butler: Butler,
-        obscore_config: ExporterConfig,
+        collection: CollectionRuntime,
+        health: HealthTracker,
+        bulkheads: Bulkheads,
+        costs: CostEstimator,
         events: Events,
         logger: BoundLogger,
     ) -> None:
         self._butler = butler
-        self._obscore_config = obscore_config
+        self._collection = collection
+        self._obscore_config = collection.exporter_config
+        self._health = health
+        self._bulkheads = bulkheads
+        self._bulkhead = bulkheads.get(collection)
+        self._costs = costs
         self._events = events
         self._logger = logger
+        self._phase = "queued"
+        self._engine = "butler"
+        self._id_lookup = False
+        self._deadline: float | None = None
+        self._query_id = ""
 
     async def run_query_votable(
-        self, raw_params: SIAQueryParams, query_url: str, user: str
+        self,
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        *,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
     ) -> bytes:
         """Process the SIAv2 query and generate a VOTable (as bytes).
 
+        The query is scored by the cost estimator and run in either the fast
+        or the slow lane for the collection, which have separate limits.
+        It is abandoned, releasing its slot and skipping any remaining
+        work, if it does not finish before the deadline for the collection
+        or if the client disconnects. The Butler query itself cannot be
+        interrupted, but its result is discarded.
+        Queries whose POS regions are all outside the coverage of the
+        collection return no rows immediately.
+
         Parameters
         ----------
         raw_params
@@ -58,50 +133,348 @@ class QueryService:
             URL the user sent the query to, which has to be reflected in the
             VOTable output.
         user
-            Authenticated username for metrics events.
+            Authenticated username, used for fair queuing of queries and for
+            metrics events.
+        is_disconnected
+            If given, called periodically to check whether the client has
+            disconnected.
 
         Returns
         -------
         bytes
             Resulting VOTable.
+
+        Raises
+        ------
+        TransientFaultError
+            Raised if the Butler server for this collection is known to be
+            unavailable, if too many queries against this collection are
+            already waiting to run, or if the query did not finish before
+            its deadline.
+        UsageFaultError
+            Raised if the client disconnected before the query finished.
         """
         start_time = time.time()
-        query_id = str(uuid.uuid4())[:8]
 
+        async def finish(votable: VOTableFile) -> bytes:
+            # Convert the result to bytes. Run this in a thread pool in the
+            # hope that enough of the code drops the GIL that it doesn't block
+            # the main execution thread. This uses its own thread pool so that
+            # slow queries cannot hold up serialization of finished ones.
+            conversion_start_time = time.time()
+            self._phase = "serialization"
+            result = await executors.serialization.run(to_xml, votable)
+            conversion_duration = time.time() - conversion_start_time
+            self._logger.info(
+                "SIA query processing completed successfully",
+                total_duration_seconds=round(time.time() - start_time, 3),
+                conversion_duration_seconds=round(conversion_duration, 3),
+            )
+            return result
+
+        return await self._guard(
+            raw_params, query_url, user, is_disconnected, finish
+        )
+
+    async def run_query(
+        self,
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        *,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+        hold_slot: bool = True,
+    ) -> VOTableFile:
+        """Process the SIAv2 query and return the unserialized VOTable.
+
+        This is the same as `run_query_votable` except that the result is not
+        serialized, so that it can be combined with other results first.
+
+        Parameters
+        ----------
+        raw_params
+            Parameters for the SIAv2 query.
+        query_url
+            URL the user sent the query to, which has to be reflected in the
+            VOTable output.
+        user
+            Authenticated username, used for fair queuing of queries and for
+            metrics events.
+        is_disconnected
+            If given, called periodically to check whether the client has
+            disconnected.
+        hold_slot
+            Whether to run the query in a slot of its own. If `False`, the
+            caller must already hold a slot for it from `batch_slot`.
+
+        Returns
+        -------
+        VOTableFile
+            Resulting VOTable.
+
+        Raises
+        ------
+        TransientFaultError
+            Raised under the same conditions as `run_query_votable`.
+        UsageFaultError
+            Raised if the client disconnected before the query finished.
+        """
+
+        async def finish(votable: VOTableFile) -> VOTableFile:
+            return votable
+
+        return await self._guard(
+            raw_params,
+            query_url,
+            user,
+            is_disconnected,
+            finish,
+            hold_slot=hold_slot,
+        )
+
+    @asynccontextmanager
+    async def batch_slot(
+        self,
+        user: str,
+        *,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> AsyncIterator[None]:
+        """Hold a single slot in the slow lane for a batch of queries.
+
+        Queries in the batch are run with ``hold_slot=False``, so that the
+        whole batch counts once against the limits of the collection and of
+        the user, rather than each query being queued, and possibly shed,
+        on its own.
+
+        Parameters
+        ----------
+        user
+            Authenticated username, used for fair queuing.
+        is_disconnected
+            If given, called periodically to check whether the client has
+            disconnected, in which case the batch is cancelled. Queries in
+            the batch then need not check for themselves.
+
+        Raises
+        ------
+        TransientFaultError
+            Raised if too many queries against this collection are already
+            waiting to run.
+        UsageFaultError
+            Raised if the client disconnected before the batch finished.
+        """
+        task = asyncio.current_task()
+        watcher = None
+        if is_disconnected and task:
+            watcher = asyncio.create_task(
+                self._watch_disconnect(is_disconnected, task)
+            )
+        bulkhead = self._bulkheads.get(self._collection, QueryLane.slow)
+        try:
+            async with bulkhead.slot(user):
+                yield
+        except BulkheadFullError as e:
+            raise self._full_error(e) from None
+        except asyncio.CancelledError:
+            if not self._disconnected(task, watcher):
+                raise
+            msg = "Query abandoned because the client disconnected"
+            raise UsageFaultError(msg, 499) from None
+        finally:
+            if watcher:
+                watcher.cancel()
+
+    async def _guard[T](
+        self,
+        raw_params: SIAQueryParams,
+        query_url: str,
+        user: str,
+        is_disconnected: Callable[[], Awaitable[bool]] | None,
+        finish: Callable[[VOTableFile], Awaitable[T]],
+        *,
+        hold_slot: bool = True,
+    ) -> T:
+        """Run a query in a slot of the right lane, within its deadline.
+
+        The result is passed to ``finish`` before the slot is released. If
+        ``hold_slot`` is false, the caller already holds a slot for the
+        query and none is taken.
+        Queries whose POS regions are all outside the coverage of the
+        collection get an empty result without a slot or a Butler query.
+        Converts bulkhead, deadline and disconnect failures into the errors
+        documented for `run_query_votable`.
+        """
+        self._query_id = str(uuid.uuid4())[:8]
+        self._logger = self._logger.bind(query_id=self._query_id, user=user)
+        name = self._collection.name
         query_string = raw_params.to_query_description()
+        params = self._to_butler_parameters(raw_params)
+        self._id_lookup = raw_params.is_id_lookup()
+        if self._outside_coverage(params):
+            self._logger.info("SIA query outside coverage, returning no rows")
+            votable = await executors.serialization.run(
+                empty_result,
+                self._obscore_config,
+                query_url=query_url,
+                query_string=query_string,
+            )
+            return await finish(votable)
+
+        self._check_health()
+        cost = self._costs.estimate(name, params)
+        self._bulkhead = self._bulkheads.get(self._collection, cost.lane)
+
+        deadline = self._collection.limits.timeout.total_seconds()
+        start = time.monotonic()
+        self._phase = "queued"
+        task = asyncio.current_task()
+        watcher = None
+        if is_disconnected and task:
+            watcher = asyncio.create_task(
+                self._watch_disconnect(is_disconnected, task)
+            )
+        slot: AbstractAsyncContextManager[None] = (
+            self._bulkhead.slot(user) if hold_slot else nullcontext()
+        )
+        try:
+            async with asyncio.timeout(deadline) as timeout:
+                self._deadline = timeout.when()
+                async with slot:
+                    votable = await self._run_query(
+                        params, query_string, query_url, user, cost
+                    )
+                    return await finish(votable)
+        except BulkheadFullError as e:
+            raise self._full_error(e) from None
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            await self._publish_cancelled(user, "deadline", start)
+            msg = f"Query did not finish within {deadline:.0f}s"
+            raise TransientFaultError(msg, 504) from None
+        except asyncio.CancelledError:
+            if not self._disconnected(task, watcher):
+                raise
+            await self._publish_cancelled(user, "disconnect", start)
+            msg = "Query abandoned because the client disconnected"
+            raise UsageFaultError(msg, 499) from None
+        finally:
+            if watcher:
+                watcher.cancel()
+
+    def _check_health(self) -> None:
+        """Reject the query if the Butler server is known to be down."""
+        name = self._collection.name
+        if self._health.is_open(name):
+            msg = f"Butler server for {name} is unavailable"
+            raise TransientFaultError(msg, 503)
+
+    @staticmethod
+    def _disconnected(
+        task: asyncio.Task | None, watcher: asyncio.Task | None
+    ) -> bool:
+        """Check whether a task was cancelled only by its disconnect watcher.
+
+        If so, the cancellation is consumed so that the task can go on to
+        report the disconnect.
+        """
+        if not task or not watcher or not watcher.done():
+            return False
+        return not watcher.cancelled() and task.uncancel() == 0
+
+    def _full_error(self, error: BulkheadFullError) -> TransientFaultError:
+        """Convert a rejection by a bulkhead into the error for the client."""
+        name = self._collection.name
+        msg = f"Too many queries for {name} are waiting, try again later"
+        headers = {"Retry-After": str(error.retry_after)}
+        return TransientFaultError(msg, 503, headers)
+
+    def _outside_coverage(self, params: SIAv2Parameters) -> bool:
+        """Check whether the query cannot match anything in the collection.
+
+        This is the case if the query has POS constraints and none of them
+        overlap the coverage of the collection, if it has been built.
+        """
+        coverage = self._collection.coverage
+        if not coverage or not params.pos:
+            return False
+        return not any(coverage.overlaps(r) for r in params.pos)
+
+    def _to_butler_parameters(
+        self, raw_params: SIAQueryParams
+    ) -> SIAv2Parameters:
+        """Convert the query parameters and apply the MAXREC policy.
+
+        Explicit values of MAXREC are capped at the limit for the collection.
+        Queries without MAXREC get a default that depends on the load on the
+        fast lane of the collection, where such queries start out.
+        """
         params = raw_params.to_butler_parameters()
+        limits = self._collection.limits
+        if params.maxrec is None:
+            load = self._bulkheads.get(self._collection).load
+            maxrec = default_maxrec(limits, load)
+            if maxrec < limits.default_maxrec:
+                self._logger.info(
+                    "Reduced default MAXREC under load",
+                    maxrec=maxrec,
+                    load=round(load, 2),
+                )
+            params = params.model_copy(update={"maxrec": maxrec})
+        elif params.maxrec > limits.maxrec:
+            params = params.model_copy(update={"maxrec": limits.maxrec})
+        return params
 
-        logger = self._logger.bind(query_id=query_id, user=user)
-        logger.info("SIA query started", params=params)
+    async def _run_query(
+        self,
+        params: SIAv2Parameters,
+        query_string: str,
+        query_url: str,
+        user: str,
+        cost: QueryCost,
+    ) -> VOTableFile:
+        """Run the query once a slot is available."""
+        logger = self._logger
+        logger.info(
+            "SIA query started",
+            params=params,
+            lane=cost.lane.value,
+            cost=round(cost.score, 3),
+        )
 
         with capturing_start_span("sia_query") as span:
             span.set_data("query", params)
-            span.set_data("query_id", query_id)
+            span.set_data("query_id", self._query_id)
             span.set_data("user", user)
 
             try:
                 query_start_time = time.time()
                 logger.info("Starting SIA query execution")
+                self._phase = "query"
 
-                # Execute the query
-                table_as_votable = await asyncio.to_thread(
-                    siav2.siav2_query,
-                    self._butler,
-                    self._obscore_config,
-                    params,
-                    query_url=query_url,
-                    query_string=query_string,
+                # Execute the query, retrying transient Butler failures
+                # within the deadline.
+                table_as_votable, query_wait = await self._execute(
+                    params, query_string, query_url, logger
                 )
 
                 query_duration = time.time() - query_start_time
+                butler_duration = query_duration - query_wait.total_seconds()
+                self._costs.observe(cost, butler_duration)
+                await self._observe_latency(butler_duration)
                 logger.info(
                     "SIA query execution completed",
                     query_duration_seconds=round(query_duration, 3),
+                    query_wait_seconds=round(query_wait.total_seconds(), 3),
                 )
 
                 # Publish success event
                 await self._events.sia_query_succeeded.publish(
-                    SIAQuerySucceeded(duration=duration(span), username=user)
+                    SIAQuerySucceeded(
+                        duration=duration(span),
+                        username=user,
+                        query_wait=query_wait,
+                    )
                 )
             except Exception as e:
                 query_duration = time.time() - query_start_time
@@ -120,23 +493,399 @@ class QueryService:
                 )
                 raise
 
-            def to_xml() -> bytes:
-                with io.BytesIO() as output:
-                    table_as_votable.to_xml(output)
-                    return output.getvalue()
+        self._start_shadow(
+            params,
+            query_string=query_string,
+            query_url=query_url,
+            votable=table_as_votable,
+            duration=query_duration,
+        )
+        return table_as_votable
 
-            # Convert the result to bytes. Run this in a thread pool in the
-            # hope that enough of the code drops the GIL that it doesn't block
-            # the main execution thread.
-            conversion_start_time = time.time()
-            result = await asyncio.to_thread(to_xml)
-            conversion_duration = time.time() - conversion_start_time
+    async def _execute(
+        self,
+        params: SIAv2Parameters,
+        query_string: str,
+        query_url: str,
+        logger: BoundLogger,
+    ) -> tuple[VOTableFile, timedelta]:
+        """Run the Butler query, splitting it into sub-queries if useful.
 
-        total_duration = time.time() - start_time
-        logger.info(
-            "SIA query processing completed successfully",
-            total_duration_seconds=round(total_duration, 3),
-            query_duration_seconds=round(query_duration, 3),
-            conversion_duration_seconds=round(conversion_duration, 3),
+        Queries against a collection with an ObsCore replica are answered
+        from the replica instead, without splitting. Queries that only look
+        up a few datasets by ID are narrowed to the dataset types of those
+        datasets, found by looking them up directly.
+        Multiple or large POS regions and long TIME intervals are split as
+        planned by `~sia.sharding.plan_subqueries`. Sub-queries run
+        concurrently and their results are merged in order. Each sub-query
+        keeps the full MAXREC so that the merged result can be cut to MAXREC
+        correctly, and once the sub-queries that have finished, in order,
+        hold more than MAXREC rows, the rest are abandoned.
+        """
+        name = self._collection.name
+        replica = self._collection.replica
+        shadow_replica = config.settings_for(name).shadow_replica
+        if replica and not shadow_replica:
+            logger.debug("Answering query from ObsCore replica")
+            self._engine = "replica"
+            return await executors.query.run_timed(
+                replica.query,
+                params,
+                self._obscore_config,
+                query_url=query_url,
+                query_string=query_string,
+            )
+
+        obscore_config = self._obscore_config
+        if narrowed := await self._look_up_ids(params, logger):
+            obscore_config, params = narrowed
+            if not obscore_config.dataset_types:
+                logger.debug("No datasets found by ID")
+                return await executors.serialization.run_timed(
+                    empty_result,
+                    self._obscore_config,
+                    query_url=query_url,
+                    query_string=query_string,
+                )
+
+        subqueries = plan_subqueries(params, name)
+        if len(subqueries) < 2:
+            retrier = ButlerRetrier(
+                executors.query,
+                butler_latencies.get(name, "query"),
+                logger,
+                deadline=self._deadline,
+            )
+            return await retrier.run(
+                siav2.siav2_query,
+                self._butler,
+                obscore_config,
+                params,
+                query_url=query_url,
+                query_string=query_string,
+            )
+
+        # Sub-queries are cheaper than full queries, so keep their latencies
+        # separate to avoid skewing the hedging threshold.
+        retrier = ButlerRetrier(
+            executors.query,
+            butler_latencies.get(name, "subquery"),
+            logger,
+            deadline=self._deadline,
+        )
+        semaphore = asyncio.Semaphore(config.pos_fanout_concurrency)
+
+        async def run_one(
+            sub_params: SIAv2Parameters,
+        ) -> tuple[VOTableFile, timedelta]:
+            async with semaphore:
+                return await retrier.run(
+                    siav2.siav2_query,
+                    self._butler,
+                    obscore_config,
+                    sub_params,
+                    query_url=query_url,
+                    query_string=query_string,
+                )
+
+        logger.info("Splitting query", sub_queries=len(subqueries))
+        self._engine = "split"
+        tasks = [asyncio.create_task(run_one(p)) for p in subqueries]
+        results = await self._collect_until_maxrec(tasks, params.maxrec)
+        abandoned = len(subqueries) - len(results)
+        if abandoned:
+            logger.info("Found MAXREC rows early", abandoned=abandoned)
+        merged = await executors.serialization.run(
+            merge_results,
+            [v for v, _ in results],
+            params.maxrec,
+            overflow=abandoned > 0,
+        )
+        return merged, max(w for _, w in results)
+
+    @staticmethod
+    async def _collect_until_maxrec(
+        tasks: list[asyncio.Task[tuple[VOTableFile, timedelta]]],
+        maxrec: int | None,
+    ) -> list[tuple[VOTableFile, timedelta]]:
+        """Collect the results of sub-queries in order until MAXREC.
+
+        Sub-queries may match the same data products, which are merged into
+        one row, so collection only stops once the results hold more than
+        MAXREC distinct rows. The remaining sub-queries are then cancelled.
+        """
+        results: list[tuple[VOTableFile, timedelta]] = []
+        seen: set[str] = set()
+        rows = 0
+        try:
+            for task in tasks:
+                result = await task
+                results.append(result)
+                dids = publisher_dids(result[0])
+                if dids is None:
+                    rows += len(result[0].get_first_table().array)
+                else:
+                    seen.update(dids)
+                if maxrec is not None and rows + len(seen) > maxrec:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    async def _look_up_ids(
+        self, params: SIAv2Parameters, logger: BoundLogger
+    ) -> tuple[ExporterConfig, SIAv2Parameters] | None:
+        """Narrow a query that only looks up a few IDs to those datasets.
+
+        The datasets are looked up directly in the Butler, and the ObsCore
+        configuration is narrowed to their dataset types, with no dataset
+        types if none were found. Dataset types with extra columns are kept
+        so that the result has the same columns. If all the datasets have an
+        instrument, the query is also limited to those instruments, which
+        saves listing all instruments.
+
+        Returns `None` if the query is not such a lookup or the datasets
+        could not be looked up, in which case the query should be run as
+        is. Queries for IDs that are not dataset URIs are therefore left to
+        fail as usual.
+        """
+        if not self._id_lookup or len(params.id) > config.id_lookup_limit:
+            return None
+        try:
+            refs = await executors.query.run(
+                self._get_datasets, self._butler, params.id
+            )
+        except Exception as e:
+            logger.debug("Unable to look up datasets by ID", error=str(e))
+            return None
+        all_types = self._obscore_config.dataset_types
+        found = {r.datasetType.name for r in refs} & all_types.keys()
+        dataset_types = {
+            n: c
+            for n, c in all_types.items()
+            if n in found or (found and c.extra_columns)
+        }
+        obscore_config = self._obscore_config.model_copy(
+            update={"dataset_types": dataset_types}
+        )
+        instruments = {r.dataId.get("instrument") for r in refs}
+        if refs and None not in instruments:
+            instrument = tuple(sorted(str(i) for i in instruments))
+            params = params.model_copy(update={"instrument": instrument})
+        logger.debug(
+            "Looked up datasets by ID",
+            found=len(refs),
+            dataset_types=sorted(dataset_types),
+        )
+        self._engine = "id_lookup"
+        return obscore_config, params
+
+    def _start_shadow(
+        self,
+        params: SIAv2Parameters,
+        *,
+        query_string: str,
+        query_url: str,
+        votable: VOTableFile,
+        duration: float,
+    ) -> None:
+        """Run a fraction of queries again in the background for comparison.
+
+        The shadow query uses an alternate engine: a single Butler query if
+        the primary query was split or answered from the replica, or the
+        replica if the collection has one in shadow mode. It starts once
+        the response to the primary query has been sent, so it neither
+        delays the response nor holds the slot of the primary query.
+        """
+        if random.random() >= config.shadow_fraction:  # noqa: S311
+            return
+        replica = self._collection.replica
+        if self._engine != "butler":
+            engine = "butler"
+        elif replica:
+            engine = "replica"
+        else:
+            return
+
+        # Keep a reference to the current rows, since the result may later be
+        # modified when it is merged with others.
+        shadow = self._run_shadow(
+            engine,
+            params,
+            query_string=query_string,
+            query_url=query_url,
+            primary=votable.get_first_table().array,
+            truncated=query_status(votable) == "OVERFLOW",
+            duration=duration,
+        )
+        shadow_runner.defer(shadow)
+
+    async def _run_shadow(
+        self,
+        engine: str,
+        params: SIAv2Parameters,
+        *,
+        query_string: str,
+        query_url: str,
+        primary: ma.MaskedArray,
+        truncated: bool,
+        duration: float,
+    ) -> None:
+        """Run a shadow query and report how its result compares.
+
+        The shadow query runs in a slot of the slow lane of the collection,
+        but only if one is free, so that it never delays other queries. If
+        no slot is free, the query is not shadowed.
+        """
+        logger = self._logger.bind(
+            primary_engine=self._engine, shadow_engine=engine
+        )
+        bulkhead = self._bulkheads.get(self._collection, QueryLane.slow)
+        async with bulkhead.try_slot(_SHADOW_USER) as acquired:
+            if not acquired:
+                logger.debug("Not shadowing query, no free slot")
+                return
+            start = time.monotonic()
+            try:
+                votable = await self._query_shadow(
+                    engine, params, query_string, query_url
+                )
+            except Exception as e:
+                logger.warning("Shadow query failed", error=str(e))
+                return
+            shadow_duration = time.monotonic() - start
+
+        def compare() -> ShadowComparison:
+            columns = config.shadow_columns
+            return compare_results(
+                extract_keys(primary, columns, truncated=truncated),
+                extract_keys(
+                    votable.get_first_table().array,
+                    columns,
+                    truncated=query_status(votable) == "OVERFLOW",
+                ),
+            )
+
+        comparison = await executors.serialization.run(compare)
+        log = logger.info if comparison.matches else logger.warning
+        log(
+            "Shadow query compared",
+            matches=comparison.matches,
+            missing=comparison.missing,
+            extra=comparison.extra,
+            mismatched=comparison.mismatched,
+            truncated=comparison.truncated,
+            primary_duration_seconds=round(duration, 3),
+            shadow_duration_seconds=round(shadow_duration, 3),
+        )
+        await self._events.sia_shadow_query_compared.publish(
+            SIAShadowQueryCompared(
+                collection=self._collection.name,
+                primary_engine=self._engine,
+                shadow_engine=engine,
+                matches=comparison.matches,
+                missing=comparison.missing,
+                extra=comparison.extra,
+                mismatched=comparison.mismatched,
+                truncated=comparison.truncated,
+                primary_duration=timedelta(seconds=duration),
+                shadow_duration=timedelta(seconds=shadow_duration),
+            )
+        )
+
+    @staticmethod
+    def _get_datasets(butler: Butler, uris: Sequence[str]) -> list[DatasetRef]:
+        """Look up the datasets for dataset URIs in the Butler."""
+        refs = []
+        for uri in uris:
+            dataset_id = Butler.parse_dataset_uri(uri).dataset_id
+            if ref := butler.get_dataset(dataset_id):
+                refs.append(ref)
+        return refs
+
+    async def _query_shadow(
+        self,
+        engine: str,
+        params: SIAv2Parameters,
+        query_string: str,
+        query_url: str,
+    ) -> VOTableFile:
+        """Run a shadow query with the given engine."""
+        replica = self._collection.replica
+        if engine == "replica" and replica:
+            return await executors.query.run(
+                replica.query,
+                params,
+                self._obscore_config,
+                query_url=query_url,
+                query_string=query_string,
+            )
+        return await executors.query.run(
+            siav2.siav2_query,
+            self._butler,
+            self._obscore_config,
+            params,
+            query_url=query_url,
+            query_string=query_string,
+        )
+
+    async def _publish_cancelled(
+        self, user: str, reason: str, start: float
+    ) -> None:
+        """Log and report a query that was abandoned."""
+        elapsed = time.monotonic() - start
+        saved = None
+        if self._bulkhead.service_time is not None:
+            saved = max(0.0, self._bulkhead.service_time - elapsed)
+        self._logger.info(
+            "SIA query abandoned",
+            reason=reason,
+            phase=self._phase,
+            elapsed_seconds=round(elapsed, 3),
+            saved_seconds=round(saved, 3) if saved is not None else None,
+        )
+        await self._events.sia_query_cancelled.publish(
+            SIAQueryCancelled(
+                username=user,
+                reason=reason,
+                phase=self._phase,
+                elapsed=timedelta(seconds=elapsed),
+                saved=timedelta(seconds=saved) if saved is not None else None,
+            )
+        )
+
+    async def _watch_disconnect(
+        self,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        task: asyncio.Task,
+    ) -> None:
+        """Cancel the query task if the client disconnects.
+
+        Starlette only exposes disconnects by polling the request, so there
+        is no event to wait on.
+        """
+        while not await is_disconnected():  # noqa: ASYNC110
+            await asyncio.sleep(_DISCONNECT_POLL_INTERVAL)
+        task.cancel()
+
+    async def _observe_latency(self, latency: float) -> None:
+        """Adapt the concurrency limit to the latency of a Butler query."""
+        limit = self._bulkhead.observe_query(latency)
+        if limit is None:
+            return
+        name = self._collection.name
+        self._logger.info(
+            "Concurrency limit changed",
+            collection=name,
+            limit=limit,
+            latency_seconds=round(latency, 3),
+        )
+        await self._events.sia_concurrency_limit_changed.publish(
+            SIAConcurrencyLimitChanged(
+                collection=name,
+                limit=limit,
+                latency=timedelta(seconds=latency),
+            )
         )
-        return result
@@ -0,0 +1,135 @@
+"""Reload the configuration without restarting the worker."""
+
+from rubin.repertoire import DiscoveryClient
+from structlog.stdlib import BoundLogger
+
+from ..config import Config, config, load_config
+from ..executors import executors
+from ..models.reload import ReloadSummary
+from ..registry import CollectionRegistry
+
+__all__ = ["RELOADABLE_SETTINGS", "ReloadService"]
+
+RELOADABLE_SETTINGS = (
+    "adaptive_concurrency",
+    "adaptive_latency_tolerance",
+    "bulk_batch_size",
+    "bulk_concurrency",
+    "bulk_max_positions",
+    "butler_hedge_percentile",
+    "butler_retries",
+    "butler_retry_backoff",
+    "coverage_level",
+    "coverage_refresh_interval",
+    "datasets",
+    "dataset_settings",
+    "id_lookup_limit",
+    "max_queries_per_user",
+    "max_queue_wait",
+    "min_default_maxrec",
+    "obscore_config",
+    "pos_fanout",
+    "pos_fanout_concurrency",
+    "pos_max_tiles",
+    "pos_tile_size",
+    "query_timeout",
+    "registry_refresh_interval",
+    "shadow_columns",
+    "shadow_fraction",
+    "shadow_max_pending",
+    "slow_query_cost",
+    "slow_query_latency",
+    "user_weights",
+)
+"""Settings that can be changed by a reload.
+
+Changes to any other setting are logged and only take effect after a restart.
+"""
+
+
+class ReloadService:
+    """Reload the dataset configuration and rebuild affected collections.
+
+    The new configuration is read and validated in full before any of it is
+    applied. The reloadable settings are then updated in place in the global
+    configuration, and the collection registry is refreshed, which rebuilds
+    the runtime state only of collections whose configuration changed and
+    drops collections that are no longer configured. Requests that are
+    already in progress keep using the runtime state they started with.
+
+    Parameters
+    ----------
+    registry
+        Registry of per-collection runtime state.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self, *, registry: CollectionRegistry, logger: BoundLogger
+    ) -> None:
+        self._registry = registry
+        self._logger = logger
+
+    async def reload(self, discovery: DiscoveryClient) -> ReloadSummary:
+        """Reload the configuration and apply any changes.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+
+        Returns
+        -------
+        ReloadSummary
+            Summary of the changes that were made.
+
+        Raises
+        ------
+        pydantic.ValidationError
+            Raised if the new configuration is invalid, in which case none of
+            it is applied.
+        pydantic_settings.SettingsError
+            Raised if the new configuration could not be parsed.
+        """
+        new_config = await executors.dependency.run(load_config)
+        return await self._apply(new_config, discovery)
+
+    async def _apply(
+        self, new_config: Config, discovery: DiscoveryClient
+    ) -> ReloadSummary:
+        """Apply a newly-loaded configuration."""
+        old_datasets = set(config.datasets)
+        new_datasets = set(new_config.datasets)
+        ignored = [
+            field
+            for field in type(config).model_fields
+            if field not in RELOADABLE_SETTINGS
+            and getattr(config, field) != getattr(new_config, field)
+        ]
+        if ignored:
+            msg = "Ignoring changed settings that require a restart"
+            self._logger.warning(msg, settings=ignored)
+
+        # Apply all reloadable settings without yielding to the event loop so
+        # that no request sees a partially updated configuration.
+        for field in RELOADABLE_SETTINGS:
+            setattr(config, field, getattr(new_config, field))
+
+        # Stop serving removed datasets even if the refresh fails.
+        self._registry.prune()
+        before = self._registry.collections
+        await self._registry.refresh(discovery)
+        after = self._registry.collections
+        summary = ReloadSummary(
+            added=sorted(new_datasets - old_datasets),
+            removed=sorted(old_datasets - new_datasets),
+            updated=sorted(
+                name
+                for name in old_datasets & new_datasets
+                if name in after and before.get(name) is not after[name]
+            ),
+            ignored=ignored,
+        )
+        self._logger.info("Reloaded configuration", **summary.model_dump())
+        return summary
@@ -0,0 +1,101 @@
+"""Restore and revalidate the warm-start snapshot."""
+
+from rubin.repertoire import DiscoveryClient
+from structlog.stdlib import BoundLogger
+
+from ..executors import executors
+from ..registry import CollectionRegistry
+from ..storage.snapshot import SnapshotStore
+
+__all__ = ["WarmStartService"]
+
+
+class WarmStartService:
+    """Restore and revalidate the warm-start snapshot.
+
+    On startup, the last known discovery results and exporter configurations
+    are loaded from the snapshot and seeded into the collection registry,
+    which would otherwise compute them on the first request for each
+    collection. They are then revalidated against service discovery and the
+    ObsCore configuration URLs in the background, and the snapshot is
+    rewritten with the results.
+
+    Parameters
+    ----------
+    store
+        Storage for the snapshot.
+    registry
+        Registry of per-collection runtime state.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self,
+        *,
+        store: SnapshotStore,
+        registry: CollectionRegistry,
+        logger: BoundLogger,
+    ) -> None:
+        self._store = store
+        self._registry = registry
+        self._logger = logger
+
+    def restore(self) -> bool:
+        """Seed the registry from the stored snapshot, if there is one.
+
+        Returns
+        -------
+        bool
+            Whether a snapshot was found and used.
+        """
+        snapshot = self._store.read()
+        if not snapshot:
+            return False
+        restored = self._registry.seed(snapshot)
+        if not restored:
+            self._logger.info("Warm-start snapshot has no usable collections")
+            return False
+        self._logger.info(
+            "Restored warm-start snapshot",
+            created=snapshot.created.isoformat(),
+            datasets=restored,
+        )
+        return True
+
+    async def revalidate(self, discovery: DiscoveryClient) -> None:
+        """Refresh seeded state and rewrite the snapshot.
+
+        Errors are logged rather than raised, and any seeded state that could
+        not be refreshed continues to be used.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+        """
+        try:
+            await self._registry.refresh(discovery, reload=True)
+        except Exception as e:
+            msg = "Unable to revalidate warm-start snapshot"
+            self._logger.warning(msg, error=f"{type(e).__name__}: {e!s}")
+            return
+        if await self.save():
+            self._logger.info("Revalidated warm-start snapshot")
+
+    async def save(self) -> bool:
+        """Write the current state of the registry to the snapshot.
+
+        Returns
+        -------
+        bool
+            Whether the snapshot was written. Errors are logged.
+        """
+        snapshot = self._registry.snapshot()
+        try:
+            await executors.dependency.run(self._store.write, snapshot)
+        except OSError as e:
+            msg = "Unable to write warm-start snapshot"
+            self._logger.warning(msg, error=str(e))
+            return False
+        return True
@@ -0,0 +1,99 @@
+"""Pre-warm per-collection state at startup."""
+
+import asyncio
+
+from lsst.daf.butler import Butler
+from rubin.repertoire import DiscoveryClient
+from structlog.stdlib import BoundLogger
+
+from ..config import config
+from ..executors import executors
+from ..registry import CollectionRegistry
+
+__all__ = ["WarmupService"]
+
+
+class WarmupService:
+    """Resolve the per-collection state for every configured dataset.
+
+    Without warm-up, the labeled Butler factory, exporter configuration,
+    DataLink URL, and instrument list for a collection are built by the first
+    query against it. Warm-up builds all of them concurrently in the
+    collection registry before the worker reports readiness.
+
+    Parameters
+    ----------
+    registry
+        Registry of per-collection runtime state.
+    logger
+        Logger to use.
+    """
+
+    def __init__(
+        self, *, registry: CollectionRegistry, logger: BoundLogger
+    ) -> None:
+        self._registry = registry
+        self._logger = logger
+
+    async def warm_up(self, discovery: DiscoveryClient) -> None:
+        """Warm up all configured collections, bounded by the timeout.
+
+        Failures are logged rather than raised. Any state that could not be
+        resolved will be built lazily by the first request that needs it.
+
+        Parameters
+        ----------
+        discovery
+            Service discovery client.
+        """
+        timeout = config.warmup_timeout.total_seconds()
+        try:
+            async with asyncio.timeout(timeout):
+                await self._registry.ensure(discovery)
+                results = await asyncio.gather(
+                    *(self._warm_up_butler(n) for n in config.datasets),
+                    return_exceptions=True,
+                )
+        except TimeoutError:
+            self._logger.warning("Warm-up timed out", timeout=timeout)
+            return
+        except Exception as e:
+            msg = "Unable to warm up collections"
+            self._logger.warning(msg, error=f"{type(e).__name__}: {e!s}")
+            return
+
+        for name, result in zip(config.datasets, results, strict=True):
+            if isinstance(result, Exception):
+                self._logger.warning(
+                    "Unable to warm up Butler for collection",
+                    collection=name,
+                    error=f"{type(result).__name__}: {result!s}",
+                )
+        self._logger.info("Warm-up complete", datasets=config.datasets)
+
+    async def _warm_up_butler(self, name: str) -> None:
+        """Initialize the Butler client and instruments for a collection.
+
+        Constructing a Butler and listing instruments requires a token, so
+        this can only be done if SIA has a token of its own.
+        """
+        runtime = self._registry.get(name)
+        if not config.service_token or not runtime:
+            return
+        if runtime.instruments is not None:
+            return
+        token = config.service_token.get_secret_value()
+        butler = await executors.dependency.run(
+            runtime.butler_factory.create_butler,
+            label=name,
+            access_token=token,
+        )
+        get_instruments = self._get_instruments
+        instruments = await executors.query.run(get_instruments, butler)
+        self._registry.set_instruments(name, instruments)
+
+    @staticmethod
+    def _get_instruments(butler: Butler) -> list[str]:
+        """Retrieve the names of the instruments known to a Butler."""
+        records = butler.query_dimension_records("instrument")
+        return [r.name for r in records]
@@ -0,0 +1,257 @@
+"""Shadow queries comparing the results of alternate query engines."""
+
+import asyncio
+import math
+from collections.abc import Coroutine, Sequence
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from numpy import ma
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import config
+
+__all__ = [
+    "ResultKeys",
+    "ShadowComparison",
+    "ShadowMiddleware",
+    "ShadowRunner",
+    "compare_results",
+    "extract_keys",
+    "shadow_runner",
+]
+
+_DID_COLUMN = "obs_publisher_did"
+"""Column that uniquely identifies a data product in ObsCore results."""
+
+_deferred: ContextVar[list[Coroutine[Any, Any, None]] | None] = ContextVar(
+    "_deferred", default=None
+)
+"""Shadow queries waiting for the response to the current request."""
+
+
+@dataclass(frozen=True, slots=True)
+class ResultKeys:
+    """Identifying values of the rows of a query result."""
+
+    rows: dict[str, tuple[Any, ...]]
+    """Values of the compared columns, keyed by ``obs_publisher_did``."""
+
+    truncated: bool
+    """Whether the result was cut at MAXREC."""
+
+
+@dataclass(frozen=True, slots=True)
+class ShadowComparison:
+    """Differences between a primary and a shadow query result."""
+
+    missing: int
+    """Number of rows only in the primary result."""
+
+    extra: int
+    """Number of rows only in the shadow result."""
+
+    mismatched: int
+    """Number of rows in both results whose compared columns differ."""
+
+    truncated: bool
+    """Whether either result was cut at MAXREC.
+
+    The two engines may return different rows before reaching MAXREC, so
+    missing and extra rows are then not counted.
+    """
+
+    @property
+    def matches(self) -> bool:
+        """Whether the results are the same."""
+        return not (self.missing or self.extra or self.mismatched)
+
+
+class ShadowRunner:
+    """Process-wide runner of shadow queries in the background.
+
+    Shadow queries are started as background tasks so that they never delay
+    the response to the primary query. At most a configured number run at
+    once, and queries beyond that are not shadowed rather than queued.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def aclose(self) -> None:
+        """Cancel all running shadow queries and wait for them to stop."""
+        for task in self._tasks:
+            task.cancel()
+        await self.join()
+
+    async def join(self) -> None:
+        """Wait for all running shadow queries to finish."""
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def defer(self, shadow: Coroutine[Any, Any, None]) -> None:
+        """Start a shadow query once the current response has been sent.
+
+        Outside of a request wrapped by `ShadowMiddleware`, the shadow query
+        is started straight away, if there is room.
+
+        Parameters
+        ----------
+        shadow
+            Coroutine that runs and reports the shadow query.
+        """
+        pending = _deferred.get()
+        if pending is None:
+            self.submit(shadow)
+        else:
+            pending.append(shadow)
+
+    def submit(self, shadow: Coroutine[Any, Any, None]) -> bool:
+        """Start a shadow query in the background, if there is room.
+
+        Parameters
+        ----------
+        shadow
+            Coroutine that runs and reports the shadow query. It is closed
+            without running if there is no room.
+
+        Returns
+        -------
+        bool
+            Whether the shadow query was started.
+        """
+        if len(self._tasks) >= config.shadow_max_pending:
+            shadow.close()
+            return False
+        task = asyncio.create_task(shadow)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+
+class ShadowMiddleware:
+    """Start the shadow queries of a request after its response is sent.
+
+    Shadow queries deferred while handling the request are started only once
+    the whole response, including any streamed body, has been sent. They are
+    dropped if the request fails.
+
+    Parameters
+    ----------
+    app
+        ASGI application to wrap.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self._app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+        pending: list[Coroutine[Any, Any, None]] = []
+        token = _deferred.set(pending)
+        try:
+            await self._app(scope, receive, send)
+        except BaseException:
+            for shadow in pending:
+                shadow.close()
+            raise
+        finally:
+            _deferred.reset(token)
+        for shadow in pending:
+            shadow_runner.submit(shadow)
+
+
+def compare_results(
+    primary: ResultKeys, shadow: ResultKeys
+) -> ShadowComparison:
+    """Compare the results of a primary and a shadow query.
+
+    Parameters
+    ----------
+    primary
+        Rows of the primary result.
+    shadow
+        Rows of the shadow result.
+
+    Returns
+    -------
+    ShadowComparison
+        Differences between the results.
+    """
+    truncated = primary.truncated or shadow.truncated
+    common = primary.rows.keys() & shadow.rows.keys()
+    mismatched = sum(
+        not _same_row(primary.rows[d], shadow.rows[d]) for d in common
+    )
+    if truncated:
+        return ShadowComparison(0, 0, mismatched, truncated=True)
+    return ShadowComparison(
+        missing=len(primary.rows.keys() - common),
+        extra=len(shadow.rows.keys() - common),
+        mismatched=mismatched,
+        truncated=False,
+    )
+
+
+def extract_keys(
+    array: ma.MaskedArray, columns: Sequence[str], *, truncated: bool
+) -> ResultKeys:
+    """Extract the identifying values of the rows of a query result.
+
+    Parameters
+    ----------
+    array
+        Rows of the result table.
+    columns
+        Columns to compare. Columns not in the result are ignored.
+    truncated
+        Whether the result was cut at MAXREC.
+
+    Returns
+    -------
+    ResultKeys
+        Values for comparison with another result.
+    """
+    names = array.dtype.names or ()
+    if _DID_COLUMN not in names:
+        return ResultKeys(rows={}, truncated=truncated)
+    present = [c for c in columns if c in names]
+    rows = {}
+    for row in array:
+        values = tuple(_value(row[c]) for c in present)
+        rows[str(row[_DID_COLUMN])] = values
+    return ResultKeys(rows=rows, truncated=truncated)
+
+
+def _same_row(first: tuple[Any, ...], second: tuple[Any, ...]) -> bool:
+    """Compare the values of two rows, allowing for rounding of floats."""
+    if len(first) != len(second):
+        return False
+    for a, b in zip(first, second, strict=True):
+        if isinstance(a, float) and isinstance(b, float):
+            if not (math.isclose(a, b) or (math.isnan(a) and math.isnan(b))):
+                return False
+        elif a != b:
+            return False
+    return True
+
+
+def _value(value: Any) -> Any:
+    """Convert a value from a result table for comparison."""
+    if value is ma.masked:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, bytes):
+        value = value.decode()
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+shadow_runner = ShadowRunner()
+"""Process-wide runner of shadow queries."""
@@ -0,0 +1,85 @@
+"""Planning of sub-queries for queries that are split for execution."""
+
+import itertools
+from collections.abc import Sequence
+from datetime import UTC, datetime
+
+from astropy.time import Time
+from lsst.daf.butler import Timespan
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+
+from .config import config
+from .tiling import plan_regions
+
+__all__ = ["plan_subqueries", "shard_time"]
+
+
+def plan_subqueries(
+    params: SIAv2Parameters, dataset: str
+) -> list[SIAv2Parameters]:
+    """Split a query into sub-queries that can run concurrently.
+
+    The POS constraints are split by `~sia.tiling.plan_regions`, and a single
+    TIME interval spanning more than one observing epoch of the dataset is
+    split at the epoch boundaries. Every combination of region and time
+    shard becomes a sub-query. Sub-queries are returned in time order, so
+    that merging their results in order keeps the earliest matches.
+
+    Parameters
+    ----------
+    params
+        Parameters of the query.
+    dataset
+        Label of the dataset being queried.
+
+    Returns
+    -------
+    list of lsst.dax.obscore.siav2.SIAv2Parameters
+        Parameters of each sub-query, or just the original parameters if the
+        query should not be split.
+    """
+    regions = plan_regions(params.pos)
+    pos = [(r,) for r in regions] if regions else [params.pos]
+    time = [params.time]
+    if len(params.time) == 1 and isinstance(params.time[0], Timespan):
+        epochs = config.settings_for(dataset).time_epochs
+        shards = shard_time(params.time[0], epochs)
+        if len(shards) > 1:
+            time = [(s,) for s in shards]
+    if len(pos) == 1 and len(time) == 1:
+        return [params]
+    return [
+        params.model_copy(update={"pos": p, "time": t})
+        for t in time
+        for p in pos
+    ]
+
+
+def shard_time(
+    timespan: Timespan, epochs: Sequence[datetime]
+) -> list[Timespan]:
+    """Split a time interval at observing epoch boundaries.
+
+    Parameters
+    ----------
+    timespan
+        Time interval to split, possibly unbounded.
+    epochs
+        Boundaries between observing epochs. Naive datetimes are taken to be
+        in UTC.
+
+    Returns
+    -------
+    list of lsst.daf.butler.Timespan
+        Non-empty parts of the interval within each epoch, in time order.
+        The first and last epochs are unbounded, so the parts cover the
+        whole interval.
+    """
+    epochs = sorted(e if e.tzinfo else e.replace(tzinfo=UTC) for e in epochs)
+    boundaries = [None, *(Time(e, scale="utc") for e in epochs), None]
+    shards = []
+    for begin, end in itertools.pairwise(boundaries):
+        shard = timespan.intersection(Timespan(begin, end))
+        if not shard.isEmpty():
+            shards.append(shard)
+    return shards
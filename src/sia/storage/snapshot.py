@@ -0,0 +1,77 @@
+"""Storage for the warm-start snapshot."""
+
+import os
+import tempfile
+from pathlib import Path
+
+from pydantic import ValidationError
+from structlog.stdlib import BoundLogger
+
+from ..models.snapshot import WarmStartSnapshot
+
+__all__ = ["SnapshotStore"]
+
+
+class SnapshotStore:
+    """Read and write the warm-start snapshot on local disk.
+
+    The snapshot is stored as JSON, which Pydantic can parse and validate
+    considerably faster than retrieving and validating the original ObsCore
+    configuration.
+
+    Parameters
+    ----------
+    path
+        Path to the snapshot file.
+    logger
+        Logger to use.
+    """
+
+    def __init__(self, path: Path, logger: BoundLogger) -> None:
+        self._path = path
+        self._logger = logger
+
+    def read(self) -> WarmStartSnapshot | None:
+        """Read the snapshot.
+
+        Returns
+        -------
+        WarmStartSnapshot or None
+            Stored snapshot, or `None` if there is no usable snapshot. A
+            snapshot that cannot be parsed is logged and otherwise ignored.
+        """
+        try:
+            data = self._path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            msg = "Cannot read warm-start snapshot"
+            self._logger.warning(msg, path=str(self._path), error=str(e))
+            return None
+        try:
+            return WarmStartSnapshot.model_validate_json(data)
+        except ValidationError as e:
+            msg = "Ignoring invalid warm-start snapshot"
+            self._logger.warning(msg, path=str(self._path), error=str(e))
+            return None
+
+    def write(self, snapshot: WarmStartSnapshot) -> None:
+        """Write the snapshot, atomically replacing any existing one.
+
+        Parameters
+        ----------
+        snapshot
+            Snapshot to store.
+        """
+        data = snapshot.model_dump_json()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._path.parent, prefix=f".{self._path.name}."
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            Path(tmp_path).replace(self._path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
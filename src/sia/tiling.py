@@ -0,0 +1,102 @@
+"""Decomposition of large POS regions into sky tiles."""
+
+import math
+
+from lsst.sphgeom import Angle, HealpixPixelization, IntersectionRegion, Region
+
+from .config import config
+
+__all__ = ["plan_regions", "tile_level", "tile_region"]
+
+_MAX_LEVEL = 17
+"""Finest HEALPix level used for tiling."""
+
+
+def plan_regions(regions: tuple[Region, ...]) -> list[Region]:
+    """Plan the sub-queries for the POS constraints of a query.
+
+    Each POS constraint becomes its own sub-query if POS fan-out is enabled,
+    and each large region is further split into sky tiles.
+
+    Parameters
+    ----------
+    regions
+        POS constraints of the query.
+
+    Returns
+    -------
+    list of lsst.sphgeom.Region
+        Region of each sub-query. If this has fewer than two entries, the
+        query should be run as a whole.
+    """
+    if len(regions) > 1 and not config.pos_fanout:
+        return []
+    return [t for r in regions for t in tile_region(r)]
+
+
+def tile_level(radius: Angle) -> int:
+    """Choose the HEALPix level for tiling a region.
+
+    Parameters
+    ----------
+    radius
+        Radius of the bounding circle of the region.
+
+    Returns
+    -------
+    int
+        Finest level whose pixels are no smaller than the configured tile
+        size, but coarse enough that the region needs at most the configured
+        maximum number of tiles.
+    """
+    if config.pos_tile_size is None:
+        raise RuntimeError("POS tiling is disabled")
+    tile_size = math.radians(config.pos_tile_size)
+    level = math.floor(math.log2(math.sqrt(math.pi / 3) / tile_size))
+    level = min(max(level, 0), _MAX_LEVEL)
+
+    # Approximate the number of tiles by the ratio of the area of the
+    # bounding circle to the area of one pixel, and coarsen until it fits.
+    area = 2 * math.pi * (1 - math.cos(radius.asRadians()))
+    while (
+        level > 0 and area / (math.pi / (3 * 4**level)) > config.pos_max_tiles
+    ):
+        level -= 1
+    return level
+
+
+def tile_region(region: Region) -> list[Region]:
+    """Split a region into sky tiles if it is large.
+
+    A region whose bounding circle is larger than the configured tile size
+    is split into HEALPix cells at an adaptive level. Each tile is the
+    intersection of the region with one cell, so the tiles together cover
+    exactly the original region and a data product that overlaps a tile
+    also overlaps the region. Data products overlapping more than one tile
+    are returned by several sub-queries and must be de-duplicated.
+
+    Parameters
+    ----------
+    region
+        Region to split.
+
+    Returns
+    -------
+    list of lsst.sphgeom.Region
+        Tiles covering the region, or just the region if it is small or
+        tiling is disabled.
+    """
+    if config.pos_tile_size is None:
+        return [region]
+    radius = region.getBoundingCircle().getOpeningAngle()
+    if radius.asDegrees() <= config.pos_tile_size:
+        return [region]
+
+    pixelization = HealpixPixelization(tile_level(radius))
+    tiles: list[Region] = []
+    for begin, end in pixelization.envelope(region):
+        for index in range(begin, end):
+            cell = pixelization.pixel(index)
+            if region.overlaps(cell) is not False:
+                tiles.append(IntersectionRegion(region, cell))
+    return tiles if len(tiles) > 1 else [region]
@@ -0,0 +1,151 @@
+"""Parsing of uploaded tables of positions for bulk queries."""
+
+import io
+import math
+from dataclasses import dataclass
+
+from astropy.table import Table
+from fastapi import UploadFile
+
+from .config import config
+from .exceptions import UsageFaultError
+
+__all__ = ["Cone", "max_upload_size", "parse_cones", "read_upload"]
+
+_BYTES_PER_ROW = 1024
+"""Allowance for the size of each row of an uploaded table, in bytes."""
+
+_BYTES_PER_TABLE = 64 * 1024
+"""Allowance for the size of the headers of an uploaded table, in bytes."""
+
+_READ_SIZE = 64 * 1024
+"""Number of bytes of an upload to read at a time."""
+
+
+@dataclass(frozen=True, slots=True)
+class Cone:
+    """A position and search radius from an uploaded table."""
+
+    ra: float
+    """Right ascension of the center in degrees (ICRS)."""
+
+    dec: float
+    """Declination of the center in degrees (ICRS)."""
+
+    radius: float
+    """Search radius in degrees."""
+
+    def to_pos(self) -> str:
+        """Return the cone as an SIA POS parameter value."""
+        return f"CIRCLE {self.ra!r} {self.dec!r} {self.radius!r}"
+
+
+def max_upload_size() -> int:
+    """Return the largest upload that may hold an allowed number of rows.
+
+    The limit is generous, so that any table within the row limit of
+    ``bulk_max_positions`` fits, but keeps a much larger upload from being
+    read into memory just to reject it.
+
+    Returns
+    -------
+    int
+        Maximum size of an uploaded table, in bytes.
+    """
+    return _BYTES_PER_TABLE + config.bulk_max_positions * _BYTES_PER_ROW
+
+
+async def read_upload(upload: UploadFile) -> bytes:
+    """Read an uploaded table of positions, up to the maximum size.
+
+    Parameters
+    ----------
+    upload
+        Uploaded file.
+
+    Returns
+    -------
+    bytes
+        Contents of the uploaded file.
+
+    Raises
+    ------
+    UsageFaultError
+        Raised if the upload is larger than `max_upload_size`. Reading stops
+        as soon as the limit is exceeded.
+    """
+    limit = max_upload_size()
+    msg = f"Uploaded table is larger than the limit of {limit} bytes"
+    if upload.size is not None and upload.size > limit:
+        raise UsageFaultError(msg, 413)
+    chunks = []
+    size = 0
+    while chunk := await upload.read(_READ_SIZE):
+        size += len(chunk)
+        if size > limit:
+            raise UsageFaultError(msg, 413)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def parse_cones(data: bytes) -> list[Cone]:
+    """Parse an uploaded table of positions.
+
+    The table may be a VOTable or CSV with a header row, and must have
+    ``ra``, ``dec`` and ``radius`` columns in degrees, matched without regard
+    to case. Other columns are ignored.
+
+    Parameters
+    ----------
+    data
+        Contents of the uploaded file.
+
+    Returns
+    -------
+    list of Cone
+        Cones in the order of the rows of the table.
+
+    Raises
+    ------
+    UsageFaultError
+        Raised if the table cannot be parsed, is missing a column, has
+        invalid values, or has no rows or more rows than allowed.
+    """
+    table_format = "votable" if data.lstrip().startswith(b"<") else "csv"
+    try:
+        table = Table.read(io.BytesIO(data), format=table_format)
+    except Exception as e:
+        msg = f"Cannot parse uploaded {table_format} table: {e!s}"
+        raise UsageFaultError(msg) from e
+
+    if not len(table):
+        raise UsageFaultError("Uploaded table has no rows")
+    if len(table) > config.bulk_max_positions:
+        msg = (
+            f"Uploaded table has {len(table)} rows, more than the limit of"
+            f" {config.bulk_max_positions}"
+        )
+        raise UsageFaultError(msg)
+    columns = {c.lower(): c for c in table.colnames}
+    for name in ("ra", "dec", "radius"):
+        if name not in columns:
+            msg = f"Uploaded table has no {name} column"
+            raise UsageFaultError(msg)
+
+    cones = []
+    for index, row in enumerate(table):
+        try:
+            cone = Cone(
+                ra=float(row[columns["ra"]]),
+                dec=float(row[columns["dec"]]),
+                radius=float(row[columns["radius"]]),
+            )
+        except (TypeError, ValueError) as e:
+            msg = f"Invalid value in row {index} of uploaded table"
+            raise UsageFaultError(msg) from e
+        valid = all(math.isfinite(v) for v in (cone.ra, cone.dec, cone.radius))
+        if not valid or not -90 <= cone.dec <= 90 or cone.radius <= 0:
+            msg = f"Invalid position in row {index} of uploaded table"
+            raise UsageFaultError(msg)
+        cones.append(cone)
+    return cones
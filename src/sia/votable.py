@@ -0,0 +1,239 @@
+"""Merging and serialization of VOTable query results."""
+
+import io
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+from astropy.io.votable.tree import Field, VOTableFile
+from numpy import ma
+
+__all__ = [
+    "COLLECTION_COLUMN",
+    "add_column",
+    "column_names",
+    "merge_collections",
+    "merge_results",
+    "publisher_dids",
+    "query_status",
+    "set_query_status",
+    "to_xml",
+]
+
+COLLECTION_COLUMN = "collection_name"
+"""Column added to merged results to identify the source collection."""
+
+_DID_COLUMN = "obs_publisher_did"
+"""Column that uniquely identifies a data product in ObsCore results."""
+
+
+def add_column(votable: VOTableFile, name: str, value: str | int) -> None:
+    """Add a column with the same value in every row to a query result.
+
+    Parameters
+    ----------
+    votable
+        Query result, which is modified in place.
+    name
+        Name of the new column.
+    value
+        Value of the column in every row. Strings are added as a
+        variable-length ``char`` column and integers as a ``long`` column.
+    """
+    table = votable.get_first_table()
+    if isinstance(value, str):
+        field = Field(
+            votable, name=name, ID=name, datatype="char", arraysize="*"
+        )
+        dtype: type = object
+    else:
+        field = Field(votable, name=name, ID=name, datatype="long")
+        dtype = np.int64
+    table.fields.append(field)
+    array = table.array
+    extended = ma.masked_all(
+        len(array), dtype=np.dtype([*array.dtype.descr, (name, dtype)])
+    )
+    for column in array.dtype.names or ():
+        extended[column] = array[column]
+    extended[name] = value
+    table.array = extended
+
+
+def column_names(votable: VOTableFile) -> tuple[str, ...]:
+    """Return the names of the columns of a query result.
+
+    Parameters
+    ----------
+    votable
+        Query result.
+
+    Returns
+    -------
+    tuple of str
+        Names of the fields of the result table, in order.
+    """
+    return tuple(f.name for f in votable.get_first_table().fields)
+
+
+def merge_collections(
+    results: Mapping[str, VOTableFile], maxrec: int | None
+) -> VOTableFile:
+    """Merge the results of the same query against several collections.
+
+    A ``collection_name`` column holding the name of the collection is added
+    to each result, and the results are then merged as by `merge_results`.
+    Rows are not de-duplicated across collections, since collections that
+    share a Butler repository may return the same data product, which then
+    appears once for each collection. The results are modified in place and
+    must all have the same columns (see `column_names`).
+
+    Parameters
+    ----------
+    results
+        Result for each collection, keyed by collection name. Must not be
+        empty.
+    maxrec
+        Maximum number of rows in the merged result, if any.
+
+    Returns
+    -------
+    VOTableFile
+        Merged result.
+    """
+    for name, votable in results.items():
+        add_column(votable, COLLECTION_COLUMN, name)
+    return merge_results(list(results.values()), maxrec, deduplicate=False)
+
+
+def merge_results(
+    results: Sequence[VOTableFile],
+    maxrec: int | None,
+    *,
+    overflow: bool = False,
+    deduplicate: bool = True,
+) -> VOTableFile:
+    """Merge the results of sub-queries into a single result.
+
+    The rows of all the results are combined in order, by default keeping
+    only the first row for each ``obs_publisher_did`` so that data products
+    matched by more than one sub-query appear once, and then cut to MAXREC.
+    The query status is ``OVERFLOW`` if any of the sub-queries overflowed,
+    if the cut removed any rows, or if the caller says that some sub-queries
+    were skipped.
+
+    The first result is used for the table metadata and is modified in
+    place and returned. All results must come from the same exporter
+    configuration, so that their tables have the same fields.
+
+    Parameters
+    ----------
+    results
+        Results of the sub-queries. Must not be empty.
+    maxrec
+        Maximum number of rows in the merged result, if any.
+    overflow
+        Whether the results are known to be incomplete, for example because
+        later sub-queries were abandoned once MAXREC rows were found.
+    deduplicate
+        Whether to drop rows for data products already seen.
+
+    Returns
+    -------
+    VOTableFile
+        Merged result.
+    """
+    merged_votable = results[0]
+    overflow = overflow or any(query_status(r) == "OVERFLOW" for r in results)
+    arrays = [r.get_first_table().array for r in results]
+    arrays = [a for a in arrays if len(a)]
+    if arrays:
+        merged = ma.hstack(arrays)
+        names = merged.dtype.names or ()
+        if deduplicate and _DID_COLUMN in names:
+            dids = ma.getdata(merged[_DID_COLUMN])
+            _, first = np.unique(dids, return_index=True)
+            merged = merged[np.sort(first)]
+        if maxrec is not None and len(merged) > maxrec:
+            overflow = True
+            merged = merged[:maxrec]
+        merged_votable.get_first_table().array = merged
+
+    set_query_status(merged_votable, "OVERFLOW" if overflow else "OK")
+    return merged_votable
+
+
+def publisher_dids(votable: VOTableFile) -> list[str] | None:
+    """Return the data product identifiers of the rows of a query result.
+
+    These are the values `merge_results` uses to drop repeated rows, so
+    callers can count the rows that will remain after merging.
+
+    Parameters
+    ----------
+    votable
+        Query result.
+
+    Returns
+    -------
+    list of str or None
+        Value of ``obs_publisher_did`` in each row, or `None` if the result
+        has no such column.
+    """
+    array = votable.get_first_table().array
+    if _DID_COLUMN not in (array.dtype.names or ()):
+        return None
+    return [str(d) for d in ma.getdata(array[_DID_COLUMN])]
+
+
+def query_status(votable: VOTableFile) -> str | None:
+    """Return the query status recorded in a VOTable result.
+
+    Parameters
+    ----------
+    votable
+        Query result.
+
+    Returns
+    -------
+    str or None
+        Value of the ``QUERY_STATUS`` info element, if present.
+    """
+    for resource in votable.resources:
+        for info in resource.infos:
+            if info.name == "QUERY_STATUS":
+                return info.value
+    return None
+
+
+def set_query_status(votable: VOTableFile, status: str) -> None:
+    """Change the query status recorded in a VOTable result.
+
+    Parameters
+    ----------
+    votable
+        Query result, which is modified in place.
+    status
+        New value of the ``QUERY_STATUS`` info element, if present.
+    """
+    for resource in votable.resources:
+        for info in resource.infos:
+            if info.name == "QUERY_STATUS":
+                info.value = status
+
+
+def to_xml(votable: VOTableFile) -> bytes:
+    """Serialize a query result.
+
+    Parameters
+    ----------
+    votable
+        Query result.
+
+    Returns
+    -------
+    bytes
+        Result as VOTable XML.
+    """
+    with io.BytesIO() as output:
+        votable.to_xml(output)
+        return output.getvalue()
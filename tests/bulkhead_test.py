@@ -0,0 +1,234 @@
+"""Tests for the per-collection bulkheads."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from sia.bulkhead import Bulkhead, BulkheadFullError
+from sia.config import config
+
+
+async def run_queries(
+    bulkhead: Bulkhead, users: list[str], order: list[str]
+) -> list[asyncio.Task[None]]:
+    """Queue queries from the given users while all slots are held."""
+    release = asyncio.Event()
+
+    async def run(user: str) -> None:
+        async with bulkhead.slot(user):
+            order.append(user)
+            await release.wait()
+            release.clear()
+
+    queries = []
+    for user in users:
+        queries.append(asyncio.create_task(run(user)))
+        await asyncio.sleep(0)
+
+    async def release_all() -> None:
+        while not all(t.done() for t in queries):
+            release.set()
+            await asyncio.sleep(0)
+
+    return [*queries, asyncio.create_task(release_all())]
+
+
+@pytest.mark.asyncio
+async def test_bulkhead() -> None:
+    bulkhead = Bulkhead(concurrency=1, queue=1)
+    order = []
+    release = asyncio.Event()
+
+    async def run(n: int) -> None:
+        async with bulkhead.slot("user"):
+            order.append(n)
+            await release.wait()
+
+    first = asyncio.create_task(run(1))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(run(2))
+    await asyncio.sleep(0)
+    status = bulkhead.status()
+    assert (status.active, status.queued, status.users) == (1, 1, 1)
+    with pytest.raises(BulkheadFullError):
+        await run(3)
+
+    # A cancelled waiter gives up its place in the queue.
+    second.cancel()
+    await asyncio.sleep(0)
+    assert bulkhead.status().queued == 0
+    third = asyncio.create_task(run(3))
+    await asyncio.sleep(0)
+
+    # Growing the limit starts queued queries.
+    bulkhead.resize(2, 1)
+    await asyncio.sleep(0)
+    assert order == [1, 3]
+    release.set()
+    await asyncio.gather(first, third)
+    status = bulkhead.status()
+    assert (status.active, status.queued, status.users) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_wake() -> None:
+    bulkhead = Bulkhead(concurrency=1, queue=2)
+    order = []
+    release = asyncio.Event()
+
+    async def run(n: int) -> None:
+        async with bulkhead.slot("user"):
+            order.append(n)
+            await release.wait()
+
+    # Cancel a queued query and free a slot before the cancelled task gets
+    # to run, so that the slot skips over the cancelled query first.
+    async with bulkhead.slot("user"):
+        second = asyncio.create_task(run(2))
+        third = asyncio.create_task(run(3))
+        await asyncio.sleep(0)
+        assert bulkhead.status().queued == 2
+        second.cancel()
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    status = bulkhead.status()
+    assert (status.active, status.queued) == (1, 0)
+    assert order == [3]
+    release.set()
+    await third
+    status = bulkhead.status()
+    assert (status.active, status.queued, status.users) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_try_slot() -> None:
+    bulkhead = Bulkhead(concurrency=1, queue=1)
+    async with bulkhead.try_slot("shadow") as acquired:
+        assert acquired
+        assert bulkhead.status().active == 1
+
+        # Queries still queue behind it, and it is released at the end.
+        slot = bulkhead.slot("user")
+        queued = asyncio.create_task(slot.__aenter__())
+        await asyncio.sleep(0)
+        assert bulkhead.status().queued == 1
+    await queued
+    assert bulkhead.status().active == 1
+
+    # No slot is taken while all are in use or any query is waiting.
+    async with bulkhead.try_slot("shadow") as acquired:
+        assert not acquired
+    assert bulkhead.status().active == 1
+    await slot.__aexit__(None, None, None)
+    assert bulkhead.status().active == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_queuing() -> None:
+    bulkhead = Bulkhead(concurrency=1, queue=10)
+    order: list[str] = []
+
+    # An occasional query is not stuck behind another user's backlog.
+    users = ["batch"] * 5 + ["interactive"]
+    await asyncio.gather(*await run_queries(bulkhead, users, order))
+    assert order == [
+        "batch",
+        "interactive",
+        "batch",
+        "batch",
+        "batch",
+        "batch",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_weights(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "user_weights", {"heavy": 2.0})
+    bulkhead = Bulkhead(concurrency=1, queue=20)
+    order: list[str] = []
+
+    users = ["light"] + ["light", "heavy"] * 6
+    await asyncio.gather(*await run_queries(bulkhead, users, order))
+    assert order[:10].count("heavy") in (6, 7)
+
+
+@pytest.mark.asyncio
+async def test_user_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "max_queries_per_user", 1)
+    bulkhead = Bulkhead(concurrency=2, queue=10)
+    release = asyncio.Event()
+    running: list[str] = []
+
+    async def run(user: str) -> None:
+        async with bulkhead.slot(user):
+            running.append(user)
+            await release.wait()
+
+    tasks = [asyncio.create_task(run(u)) for u in ("a", "a", "b")]
+    await asyncio.sleep(0)
+    assert running == ["a", "b"]
+    assert bulkhead.status().queued == 1
+    release.set()
+    await asyncio.gather(*tasks)
+    assert running == ["a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_load_shedding(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "max_queue_wait", timedelta(seconds=0.5))
+    bulkhead = Bulkhead(concurrency=1, queue=10)
+
+    # Without any finished queries there is no estimate, so the query waits
+    # until the maximum queue wait and is then rejected.
+    release = asyncio.Event()
+
+    async def run() -> None:
+        async with bulkhead.slot("user"):
+            await release.wait()
+
+    first = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    with pytest.raises(BulkheadFullError) as excinfo:
+        async with bulkhead.slot("other"):
+            pass
+    assert excinfo.value.retry_after == 1
+    assert bulkhead.status().queued == 0
+
+    # Once the query finishes, its duration is used to estimate the wait
+    # and a query that would wait too long is rejected immediately.
+    release.set()
+    await first
+    status = bulkhead.status()
+    assert status.service_time_seconds
+    assert status.service_time_seconds >= 0.5
+    release.clear()
+    first = asyncio.create_task(run())
+    await asyncio.sleep(0)
+    status = bulkhead.status()
+    assert status.estimated_wait_seconds
+    assert status.estimated_wait_seconds >= 0.5
+    with pytest.raises(BulkheadFullError):
+        async with asyncio.timeout(0.1):
+            async with bulkhead.slot("other"):
+                pass
+    release.set()
+    await first
+
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency(monkeypatch: pytest.MonkeyPatch) -> None:
+    bulkhead = Bulkhead(concurrency=4, queue=10)
+    assert bulkhead.observe_query(1.0) is None
+    limit = None
+    for _ in range(10):
+        limit = bulkhead.observe_query(100.0) or limit
+    assert limit
+    assert limit < 4
+    status = bulkhead.status()
+    assert (status.concurrency, status.limit) == (4, limit)
+
+    monkeypatch.setattr(config, "adaptive_concurrency", False)
+    assert bulkhead.status().limit == 4
+    assert bulkhead.observe_query(100.0) is None
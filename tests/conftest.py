@@ -12,7 +12,8 @@ from httpx import ASGITransport, AsyncClient
 from rubin.repertoire import Discovery, register_mock_discovery
 
 from sia import main
-from sia.config import Config, config
+from sia.config import Config, config, load_config
+from sia.services import reload
 
 from .support.butler import MockButler, patch_butler, patch_siav2_query
 from .support.data import SiaData
@@ -35,6 +36,32 @@ def _config(data: SiaData, monkeypatch: pytest.MonkeyPatch) -> Config:
     return config
 
 
+@pytest.fixture
+def settings_file(
+    tmp_path: Path, data: SiaData, monkeypatch: pytest.MonkeyPatch
+) -> Path:
+    """Use a settings file for configuration reloads.
+
+    Reloaded settings are restored after the test, and as in the normal
+    configuration, ObsCore configurations are replaced with test data.
+    """
+    for field in reload.RELOADABLE_SETTINGS:
+        monkeypatch.setattr(config, field, getattr(config, field))
+    path = tmp_path / "sia.env"
+    path.write_text("")
+    monkeypatch.setenv("SIA_SETTINGS_FILE", str(path))
+    monkeypatch.setattr(config, "settings_file", path)
+
+    def load_test_config() -> Config:
+        new_config = load_config()
+        test_config = str(data.path("config/dp02.yaml"))
+        obscore_config = dict.fromkeys(new_config.datasets, test_config)
+        return new_config.model_copy(update={"obscore_config": obscore_config})
+
+    monkeypatch.setattr(reload, "load_config", load_test_config)
+    return path
+
+
 @pytest.fixture(autouse=True)
 def _mock_butler() -> Iterator[MockButler]:
     """Mock Butler for testing."""
@@ -0,0 +1,60 @@
+"""Tests for the query cost estimator."""
+
+from datetime import timedelta
+
+import pytest
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+
+from sia.config import config
+from sia.cost import CostEstimator, QueryLane
+
+
+def test_estimate() -> None:
+    estimator = CostEstimator()
+
+    # Cheap queries.
+    cone = SIAv2Parameters.from_siav2(pos="CIRCLE 0 0 1", maxrec="10000")
+    assert estimator.estimate("dp02", cone).lane == QueryLane.fast
+    by_id = SIAv2Parameters.from_siav2(id="some-id", maxrec="10000")
+    assert estimator.estimate("dp02", by_id).lane == QueryLane.fast
+    metadata = SIAv2Parameters.from_siav2(maxrec="0")
+    cost = estimator.estimate("dp02", metadata)
+    assert cost.lane == QueryLane.fast
+    assert cost.score == 0
+
+    # An all-sky query, or one over a long time range, is expensive.
+    all_sky = SIAv2Parameters.from_siav2(maxrec="10000")
+    assert estimator.estimate("dp02", all_sky).lane == QueryLane.slow
+    long_time = SIAv2Parameters.from_siav2(
+        pos="CIRCLE 0 0 30", time="50000 60000", maxrec="60000"
+    )
+    assert estimator.estimate("dp02", long_time).lane == QueryLane.slow
+    short_time = SIAv2Parameters.from_siav2(
+        pos="CIRCLE 0 0 30", time="50000 50001", maxrec="60000"
+    )
+    assert estimator.estimate("dp02", short_time).lane == QueryLane.fast
+
+
+def test_history(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "slow_query_latency", timedelta(seconds=1))
+    estimator = CostEstimator()
+
+    # A query that looks expensive but turns out to be fast moves to the
+    # fast lane, but the history is specific to the collection.
+    all_sky = SIAv2Parameters.from_siav2(maxrec="10000")
+    cost = estimator.estimate("dp02", all_sky)
+    assert cost.lane == QueryLane.slow
+    assert cost.latency is None
+    estimator.observe(cost, 0.1)
+    cost = estimator.estimate("dp02", all_sky)
+    assert cost.lane == QueryLane.fast
+    assert cost.latency == pytest.approx(0.1)
+    assert estimator.estimate("other", all_sky).lane == QueryLane.slow
+
+    # Similar queries share history, and slow history moves them back.
+    similar = SIAv2Parameters.from_siav2(maxrec="12000")
+    for _ in range(20):
+        estimator.observe(estimator.estimate("dp02", similar), 5.0)
+    assert estimator.estimate("dp02", all_sky).lane == QueryLane.slow
+    estimator.reset()
+    assert estimator.estimate("dp02", all_sky).latency is None
@@ -0,0 +1,48 @@
+"""Tests for the sky coverage of collections."""
+
+import numpy as np
+from lsst.sphgeom import Angle, Circle, LonLat, UnitVector3d
+
+from sia.coverage import Coverage
+
+
+def circle(ra: float, dec: float, radius: float) -> Circle:
+    center = UnitVector3d(LonLat.fromDegrees(ra, dec))
+    return Circle(center, Angle.fromDegrees(radius))
+
+
+def test_overlaps() -> None:
+    coverage = Coverage.from_circles(
+        np.array([180.0, 10.0, np.nan]),
+        np.array([-30.0, 0.0, 0.0]),
+        np.array([0.1, 1.0, 1.0]),
+        9,
+    )
+    assert coverage.level == 9
+    assert 0 < coverage.sky_fraction < 0.001
+
+    assert coverage.overlaps(circle(180, -30, 0.01))
+    assert coverage.overlaps(circle(10.5, 0.5, 0.1))
+    assert not coverage.overlaps(circle(181, -30, 0.1))
+    assert not coverage.overlaps(circle(100, 60, 1))
+
+    # Large regions are checked at a coarser level.
+    assert coverage.overlaps(circle(0, 0, 90))
+    assert not coverage.overlaps(circle(100, 60, 30))
+
+    empty = Coverage.from_pixels(9, np.array([], dtype=np.int64))
+    assert len(empty) == 0
+    assert not empty.overlaps(circle(180, -30, 1))
+
+
+def test_to_ascii() -> None:
+    coverage = Coverage.from_pixels(2, np.arange(12 * 4**2))
+    assert coverage.sky_fraction == 1
+    assert coverage.to_ascii() == "0/0-11 2/"
+
+    coverage = Coverage.from_pixels(3, np.array([*range(4, 20), 25, 21, 22]))
+    assert len(coverage) == 3
+    assert coverage.to_ascii() == "2/1-4 3/21-22 25"
+
+    empty = Coverage.from_pixels(3, np.array([], dtype=np.int64))
+    assert empty.to_ascii() == "3/"
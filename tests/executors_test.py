@@ -0,0 +1,47 @@
+"""Tests for the instrumented thread pools."""
+
+import asyncio
+import threading
+
+import pytest
+
+from sia.config import config
+from sia.executors import InstrumentedExecutor
+
+
+@pytest.mark.asyncio
+async def test_executor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "query_threads", 1)
+    executor = InstrumentedExecutor("query", lambda: config.query_threads)
+    assert await executor.run(sum, [1, 2, 3]) == 6
+
+    # With a single thread, a second call has to wait for the first.
+    release = threading.Event()
+    first = asyncio.create_task(executor.run(release.wait, 5))
+    second = asyncio.create_task(executor.run_timed(lambda: "done"))
+    for _ in range(100):
+        if executor.status().queued == 1:
+            break
+        await asyncio.sleep(0.01)
+    status = executor.status()
+    assert status.max_workers == 1
+    assert status.active == 1
+    assert status.queued == 1
+
+    await asyncio.sleep(0.1)
+    release.set()
+    assert await first
+    result, wait = await second
+    assert result == "done"
+    assert wait.total_seconds() >= 0.1
+
+    status = executor.status()
+    assert status.active == 0
+    assert status.queued == 0
+    assert status.completed == 3
+    assert status.wait_max_seconds >= 0.1
+    executor.shutdown()
+
+    # The executor can be used again after shutdown.
+    assert await executor.run(sum, [1]) == 1
+    executor.shutdown()
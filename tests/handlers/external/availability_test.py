@@ -6,6 +6,7 @@ from httpx import AsyncClient, Response
 from rubin.repertoire import Discovery
 
 from sia.config import config
+from sia.health import health_tracker
 
 from ...support.data import SiaData
 
@@ -21,8 +22,18 @@ async def test_availability(
     """Test the availability endpoint."""
     butler_url = mock_discovery.datasets["dp02"].butler_config
     assert butler_url
-    respx_mock.get(str(butler_url)).mock(return_value=Response(200))
+    route = respx_mock.get(str(butler_url))
+    route.mock(return_value=Response(200))
 
+    # Discard the result of any background probe made before the mock was
+    # registered so that the first request probes the Butler server.
+    health_tracker.reset()
+    r = await client.get(f"{config.path_prefix}/dp02/availability")
+    assert r.status_code == 200
+    data.assert_text_matches(r.text, "responses/availability-success.xml")
+
+    # Later requests are answered from the last probe.
+    route.mock(return_value=Response(404))
     r = await client.get(f"{config.path_prefix}/dp02/availability")
     assert r.status_code == 200
     data.assert_text_matches(r.text, "responses/availability-success.xml")
@@ -43,6 +54,7 @@ async def test_availability_failure(
     assert butler_url
     respx_mock.get(str(butler_url)).mock(return_value=Response(404))
 
+    health_tracker.reset()
     r = await client.get(f"{config.path_prefix}/dp02/availability")
     assert r.status_code == 200
     data.assert_text_matches(r.text, "responses/availability-404.xml")
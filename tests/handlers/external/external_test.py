@@ -1,15 +1,30 @@
 """Tests for the sia.handlers.external module and routes."""
 
+import io
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
 from typing import Any
+from unittest.mock import patch
 
+import pyarrow as pa
 import pytest
+import structlog
+from astropy.io.votable import parse_single_table
 from httpx import AsyncClient
+from lsst.dax.obscore import siav2
+from pyarrow import parquet
+from rubin.repertoire import DiscoveryClient
 
-from sia.config import config
+from sia.bulkhead import bulkheads
+from sia.config import DatasetSettings, config
 from sia.constants import RESULT_NAME
+from sia.health import health_tracker
+from sia.registry import collection_registry
+from sia.services.coverage import CoverageService
 from tests.support.constants import EXCEPTION_MESSAGES
 from tests.support.validators import validate_votable_error
 
+from ...support.butler import mock_siav2_query
 from ...support.data import SiaData
 
 
@@ -240,3 +255,158 @@ async def test_query_unknown(client: AsyncClient) -> None:
         f"{config.path_prefix}/dp1/query", data={"MAXREC": 0}
     )
     assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_query_unavailable(client: AsyncClient) -> None:
+    now = datetime.now(tz=UTC)
+    for _ in range(config.circuit_breaker_threshold):
+        health_tracker.record(
+            "dp02", checked=now, latency=timedelta(), error="Unavailable"
+        )
+    r = await client.get(
+        f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 0 0 1"}
+    )
+    assert r.status_code == 503
+    validate_votable_error(r, "TransientFault: Butler server for dp02")
+
+    health_tracker.record("dp02", checked=now, latency=timedelta())
+    r = await client.get(
+        f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 0 0 1"}
+    )
+    assert r.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_query_bulkhead(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = DatasetSettings(max_concurrent_queries=1, max_queued_queries=0)
+    monkeypatch.setattr(config, "dataset_settings", {"dp02": settings})
+    async with AsyncClient() as http_client:
+        await collection_registry.refresh(DiscoveryClient(http_client))
+    runtime = collection_registry.get("dp02")
+    assert runtime
+
+    # Hold the only slot, so another query can neither run nor queue.
+    async with bulkheads.get(runtime).slot("other"):
+        r = await client.get(
+            f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 0 0 1"}
+        )
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+        validate_votable_error(r, "TransientFault: Too many queries")
+    r = await client.get(
+        f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 0 0 1"}
+    )
+    assert r.status_code == 200
+
+    # Restore the default limits for other tests.
+    monkeypatch.setattr(config, "dataset_settings", {})
+    async with AsyncClient() as http_client:
+        await collection_registry.refresh(DiscoveryClient(http_client))
+
+
+@pytest.mark.asyncio
+async def test_federated_query(client: AsyncClient) -> None:
+    """Test ``GET /api/sia/query`` across collections."""
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = lambda *args, **kwargs: mock_siav2_query()
+        response = await client.get(
+            f"{config.path_prefix}/query?POS=CIRCLE+320+-0.1+1"
+        )
+        assert response.status_code == 200
+        content_type = response.headers["content-type"]
+        assert content_type == "application/x-votable+xml"
+        table = parse_single_table(io.BytesIO(response.content)).array
+        assert list(table["collection_name"]) == ["dp02"]
+
+        response = await client.post(
+            f"{config.path_prefix}/query",
+            data={"POS": "CIRCLE 320 -0.1 1", "collection_name": "dp02"},
+        )
+        assert response.status_code == 200
+        table = parse_single_table(io.BytesIO(response.content)).array
+        assert list(table["collection_name"]) == ["dp02"]
+
+    response = await client.get(
+        f"{config.path_prefix}/query?collection_name=unknown"
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_bulk_query(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test ``POST /api/sia/{collection_name}/bulk``."""
+    monkeypatch.setattr(config, "bulk_batch_size", 2)
+    upload = b"ra,dec,radius\n320,-0.1,1\n321,-0.2,1\n322,-0.3,1\n"
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = lambda *args, **kwargs: mock_siav2_query()
+        response = await client.post(
+            f"{config.path_prefix}/dp02/bulk",
+            data={"MAXREC": "10"},
+            files={"upload": ("positions.csv", upload, "text/csv")},
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-votable+xml"
+    table = parse_single_table(io.BytesIO(response.content)).array
+    assert list(table["upload_row"]) == [0, 1, 2]
+    assert mock.call_count == 3
+    assert b'name="QUERY_STATUS" value="OVERFLOW"' not in response.content
+
+    response = await client.post(
+        f"{config.path_prefix}/dp02/bulk",
+        files={"upload": ("positions.csv", b"ra,dec\n1,2\n", "text/csv")},
+    )
+    assert response.status_code == 400
+
+    # Uploads too large to hold the maximum number of rows are rejected
+    # before they are parsed.
+    monkeypatch.setattr(config, "bulk_max_positions", 1)
+    upload = b"ra,dec,radius\n" + b"320,-0.1,1\n" * 10_000
+    response = await client.post(
+        f"{config.path_prefix}/dp02/bulk",
+        files={"upload": ("positions.csv", upload, "text/csv")},
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_coverage(
+    client: AsyncClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test ``GET /api/sia/dp02/coverage``."""
+    r = await client.get(f"{config.path_prefix}/dp02/coverage")
+    assert r.status_code == 503
+    validate_votable_error(r, "TransientFault: Coverage of dp02")
+
+    table = pa.table({"s_ra": [10.0], "s_dec": [0.0], "s_fov": [0.2]})
+    snapshot = tmp_path / "obscore.parquet"
+    parquet.write_table(table, snapshot)
+    settings = DatasetSettings(replica=snapshot)
+    monkeypatch.setattr(config, "dataset_settings", {"dp02": settings})
+    monkeypatch.setattr(config, "coverage_level", 3)
+    async with AsyncClient() as http_client:
+        await collection_registry.refresh(DiscoveryClient(http_client))
+    logger = structlog.get_logger("sia")
+    service = CoverageService(registry=collection_registry, logger=logger)
+    await service.build_all()
+
+    r = await client.get(f"{config.path_prefix}/dp02/coverage")
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("text/plain")
+    assert r.text == "3/280 282-283"
+
+    # Queries outside the coverage return no rows without any query.
+    r = await client.get(
+        f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 180 -60 1"}
+    )
+    assert r.status_code == 200
+    assert len(parse_single_table(io.BytesIO(r.content)).array) == 0
+
+    # Restore the default settings for other tests.
+    monkeypatch.setattr(config, "dataset_settings", {})
+    async with AsyncClient() as http_client:
+        await collection_registry.refresh(DiscoveryClient(http_client))
@@ -1,13 +1,18 @@
 """Tests for the sia.handlers.internal module and routes."""
 
+import asyncio
+import json
 from typing import TYPE_CHECKING
 
 import pytest
 from httpx import Response
 
 from sia.config import config
+from sia.lifecycle import lifecycle
 
 if TYPE_CHECKING:
+    from pathlib import Path
+
     from httpx import AsyncClient
 
 
@@ -29,3 +34,68 @@ async def test_get_index(client: AsyncClient) -> None:
 
     response = await client.get("/healthcheck")
     assert_response(response)
+
+
+@pytest.mark.asyncio
+async def test_readiness(client: AsyncClient) -> None:
+    """Test ``GET /healthcheck/ready``."""
+    for _ in range(100):
+        response = await client.get("/healthcheck/ready")
+        if response.status_code == 200:
+            break
+        await asyncio.sleep(0.01)
+    assert response.status_code == 200
+    assert response.json() == {"ready": True}
+
+    lifecycle.reset()
+    response = await client.get("/healthcheck/ready")
+    assert response.status_code == 503
+    assert response.json() == {"ready": False}
+
+
+@pytest.mark.asyncio
+async def test_reload(client: AsyncClient, settings_file: Path) -> None:
+    """Test ``POST /reload``."""
+    response = await client.post("/reload")
+    assert response.status_code == 200
+    assert response.json() == {
+        "added": [],
+        "removed": [],
+        "updated": [],
+        "ignored": [],
+    }
+
+    settings = {"dp1": {"maxrec_limit": 10}}
+    settings_file.write_text(
+        f"SIA_DATASET_SETTINGS='{json.dumps(settings)}'\n"
+    )
+    response = await client.post("/reload")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_status(client: AsyncClient) -> None:
+    """Test ``GET /status``."""
+    response = await client.get("/status")
+    assert response.status_code == 200
+    executors = response.json()["executors"]
+    assert set(executors) == {"query", "serialization", "dependency"}
+    assert executors["query"]["max_workers"] == config.query_threads
+    assert executors["query"]["queued"] == 0
+    assert response.json()["event_loop"]["samples"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_drain(client: AsyncClient) -> None:
+    """Test ``POST /drain``."""
+    response = await client.post("/drain")
+    assert response.status_code == 200
+    assert response.json() == {"completed": 0, "abandoned": 0}
+
+    response = await client.get("/healthcheck/ready")
+    assert response.status_code == 503
+    response = await client.get(
+        f"{config.path_prefix}/dp02/query", params={"POS": "CIRCLE 0 0 1"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
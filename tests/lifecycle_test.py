@@ -0,0 +1,39 @@
+"""Tests for the worker lifecycle."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from sia.lifecycle import Lifecycle
+
+
+@pytest.mark.asyncio
+async def test_drain() -> None:
+    lifecycle = Lifecycle()
+    lifecycle.mark_ready()
+    release = asyncio.Event()
+
+    async def query() -> None:
+        with lifecycle.track():
+            await release.wait()
+
+    # One query finishes within the grace period and one does not.
+    fast = asyncio.create_task(query())
+    slow = asyncio.create_task(query())
+    await asyncio.sleep(0)
+    assert lifecycle.in_flight == 2
+    drain = asyncio.create_task(lifecycle.drain(timedelta(seconds=0.1)))
+    await asyncio.sleep(0)
+    assert lifecycle.draining
+    assert not lifecycle.ready
+    fast.cancel()
+    summary = await drain
+    assert (summary.completed, summary.abandoned) == (1, 1)
+
+    # Once the last query finishes, draining completes immediately.
+    release.set()
+    await slow
+    assert lifecycle.in_flight == 0
+    summary = await lifecycle.drain(timedelta(seconds=10))
+    assert (summary.completed, summary.abandoned) == (0, 0)
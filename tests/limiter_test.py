@@ -0,0 +1,44 @@
+"""Tests for the adaptive concurrency limit."""
+
+import pytest
+
+from sia.config import config
+from sia.limiter import AdaptiveLimit
+
+
+def test_adaptive_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "adaptive_latency_tolerance", 2.0)
+    limit = AdaptiveLimit(8)
+    assert limit.limit == 8
+
+    # Steady latency at full use of the limit does not exceed the maximum.
+    for _ in range(20):
+        limit.observe(1.0, in_flight=8)
+    assert limit.limit == 8
+
+    # A rise in latency reduces the limit multiplicatively.
+    changed = [limit.observe(10.0, in_flight=8) for _ in range(5)]
+    assert any(changed)
+    reduced = limit.limit
+    assert reduced < 8
+
+    # Once latency is back to normal, the limit grows again, but only while
+    # it is fully used.
+    for _ in range(50):
+        limit.observe(1.0, in_flight=1)
+    reduced = limit.limit
+    assert reduced < 8
+    for _ in range(50):
+        limit.observe(1.0, in_flight=1)
+    assert limit.limit == reduced
+    for _ in range(50):
+        limit.observe(1.0, in_flight=limit.limit)
+    assert limit.limit > reduced
+
+    # Lowering the maximum lowers the limit.
+    limit.set_maximum(2)
+    assert limit.limit == 2
+
+    # If the limit was not reduced, it follows a higher maximum.
+    limit.set_maximum(4)
+    assert limit.limit == 4
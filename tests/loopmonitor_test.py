@@ -0,0 +1,53 @@
+"""Tests for the event loop lag monitor."""
+
+import asyncio
+import time
+from contextlib import suppress
+from unittest.mock import AsyncMock
+
+import pytest
+import structlog
+
+from sia.config import config
+from sia.events import Events
+from sia.loopmonitor import LoopMonitor
+
+
+def block_event_loop(seconds: float) -> None:
+    """Simulate CPU work on the event loop thread."""
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_monitor() -> None:
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    publish = AsyncMock()
+    events.sia_event_loop_lag.publish = publish  # type: ignore[method-assign]
+    monitor = LoopMonitor()
+    assert monitor.status().samples == 0
+
+    task = asyncio.create_task(
+        monitor.run(events, structlog.get_logger("sia"))
+    )
+    await asyncio.sleep(0.3)
+    publish.assert_not_called()
+
+    # Block the event loop while a request is in flight.
+    with monitor.track("GET /query"):
+        block_event_loop(0.5)
+        await asyncio.sleep(0.3)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+    status = monitor.status()
+    assert status.samples >= 2
+    assert status.max_seconds > 0.2
+    assert status.p50_seconds < status.max_seconds
+    publish.assert_called_once()
+    assert publish.call_args.args[0].in_flight == 1
+    monitor.reset()
+    assert monitor.status().samples == 0
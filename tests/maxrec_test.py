@@ -0,0 +1,38 @@
+"""Tests for the load-adaptive default MAXREC."""
+
+from datetime import timedelta
+
+import pytest
+
+from sia.config import config
+from sia.maxrec import default_maxrec
+from sia.registry import CollectionLimits
+
+
+def build_limits(default: int) -> CollectionLimits:
+    return CollectionLimits(
+        maxrec=60000,
+        default_maxrec=default,
+        concurrency=8,
+        queue=32,
+        slow_concurrency=2,
+        slow_queue=8,
+        timeout=timedelta(minutes=5),
+    )
+
+
+def test_default_maxrec(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "min_default_maxrec", 1000)
+    limits = build_limits(60000)
+
+    assert default_maxrec(limits, 0) == 60000
+    assert default_maxrec(limits, 0.5) == 60000
+    assert 1000 < default_maxrec(limits, 0.75) < 60000
+    assert default_maxrec(limits, 0.9) < default_maxrec(limits, 0.75)
+    assert default_maxrec(limits, 1) == 1000
+    assert default_maxrec(limits, 3) == 1000
+
+    # The minimum never raises the default for the collection.
+    limits = build_limits(100)
+    assert default_maxrec(limits, 0) == 100
+    assert default_maxrec(limits, 2) == 100
@@ -108,11 +108,22 @@ async def test_sia_params_default_values() -> None:
     assert params.calib is None
     assert params.target is None
     assert params.collection is None
+    assert params.maxrec is None
     assert params.facility is None
     assert params.instrument is None
     assert params.responseformat is None
 
 
+def test_sia_params_is_id_lookup() -> None:
+    """Test recognizing queries that only look up datasets by ID."""
+    assert SIAQueryParams(id=["ivo://example/1"]).is_id_lookup()
+    assert SIAQueryParams(id=["ivo://example/1"], maxrec=1).is_id_lookup()
+    assert not SIAQueryParams().is_id_lookup()
+    assert not SIAQueryParams(
+        id=["ivo://example/1"], pos=["CIRCLE 0 0 1"]
+    ).is_id_lookup()
+
+
 def test_band_info_initialization() -> None:
     """Test proper initialization of BandInfo."""
     band = BandInfo(label="Rubin band u", low=330.0e-9, high=400.0e-9)
@@ -0,0 +1,62 @@
+"""Tests for conversion of ObsCore rows held in memory to VOTable results."""
+
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+from astropy.io.votable.tree import VOTableFile
+from httpx import AsyncClient
+from lsst.daf.butler import DimensionUniverse
+from lsst.dax.obscore import ExporterConfig, ObscoreExporter
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+from pyarrow import parquet
+from rubin.repertoire import DiscoveryClient
+
+from sia.obscore import empty_result
+from sia.registry import CollectionRegistry
+from sia.replica import ObsCoreReplica
+
+from .support.butler import MockButler
+
+
+async def load_exporter_config() -> ExporterConfig:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        runtime = await registry.resolve("dp02", DiscoveryClient(http_client))
+    return runtime.exporter_config
+
+
+def fields(votable: VOTableFile) -> list[tuple[object, ...]]:
+    return [
+        (f.name, f.datatype, f.arraysize, f.ucd, f.unit, f.utype)
+        for f in votable.get_first_table().fields
+    ]
+
+
+@pytest.mark.asyncio
+async def test_same_fields(tmp_path: Path) -> None:
+    exporter_config = await load_exporter_config()
+    butler = MockButler()
+    butler.dimensions = DimensionUniverse()
+    exporter = ObscoreExporter(butler, exporter_config)
+
+    # A Butler query that returns no rows makes no Butler queries.
+    expected = fields(exporter.to_votable(limit=0))
+    assert len(expected) > 10
+
+    # Results built without the Butler, whether empty or from the rows of a
+    # replica written by the exporter, have exactly the same fields. This
+    # relies on private methods of the exporter, so guards against upstream
+    # changes to them.
+    assert fields(empty_result(exporter_config)) == expected
+    did = f"ivo://org.rubinobs/usdac/dp02?repo=dp02&id={uuid.uuid4()}"
+    row = {"obs_publisher_did": did, "dataproduct_type": "image"}
+    table = pa.Table.from_pylist([row], schema=exporter.schema)
+    snapshot = tmp_path / "obscore.parquet"
+    parquet.write_table(table, snapshot)
+    replica = ObsCoreReplica.from_parquet(snapshot)
+    params = SIAv2Parameters.from_siav2(id=did)
+    votable = replica.query(params, exporter_config)
+    assert len(votable.get_first_table().array) == 1
+    assert fields(votable) == expected
@@ -0,0 +1,40 @@
+"""Tests for the collection registry."""
+
+import pytest
+from httpx import AsyncClient
+from rubin.repertoire import Discovery, DiscoveryClient
+
+from sia.config import DatasetSettings, config
+from sia.exceptions import UsageFaultError
+from sia.registry import CollectionRegistry
+
+
+@pytest.mark.asyncio
+async def test_resolve(
+    mock_discovery: Discovery, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = {"dp02": DatasetSettings(maxrec_limit=100)}
+    monkeypatch.setattr(config, "dataset_settings", settings)
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        discovery = DiscoveryClient(http_client)
+        runtime = await registry.resolve("dp02", discovery)
+        butler_url = mock_discovery.datasets["dp02"].butler_config
+        assert runtime.butler_url == str(butler_url)
+        assert runtime.limits.maxrec == 100
+        assert await registry.resolve("dp02", discovery) is runtime
+
+        # Refreshing without any changes keeps the same state.
+        await registry.refresh(discovery)
+        assert registry.get("dp02") is runtime
+
+        # Forcing a reload swaps in new state, but the old state is untouched.
+        await registry.refresh(discovery, reload=True)
+        new_runtime = registry.get("dp02")
+        assert new_runtime
+        assert new_runtime is not runtime
+        assert new_runtime.exporter_config is not runtime.exporter_config
+        assert new_runtime.butler_factory is runtime.butler_factory
+
+        with pytest.raises(UsageFaultError):
+            await registry.resolve("dp1", discovery)
@@ -0,0 +1,151 @@
+"""Tests for answering queries from a local ObsCore replica."""
+
+import io
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pyarrow as pa
+import pytest
+import structlog
+from astropy.io.votable import parse
+from httpx import AsyncClient
+from lsst.dax.obscore import siav2
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+from pyarrow import parquet
+from rubin.repertoire import DiscoveryClient
+
+from sia.bulkhead import Bulkheads
+from sia.config import config
+from sia.cost import CostEstimator
+from sia.events import Events
+from sia.health import HealthTracker
+from sia.models.sia_query_params import SIAQueryParams
+from sia.registry import CollectionRegistry, CollectionRuntime
+from sia.replica import ObsCoreReplica
+from sia.services.query import QueryService
+from sia.votable import query_status
+
+
+def write_snapshot(path: Path) -> Path:
+    table = pa.table(
+        {
+            "obs_publisher_did": [
+                "ivo://test/a",
+                "ivo://test/b",
+                "ivo://test/c",
+            ],
+            "dataproduct_type": ["image", "image", "cube"],
+            "calib_level": pa.array([2, 3, 2], type=pa.int16()),
+            "instrument_name": ["LSSTCam", "LATISS", "LSSTCam"],
+            "s_ra": [10.0, 10.5, 200.0],
+            "s_dec": [0.0, 0.0, -30.0],
+            "s_fov": [0.2, 0.2, None],
+            "t_min": [60000.0, 60100.0, 60200.0],
+            "t_max": [60000.01, 60100.01, 60200.01],
+            "t_exptime": [30.0, 15.0, 30.0],
+            "em_min": [4e-7, 6e-7, 4e-7],
+            "em_max": [5e-7, 7e-7, 5e-7],
+        }
+    )
+    snapshot = path / "obscore.parquet"
+    parquet.write_table(table, snapshot)
+    return snapshot
+
+
+async def resolve_runtime() -> CollectionRuntime:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        return await registry.resolve("dp02", DiscoveryClient(http_client))
+
+
+def select(replica: ObsCoreReplica, **kwargs: Any) -> list[int]:
+    params = SIAv2Parameters.from_siav2(**kwargs)
+    return list(replica.select(params))
+
+
+def test_select(tmp_path: Path) -> None:
+    replica = ObsCoreReplica.from_parquet(write_snapshot(tmp_path))
+    assert len(replica) == 3
+    assert select(replica) == [0, 1, 2]
+
+    # Regions match rows whose footprint overlaps them, not just their
+    # centers.
+    assert select(replica, pos="CIRCLE 10.25 0 0.2") == [0, 1]
+    assert select(replica, pos="CIRCLE 10.25 0 0.01") == []
+    assert select(replica, pos="RANGE 10.05 10.2 -1 1") == [0]
+    assert select(replica, pos="CIRCLE 200 -30 0.1") == [2]
+    assert select(replica, pos=["CIRCLE 10 0 0.1", "CIRCLE 200 -30 1"]) == [
+        0,
+        2,
+    ]
+
+    assert select(replica, time="60050 +Inf") == [1, 2]
+    assert select(replica, time="60100.005") == [1]
+    assert select(replica, band="4.5e-7 4.6e-7") == [0, 2]
+    assert select(replica, exptime="20 +Inf") == [0, 2]
+    assert select(replica, calib=[3]) == [1]
+    assert select(replica, dptype="cube") == [2]
+    assert select(replica, instrument="LSSTCam", time="-Inf 60150") == [0]
+
+
+def test_select_id(tmp_path: Path) -> None:
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    dids = [f"ivo://org.rubinobs/usdac/dp02?repo=dp02&id={i}" for i in ids]
+    table = pa.table(
+        {
+            "obs_publisher_did": [*dids, None],
+            "dataproduct_type": ["image", "image", "cube", "image"],
+        }
+    )
+    snapshot = tmp_path / "obscore.parquet"
+    parquet.write_table(table, snapshot)
+    replica = ObsCoreReplica.from_parquet(snapshot)
+
+    # IDs are matched by dataset ID, whatever the repository label and case.
+    assert select(replica, id=dids[1]) == [1]
+    assert select(replica, id=f"butler://other/{ids[2].upper()}") == [2]
+    assert select(replica, id=[dids[2], dids[0]]) == [0, 2]
+    assert select(replica, id=dids, dptype="image") == [0, 1]
+    unknown = f"ivo://org.rubinobs/usdac/dp02?repo=dp02&id={uuid.uuid4()}"
+    assert select(replica, id=unknown) == []
+    with pytest.raises(ValueError, match="Unrecognized URI scheme"):
+        select(replica, id="test/a")
+
+
+@pytest.mark.asyncio
+async def test_query(tmp_path: Path) -> None:
+    replica = ObsCoreReplica.from_parquet(write_snapshot(tmp_path))
+    runtime = await resolve_runtime()
+    votable = replica.query(
+        SIAv2Parameters.from_siav2(dptype="image", maxrec="1"),
+        runtime.exporter_config,
+    )
+    table = votable.get_first_table()
+    assert list(table.array["obs_publisher_did"]) == ["ivo://test/a"]
+    assert query_status(votable) == "OVERFLOW"
+
+    # The query service answers from the replica without a Butler query.
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    service = QueryService(
+        butler=None,  # type: ignore[arg-type]
+        collection=replace(runtime, replica=replica),
+        health=HealthTracker(),
+        bulkheads=Bulkheads(),
+        costs=CostEstimator(),
+        events=events,
+        logger=structlog.get_logger("sia"),
+    )
+    with patch.object(siav2, "siav2_query") as mock:
+        params = SIAQueryParams(pos=["CIRCLE 10.25 0 0.2"], maxrec=10)
+        result = await service.run_query_votable(params, "/q", "user")
+        assert not mock.called
+    votable = parse(io.BytesIO(result))
+    dids = votable.get_first_table().array["obs_publisher_did"]
+    assert list(dids) == ["ivo://test/a", "ivo://test/b"]
+    assert query_status(votable) == "OK"
@@ -0,0 +1,89 @@
+"""Tests for retries and hedging of Butler calls."""
+
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+import structlog
+from lsst.daf.butler.remote_butler import ButlerServerError  # type: ignore[attr-defined]
+
+from sia.config import config
+from sia.executors import executors
+from sia.retry import ButlerRetrier, LatencyWindow
+
+
+def build_retrier(
+    window: LatencyWindow | None = None, deadline: float | None = None
+) -> ButlerRetrier:
+    return ButlerRetrier(
+        executors.query,
+        window or LatencyWindow(),
+        structlog.get_logger("sia"),
+        deadline=deadline,
+    )
+
+
+@pytest.mark.asyncio
+async def test_retry(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "butler_retries", 2)
+    monkeypatch.setattr(config, "butler_retry_backoff", timedelta(0))
+    calls = 0
+
+    def flaky(status_code: int | None) -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise ButlerServerError(
+                client_request_id="id", status_code=status_code
+            )
+        return "result"
+
+    result, _ = await build_retrier().run(flaky, 503)
+    assert result == "result"
+    assert calls == 3
+
+    # Connection errors are also retried, but only up to the limit.
+    calls = -1
+    with pytest.raises(ButlerServerError):
+        await build_retrier().run(flaky, None)
+    assert calls == 2
+
+    # Client errors are not retried.
+    calls = 0
+    with pytest.raises(ButlerServerError):
+        await build_retrier().run(flaky, 400)
+    assert calls == 1
+
+    # Nor is anything that would take the query past its deadline.
+    calls = 0
+    deadline = asyncio.get_running_loop().time()
+    with pytest.raises(ButlerServerError):
+        await build_retrier(deadline=deadline).run(flaky, 503)
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "butler_hedge_percentile", 95.0)
+    window = LatencyWindow()
+    for _ in range(20):
+        window.record(0.01)
+    assert window.percentile(95) == 0.01
+    release = threading.Event()
+    calls = 0
+
+    def stuck() -> int:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            release.wait(5)
+        return calls
+
+    # The first attempt hangs, so a hedged second attempt answers.
+    start = time.monotonic()
+    result, _ = await build_retrier(window).run(stuck)
+    release.set()
+    assert result == 2
+    assert time.monotonic() - start < 1
@@ -0,0 +1,47 @@
+"""Tests for the background availability prober."""
+
+import pytest
+import respx
+import structlog
+from httpx import AsyncClient, Response
+from rubin.repertoire import Discovery, DiscoveryClient
+
+from sia.config import config
+from sia.health import HealthTracker
+from sia.registry import CollectionRegistry
+from sia.services.availability import AvailabilityService
+
+
+@pytest.mark.asyncio
+async def test_probe(
+    mock_discovery: Discovery, respx_mock: respx.Router
+) -> None:
+    butler_url = mock_discovery.datasets["dp02"].butler_config
+    route = respx_mock.get(str(butler_url))
+    route.mock(return_value=Response(503))
+    registry = CollectionRegistry()
+    health = HealthTracker()
+    async with AsyncClient() as http_client:
+        await registry.resolve("dp02", DiscoveryClient(http_client))
+        availability = AvailabilityService(
+            http_client, health, structlog.get_logger("sia")
+        )
+
+        for failures in range(1, config.circuit_breaker_threshold + 1):
+            assert not health.is_open("dp02")
+            await availability.probe_all(registry)
+            result = health.get("dp02")
+            assert result
+            assert not result.available
+            assert result.failures == failures
+            assert result.error
+            assert "503" in result.error
+        assert health.is_open("dp02")
+
+        route.mock(return_value=Response(200))
+        await availability.probe_all(registry)
+        result = health.get("dp02")
+        assert result
+        assert result.available
+        assert result.failures == 0
+        assert not health.is_open("dp02")
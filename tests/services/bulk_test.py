@@ -0,0 +1,188 @@
+"""Tests for bulk queries of many positions."""
+
+import asyncio
+import io
+from collections.abc import AsyncIterator
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import structlog
+from astropy.io.votable import parse_single_table
+from astropy.io.votable.tree import Info, VOTableFile
+from httpx import AsyncClient
+from lsst.dax.obscore import siav2
+from rubin.repertoire import DiscoveryClient
+
+from sia.bulkhead import Bulkheads
+from sia.config import config
+from sia.cost import CostEstimator, QueryLane
+from sia.events import Events
+from sia.exceptions import UsageFaultError
+from sia.health import HealthTracker
+from sia.models.sia_query_params import SIAQueryParams
+from sia.registry import CollectionRegistry
+from sia.services import query
+from sia.services.bulk import BulkQueryService
+from sia.services.query import QueryService
+from sia.upload import Cone
+
+from ..support.butler import MockButler, mock_siav2_query
+
+
+async def build_service(
+    bulkheads: Bulkheads | None = None,
+) -> BulkQueryService:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        runtime = await registry.resolve("dp02", DiscoveryClient(http_client))
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    bulkheads = bulkheads or Bulkheads()
+    logger = structlog.get_logger("sia")
+
+    def create_query_service() -> QueryService:
+        return QueryService(
+            butler=MockButler(),
+            collection=runtime,
+            health=HealthTracker(),
+            bulkheads=bulkheads,
+            costs=CostEstimator(),
+            events=events,
+            logger=logger,
+        )
+
+    return BulkQueryService(create_query_service, logger)
+
+
+async def collect(chunks: AsyncIterator[bytes]) -> bytes:
+    return b"".join([c async for c in chunks])
+
+
+@pytest.mark.asyncio
+async def test_bulk_query(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "bulk_batch_size", 2)
+    service = await build_service()
+    cones = [Cone(320, -0.1, 1), Cone(321, -0.2, 1), Cone(322, -0.3, 1)]
+    statuses = iter(["OK", "OVERFLOW", "OK"])
+
+    def query_with_status(*args: object, **kwargs: object) -> VOTableFile:
+        votable = mock_siav2_query()
+        info = Info(name="QUERY_STATUS", value=next(statuses))
+        votable.resources[0].infos.append(info)
+        return votable
+
+    # An overflow for any position is reported at the end of the table.
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = query_with_status
+        chunks = await service.run_query_votable(
+            cones, SIAQueryParams(), "/bulk", "user"
+        )
+        result = await collect(chunks)
+    table = parse_single_table(io.BytesIO(result)).array
+    assert list(table["upload_row"]) == [0, 1, 2]
+    assert b'<INFO name="QUERY_STATUS" value="OVERFLOW">' in result
+
+    # A failure after the first batch ends the table early with an error.
+    calls = 0
+
+    def fail_later(*args: object, **kwargs: object) -> VOTableFile:
+        nonlocal calls
+        calls += 1
+        if calls > 2:
+            raise RuntimeError("Butler failed")
+        return mock_siav2_query()
+
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = fail_later
+        chunks = await service.run_query_votable(
+            cones, SIAQueryParams(), "/bulk", "user"
+        )
+        result = await collect(chunks)
+    table = parse_single_table(io.BytesIO(result)).array
+    assert list(table["upload_row"]) == [0, 1]
+    assert b'<INFO name="QUERY_STATUS" value="ERROR">' in result
+
+
+@pytest.mark.asyncio
+async def test_bulk_failure() -> None:
+    service = await build_service()
+    cones = [Cone(320, -0.1, 1), Cone(321, -0.2, 1), Cone(322, -0.3, 1)]
+    stopped = []
+
+    async def run_query(
+        self: QueryService,
+        params: SIAQueryParams,
+        *args: object,
+        **kwargs: object,
+    ) -> VOTableFile:
+        if params.pos == [cones[0].to_pos()]:
+            await asyncio.sleep(0)
+            raise UsageFaultError("Invalid query")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            stopped.append(params.pos)
+        return mock_siav2_query()
+
+    # A failure for one position stops the queries for the others in the
+    # batch before the error is raised.
+    with patch.object(QueryService, "run_query", run_query):
+        with pytest.raises(UsageFaultError):
+            await service.run_query_votable(
+                cones, SIAQueryParams(), "/bulk", "user"
+            )
+    assert len(stopped) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "max_queries_per_user", 1)
+    monkeypatch.setattr(config, "bulk_concurrency", 3)
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+    cones = [Cone(320, -0.1, 1), Cone(321, -0.2, 1), Cone(322, -0.3, 1)]
+    slots = []
+
+    def query(*args: object, **kwargs: object) -> VOTableFile:
+        fast = bulkheads.status().values()
+        slow = bulkheads.status(QueryLane.slow).values()
+        slots.append(
+            (sum(s.active for s in fast), sum(s.active for s in slow))
+        )
+        return mock_siav2_query()
+
+    # The batch holds one slot in the slow lane, and its positions run
+    # without slots of their own, so the user limit applies to the batch.
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = query
+        chunks = await service.run_query_votable(
+            cones, SIAQueryParams(), "/bulk", "user"
+        )
+        await collect(chunks)
+    assert slots == [(0, 1)] * len(cones)
+    statuses = [*bulkheads.status().values()]
+    statuses += bulkheads.status(QueryLane.slow).values()
+    assert sum(s.active + s.queued for s in statuses) == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_disconnect(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(query, "_DISCONNECT_POLL_INTERVAL", 0.01)
+    service = await build_service()
+    cones = [Cone(320, -0.1, 1), Cone(321, -0.2, 1), Cone(322, -0.3, 1)]
+    is_disconnected = AsyncMock(return_value=True)
+
+    # A single watcher checks for disconnects for the whole batch.
+    with patch.object(QueryService, "run_query") as run_query:
+        run_query.side_effect = lambda *args, **kwargs: asyncio.sleep(10)
+        with pytest.raises(UsageFaultError):
+            await service.run_query_votable(
+                cones,
+                SIAQueryParams(),
+                "/bulk",
+                "user",
+                is_disconnected=is_disconnected,
+            )
+    assert is_disconnected.await_count == 1
@@ -0,0 +1,90 @@
+"""Tests for building the sky coverage of collections."""
+
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+import structlog
+from httpx import AsyncClient
+from lsst.sphgeom import Angle, Circle, LonLat, UnitVector3d
+from pyarrow import parquet
+from pydantic import SecretStr
+from rubin.repertoire import DiscoveryClient
+
+from sia.config import DatasetSettings, config
+from sia.registry import CollectionRegistry
+from sia.services.coverage import CoverageService
+
+
+def circle(ra: float, dec: float, radius: float) -> Circle:
+    center = UnitVector3d(LonLat.fromDegrees(ra, dec))
+    return Circle(center, Angle.fromDegrees(radius))
+
+
+async def build_registry() -> CollectionRegistry:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        await registry.resolve("dp02", DiscoveryClient(http_client))
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_build_from_butler(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = {"dp02": DatasetSettings(coverage_dimension="visit")}
+    monkeypatch.setattr(config, "dataset_settings", settings)
+    registry = await build_registry()
+    service = CoverageService(
+        registry=registry, logger=structlog.get_logger("sia")
+    )
+
+    # Without a service token, the Butler cannot be queried.
+    await service.build_all()
+    runtime = registry.get("dp02")
+    assert runtime
+    assert runtime.coverage is None
+
+    monkeypatch.setattr(config, "service_token", SecretStr("some-token"))
+    await service.build_all()
+    runtime = registry.get("dp02")
+    assert runtime
+    assert runtime.coverage
+    assert runtime.coverage.level == config.coverage_level
+    assert runtime.coverage.overlaps(circle(180.5, -30, 0.1))
+    assert not runtime.coverage.overlaps(circle(0, 0, 1))
+
+
+@pytest.mark.asyncio
+async def test_build_from_replica(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    table = pa.table(
+        {
+            "obs_publisher_did": ["ivo://test/a", "ivo://test/b"],
+            "s_ra": [10.0, None],
+            "s_dec": [0.0, None],
+            "s_fov": [0.2, None],
+        }
+    )
+    snapshot = tmp_path / "obscore.parquet"
+    parquet.write_table(table, snapshot)
+    settings = {"dp02": DatasetSettings(replica=snapshot)}
+    monkeypatch.setattr(config, "dataset_settings", settings)
+    monkeypatch.setattr(config, "coverage_level", 7)
+    registry = await build_registry()
+    service = CoverageService(
+        registry=registry, logger=structlog.get_logger("sia")
+    )
+    await service.build_all()
+    runtime = registry.get("dp02")
+    assert runtime
+    assert runtime.coverage
+    assert runtime.coverage.level == 7
+    assert runtime.coverage.overlaps(circle(10, 0.05, 0.01))
+    assert not runtime.coverage.overlaps(circle(20, 0, 1))
+
+    # The coverage of an unchanged replica is reused.
+    coverage = runtime.coverage
+    await service.build_all()
+    runtime = registry.get("dp02")
+    assert runtime
+    assert runtime.coverage is coverage
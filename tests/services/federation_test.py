@@ -0,0 +1,103 @@
+"""Tests for queries against several collections."""
+
+import asyncio
+import io
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+import structlog
+from astropy.io.votable import parse_single_table
+from httpx import AsyncClient
+from lsst.dax.obscore import siav2
+from rubin.repertoire import DiscoveryClient
+
+from sia.bulkhead import Bulkheads
+from sia.config import config
+from sia.cost import CostEstimator
+from sia.events import Events
+from sia.exceptions import UsageFaultError
+from sia.health import HealthTracker
+from sia.models.sia_query_params import SIAQueryParams
+from sia.registry import CollectionRegistry
+from sia.services.federation import FederatedQueryService
+from sia.services.query import QueryService
+
+from ..support.butler import MockButler, mock_siav2_query
+
+
+async def build_service(names: list[str]) -> FederatedQueryService:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        runtime = await registry.resolve("dp02", DiscoveryClient(http_client))
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    bulkheads = Bulkheads()
+    logger = structlog.get_logger("sia")
+    services = {
+        name: QueryService(
+            butler=MockButler(),
+            collection=replace(
+                runtime, collection=replace(runtime.collection, name=name)
+            ),
+            health=HealthTracker(),
+            bulkheads=bulkheads,
+            costs=CostEstimator(),
+            events=events,
+            logger=logger,
+        )
+        for name in names
+    }
+    return FederatedQueryService(services, logger)
+
+
+@pytest.mark.asyncio
+async def test_federated_query() -> None:
+    service = await build_service(["dp02", "dp1"])
+    with patch.object(siav2, "siav2_query") as mock:
+        dids = iter(["ivo://example/1", "ivo://example/2"])
+
+        def query(*args: object, **kwargs: object) -> object:
+            votable = mock_siav2_query()
+            array = votable.get_first_table().array
+            array["obs_publisher_did"] = next(dids)
+            return votable
+
+        mock.side_effect = query
+        params = SIAQueryParams(pos=["CIRCLE 0 0 0.1"])
+        result = await service.run_query_votable(params, "/query", "user")
+
+    # Each collection is queried once and its rows are labeled.
+    assert mock.call_count == 2
+    table = parse_single_table(io.BytesIO(result)).array
+    assert sorted(table["collection_name"]) == ["dp02", "dp1"]
+
+
+@pytest.mark.asyncio
+async def test_federated_failure() -> None:
+    service = await build_service(["dp02", "dp1"])
+    stopped = []
+
+    async def fail(*args: object, **kwargs: object) -> bytes:
+        await asyncio.sleep(0)
+        raise UsageFaultError("Invalid query")
+
+    async def wait(*args: object, **kwargs: object) -> bytes:
+        try:
+            await asyncio.Event().wait()
+        finally:
+            stopped.append(True)
+        return b""
+
+    # A failure against one collection stops the queries against the others
+    # before the error is raised.
+    with (
+        patch.object(service._services["dp02"], "run_query", fail),
+        patch.object(service._services["dp1"], "run_query", wait),
+    ):
+        params = SIAQueryParams(pos=["CIRCLE 0 0 0.1"])
+        with pytest.raises(UsageFaultError):
+            await service.run_query_votable(params, "/query", "user")
+    assert stopped == [True]
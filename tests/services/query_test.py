@@ -0,0 +1,304 @@
+"""Tests for the query service."""
+
+import io
+import time
+import uuid
+from contextlib import AsyncExitStack
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+import structlog
+from astropy.io.votable import parse, parse_single_table
+from astropy.io.votable.tree import Info, VOTableFile
+from httpx import AsyncClient
+from lsst.dax.obscore import siav2
+from rubin.repertoire import DiscoveryClient
+
+from sia.bulkhead import Bulkheads
+from sia.config import config
+from sia.cost import CostEstimator, QueryLane
+from sia.coverage import Coverage
+from sia.events import Events
+from sia.exceptions import TransientFaultError, UsageFaultError
+from sia.health import HealthTracker
+from sia.models.sia_query_params import MAXREC_LIMIT, SIAQueryParams
+from sia.registry import CollectionRegistry
+from sia.services import query
+from sia.services.query import QueryService
+from sia.votable import column_names, query_status
+
+from ..support.butler import MockButler, mock_siav2_query
+
+
+async def build_service(
+    bulkheads: Bulkheads, timeout: timedelta = timedelta(minutes=5)
+) -> QueryService:
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        runtime = await registry.resolve("dp02", DiscoveryClient(http_client))
+    limits = replace(runtime.limits, timeout=timeout)
+    collection = replace(runtime, limits=limits)
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    return QueryService(
+        butler=MockButler(),
+        collection=collection,
+        health=HealthTracker(),
+        bulkheads=bulkheads,
+        costs=CostEstimator(),
+        events=events,
+        logger=structlog.get_logger("sia"),
+    )
+
+
+def active(bulkheads: Bulkheads) -> int:
+    statuses = [*bulkheads.status().values()]
+    statuses += bulkheads.status(QueryLane.slow).values()
+    return sum(s.active for s in statuses)
+
+
+def slow_query(*args: object, **kwargs: object) -> object:
+    time.sleep(0.5)
+    return mock_siav2_query()
+
+
+@pytest.mark.asyncio
+async def test_disconnect(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(query, "_DISCONNECT_POLL_INTERVAL", 0.01)
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+    params = SIAQueryParams()
+
+    async def is_disconnected() -> bool:
+        return True
+
+    with patch.object(siav2, "siav2_query", side_effect=slow_query):
+        with pytest.raises(UsageFaultError) as exc_info:
+            await service.run_query_votable(
+                params, "/query", "user", is_disconnected=is_disconnected
+            )
+    assert exc_info.value.status_code == 499
+    assert active(bulkheads) == 0
+
+    # A connected client gets its results.
+    async def is_connected() -> bool:
+        return False
+
+    result = await service.run_query_votable(
+        params, "/query", "user", is_disconnected=is_connected
+    )
+    assert result
+
+
+@pytest.mark.asyncio
+async def test_deadline() -> None:
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads, timedelta(milliseconds=50))
+    with patch.object(siav2, "siav2_query", side_effect=slow_query):
+        with pytest.raises(TransientFaultError) as exc_info:
+            await service.run_query_votable(SIAQueryParams(), "/query", "user")
+    assert exc_info.value.status_code == 504
+    assert active(bulkheads) == 0
+
+
+@pytest.mark.asyncio
+async def test_lanes() -> None:
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+
+    # A small cone search runs in the fast lane, and an unconstrained query
+    # in the slow lane.
+    await service.run_query_votable(
+        SIAQueryParams(pos=["CIRCLE 0 0 0.1"]), "/query", "user"
+    )
+    assert set(bulkheads.status()) == {"dp02"}
+    assert bulkheads.status(QueryLane.slow) == {}
+    await service.run_query_votable(SIAQueryParams(), "/query", "user")
+    slow = bulkheads.status(QueryLane.slow)["dp02"]
+    assert (
+        slow.concurrency
+        == config.settings_for("dp02").max_concurrent_slow_queries
+    )
+
+
+@pytest.mark.asyncio
+async def test_maxrec(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "min_default_maxrec", 10)
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.return_value = mock_siav2_query()
+
+        # Explicit values are honored, and omitted values get the default
+        # for the collection while it is idle.
+        await service.run_query_votable(SIAQueryParams(maxrec=5), "/q", "user")
+        assert mock.call_args.args[2].maxrec == 5
+        await service.run_query_votable(SIAQueryParams(), "/q", "user")
+        assert mock.call_args.args[2].maxrec == MAXREC_LIMIT
+
+        # Under load, the default shrinks.
+        registry = CollectionRegistry()
+        async with AsyncClient() as http_client:
+            discovery = DiscoveryClient(http_client)
+            runtime = await registry.resolve("dp02", discovery)
+        bulkhead = bulkheads.get(runtime)
+        async with AsyncExitStack() as stack:
+            for i in range(bulkhead.concurrency - 1):
+                await stack.enter_async_context(bulkhead.slot(f"user{i}"))
+            await service.run_query_votable(SIAQueryParams(), "/q", "user")
+        assert 10 < mock.call_args.args[2].maxrec < MAXREC_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_pos_fanout(monkeypatch: pytest.MonkeyPatch) -> None:
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+    params = SIAQueryParams(pos=["CIRCLE 0 0 0.1", "CIRCLE 10 10 0.1"])
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = lambda *args, **kwargs: mock_siav2_query()
+
+        # Each region is queried separately and the duplicate row from the
+        # two sub-queries is merged.
+        result = await service.run_query_votable(params, "/q", "user")
+        assert mock.call_count == 2
+        assert [len(c.args[2].pos) for c in mock.call_args_list] == [1, 1]
+        assert len(parse_single_table(io.BytesIO(result)).array) == 1
+
+        # With fan-out disabled, there is a single query.
+        monkeypatch.setattr(config, "pos_fanout", False)
+        mock.reset_mock()
+        await service.run_query_votable(params, "/q", "user")
+        assert mock.call_count == 1
+        assert len(mock.call_args.args[2].pos) == 2
+
+
+@pytest.mark.asyncio
+async def test_early_termination(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "pos_fanout_concurrency", 1)
+    service = await build_service(Bulkheads())
+    pos = [f"CIRCLE {i * 10} {i * 10} 0.1" for i in range(4)]
+    params = SIAQueryParams(pos=pos, maxrec=1)
+
+    distinct = True
+
+    def query_with_status(*args: object, **kwargs: object) -> VOTableFile:
+        votable = mock_siav2_query()
+        if distinct:
+            array = votable.get_first_table().array
+            array["obs_publisher_did"][0] = f"ivo://example/{uuid.uuid4()}"
+        info = Info(name="QUERY_STATUS", value="OK")
+        votable.resources[0].infos.append(info)
+        return votable
+
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = query_with_status
+
+        # Once the sub-queries hold more than MAXREC rows, the remaining ones
+        # are not run and the result is marked as an overflow. The next
+        # sub-query may already have started by then.
+        result = await service.run_query_votable(params, "/q", "user")
+        assert mock.call_count in {2, 3}
+        assert query_status(parse(io.BytesIO(result))) == "OVERFLOW"
+
+        # Overlapping sub-queries that match the same data product only
+        # count it once, so all of them run and the result is complete.
+        mock.reset_mock()
+        distinct = False
+        result = await service.run_query_votable(params, "/q", "user")
+        assert mock.call_count == len(pos)
+        votable = parse(io.BytesIO(result))
+        assert len(votable.get_first_table().array) == 1
+        assert query_status(votable) == "OK"
+
+
+@pytest.mark.asyncio
+async def test_outside_coverage() -> None:
+    bulkheads = Bulkheads()
+    service = await build_service(bulkheads)
+    coverage = Coverage.from_circles(
+        np.array([180.0]), np.array([-30.0]), np.array([1.0]), 9
+    )
+    service._collection = replace(service._collection, coverage=coverage)
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = lambda *args, **kwargs: mock_siav2_query()
+
+        # Queries outside the coverage return no rows without a Butler
+        # query, even while the Butler server is down.
+        service._health = HealthTracker()
+        for _ in range(config.circuit_breaker_threshold):
+            service._health.record(
+                "dp02",
+                checked=datetime.now(tz=UTC),
+                latency=timedelta(0),
+                error="down",
+            )
+        params = SIAQueryParams(pos=["CIRCLE 0 60 1", "CIRCLE 90 0 1"])
+        result = await service.run_query_votable(params, "/q", "user")
+        assert not mock.called
+        votable = parse(io.BytesIO(result))
+        assert len(votable.get_first_table().array) == 0
+        assert "obs_publisher_did" in column_names(votable)
+        assert active(bulkheads) == 0
+
+        # Queries that may overlap it are run normally.
+        service._health = HealthTracker()
+        params = SIAQueryParams(pos=["CIRCLE 180 -30 0.1"])
+        await service.run_query_votable(params, "/q", "user")
+        assert mock.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_id_lookup(monkeypatch: pytest.MonkeyPatch) -> None:
+    service = await build_service(Bulkheads())
+    all_types = service._obscore_config.dataset_types
+    ref = Mock()
+    ref.datasetType.name = "calexp"
+    ref.dataId = {"instrument": "HSC"}
+    butler = Mock()
+    butler.get_dataset.return_value = ref
+    service._butler = butler
+    did = f"ivo://org.rubinobs/usdac/dp02?repo=dp02&id={uuid.uuid4()}"
+    with patch.object(siav2, "siav2_query") as mock:
+        mock.side_effect = lambda *args, **kwargs: mock_siav2_query()
+
+        # The query is narrowed to the dataset types and instruments of the
+        # datasets that were found.
+        params = SIAQueryParams(id=[did], maxrec=5)
+        await service.run_query_votable(params, "/q", "user")
+        obscore_config, siav2_params = mock.call_args.args[1:3]
+        expected = {
+            n for n, c in all_types.items() if n == "calexp" or c.extra_columns
+        }
+        assert set(obscore_config.dataset_types) == expected
+        assert siav2_params.instrument == ("HSC",)
+
+        # Other constraints disable the lookup.
+        params = SIAQueryParams(id=[did], instrument=["HSC"])
+        await service.run_query_votable(params, "/q", "user")
+        assert mock.call_args.args[1] is service._obscore_config
+
+        # So does looking up more datasets than the limit.
+        monkeypatch.setattr(config, "id_lookup_limit", 0)
+        params = SIAQueryParams(id=[did])
+        await service.run_query_votable(params, "/q", "user")
+        assert mock.call_args.args[1] is service._obscore_config
+        monkeypatch.undo()
+
+        # Datasets that are not found give no rows without an ObsCore query.
+        mock.reset_mock()
+        butler.get_dataset.return_value = None
+        result = await service.run_query_votable(params, "/q", "user")
+        assert not mock.called
+        votable = parse(io.BytesIO(result))
+        assert len(votable.get_first_table().array) == 0
+        assert "obs_publisher_did" in column_names(votable)
+
+        # IDs that are not dataset URIs are left to the full query.
+        params = SIAQueryParams(id=["ivo://example/a"])
+        await service.run_query_votable(params, "/q", "user")
+        assert mock.call_args.args[1] is service._obscore_config
@@ -0,0 +1,90 @@
+"""Tests for configuration reloads."""
+
+import json
+from pathlib import Path
+
+import pytest
+import structlog
+from httpx import AsyncClient
+from pydantic import ValidationError
+from rubin.repertoire import DiscoveryClient
+
+from sia.config import config
+from sia.models.sia_query_params import MAXREC_LIMIT
+from sia.registry import CollectionRegistry
+from sia.services.reload import ReloadService
+
+
+@pytest.mark.asyncio
+async def test_reload(settings_file: Path) -> None:
+    registry = CollectionRegistry()
+    reload_service = ReloadService(
+        registry=registry, logger=structlog.get_logger("sia")
+    )
+    async with AsyncClient() as http_client:
+        discovery = DiscoveryClient(http_client)
+        runtime = await registry.resolve("dp02", discovery)
+        assert runtime.limits.maxrec == MAXREC_LIMIT
+
+        summary = await reload_service.reload(discovery)
+        assert summary.model_dump() == {
+            "added": [],
+            "removed": [],
+            "updated": [],
+            "ignored": [],
+        }
+        assert registry.get("dp02") is runtime
+
+        settings = {"dp02": {"maxrec_limit": 10}}
+        settings_file.write_text(
+            f"SIA_DATASET_SETTINGS='{json.dumps(settings)}'\n"
+        )
+        summary = await reload_service.reload(discovery)
+
+    assert summary.updated == ["dp02"]
+    assert config.settings_for("dp02").maxrec_limit == 10
+    new_runtime = registry.get("dp02")
+    assert new_runtime
+    assert new_runtime.limits.maxrec == 10
+    assert new_runtime.butler_factory is runtime.butler_factory
+    assert runtime.limits.maxrec == MAXREC_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_reload_remove(
+    settings_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    registry = CollectionRegistry()
+    reload_service = ReloadService(
+        registry=registry, logger=structlog.get_logger("sia")
+    )
+    async with AsyncClient() as http_client:
+        discovery = DiscoveryClient(http_client)
+        await registry.resolve("dp02", discovery)
+
+        obscore_config = {"dp1": "https://example.com/dp1.yaml"}
+        monkeypatch.setenv("SIA_DATASETS", '["dp1"]')
+        monkeypatch.setenv("SIA_OBSCORE_CONFIG", json.dumps(obscore_config))
+        summary = await reload_service.reload(discovery)
+
+    assert summary.added == ["dp1"]
+    assert summary.removed == ["dp02"]
+    assert config.datasets == ["dp1"]
+    assert registry.get("dp02") is None
+
+
+@pytest.mark.asyncio
+async def test_reload_invalid(
+    settings_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    reload_service = ReloadService(
+        registry=CollectionRegistry(), logger=structlog.get_logger("sia")
+    )
+    settings = {"dp1": {"maxrec_limit": 10}}
+    settings_file.write_text(
+        f"SIA_DATASET_SETTINGS='{json.dumps(settings)}'\n"
+    )
+    async with AsyncClient() as http_client:
+        with pytest.raises(ValidationError):
+            await reload_service.reload(DiscoveryClient(http_client))
+    assert config.dataset_settings == {}
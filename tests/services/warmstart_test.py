@@ -0,0 +1,58 @@
+"""Tests for the warm-start snapshot."""
+
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+import structlog
+from httpx import AsyncClient
+from rubin.repertoire import Discovery, DiscoveryClient
+
+from sia.constants import DATALINK_VERSION
+from sia.registry import CollectionRegistry
+from sia.services.warmstart import WarmStartService
+from sia.storage.snapshot import SnapshotStore
+
+
+def build_service(
+    path: Path, registry: CollectionRegistry
+) -> WarmStartService:
+    logger = structlog.get_logger("sia")
+    return WarmStartService(
+        store=SnapshotStore(path, logger), registry=registry, logger=logger
+    )
+
+
+@pytest.mark.asyncio
+async def test_snapshot(tmp_path: Path, mock_discovery: Discovery) -> None:
+    path = tmp_path / "snapshot.json"
+    butler_url = str(mock_discovery.datasets["dp02"].butler_config)
+    datalink = mock_discovery.datasets["dp02"].services["datalink"]
+    datalink_url = str(datalink.versions[DATALINK_VERSION].url)
+
+    # Without a snapshot, nothing is restored, but revalidation writes one.
+    service = build_service(path, CollectionRegistry())
+    assert not service.restore()
+    async with AsyncClient() as http_client:
+        await service.revalidate(DiscoveryClient(http_client))
+    assert path.exists()
+
+    # A new worker can then serve entirely from the snapshot.
+    registry = CollectionRegistry()
+    assert build_service(path, registry).restore()
+    discovery = Mock(spec=DiscoveryClient)
+    runtime = await registry.resolve("dp02", discovery)
+    discovery.butler_repositories.assert_not_called()
+    discovery.url_for_data.assert_not_called()
+    assert runtime.butler_url == butler_url
+    assert runtime.datalink_url == datalink_url
+    for settings in runtime.exporter_config.dataset_types.values():
+        assert settings.datalink_url_fmt
+        assert settings.datalink_url_fmt.startswith(datalink_url + "?")
+
+
+@pytest.mark.asyncio
+async def test_invalid_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "snapshot.json"
+    path.write_text("{not json")
+    assert not build_service(path, CollectionRegistry()).restore()
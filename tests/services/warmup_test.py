@@ -0,0 +1,27 @@
+"""Tests for startup warm-up."""
+
+import pytest
+import structlog
+from httpx import AsyncClient
+from pydantic import SecretStr
+from rubin.repertoire import DiscoveryClient
+
+from sia.config import config
+from sia.registry import CollectionRegistry
+from sia.services.warmup import WarmupService
+
+
+@pytest.mark.asyncio
+async def test_warm_up(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "service_token", SecretStr("some-token"))
+    registry = CollectionRegistry()
+    warmup = WarmupService(
+        registry=registry, logger=structlog.get_logger("sia")
+    )
+    async with AsyncClient() as http_client:
+        await warmup.warm_up(DiscoveryClient(http_client))
+
+    runtime = registry.get("dp02")
+    assert runtime
+    assert runtime.datalink_url == "https://example.com/links"
+    assert runtime.instruments == ("HSC",)
@@ -0,0 +1,192 @@
+"""Tests for shadow queries with alternate query engines."""
+
+import asyncio
+import threading
+from contextlib import AsyncExitStack
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+import pyarrow as pa
+import pytest
+import structlog
+from astropy.table import Table
+from httpx import AsyncClient
+from numpy import ma
+from pyarrow import parquet
+from rubin.repertoire import DiscoveryClient
+from starlette.types import Message, Receive, Scope, Send
+
+from sia.bulkhead import Bulkheads
+from sia.config import DatasetSettings, config
+from sia.cost import CostEstimator, QueryLane
+from sia.events import Events
+from sia.health import HealthTracker
+from sia.models.sia_query_params import SIAQueryParams
+from sia.registry import CollectionRegistry
+from sia.replica import ObsCoreReplica
+from sia.services.query import QueryService
+from sia.shadow import (
+    ShadowComparison,
+    ShadowMiddleware,
+    compare_results,
+    extract_keys,
+    shadow_runner,
+)
+
+from .support.butler import MockButler
+
+
+def build_array(dids: list[str], ra: list[float]) -> ma.MaskedArray:
+    table = Table({"obs_publisher_did": dids, "s_ra": ra, "s_dec": ra})
+    return table.as_array()
+
+
+def test_compare() -> None:
+    columns = ["s_ra", "s_dec", "t_min"]
+    primary = extract_keys(
+        build_array(["a", "b", "c"], [1.0, 2.0, 3.0]), columns, truncated=False
+    )
+    shadow = extract_keys(
+        build_array(["b", "c", "d"], [2.0, 3.5, 4.0]), columns, truncated=False
+    )
+    assert primary.rows["a"] == (1.0, 1.0)
+    comparison = compare_results(primary, shadow)
+    assert comparison == ShadowComparison(1, 1, 1, truncated=False)
+    assert not comparison.matches
+    assert compare_results(primary, primary).matches
+
+    # If either result was cut at MAXREC, only rows in both are compared.
+    truncated = replace(shadow, truncated=True)
+    comparison = compare_results(primary, truncated)
+    assert comparison == ShadowComparison(0, 0, 1, truncated=True)
+
+
+async def build_service(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> tuple[QueryService, Bulkheads, Events]:
+    monkeypatch.setattr(config, "shadow_fraction", 1.0)
+    monkeypatch.setattr(config, "shadow_columns", ["s_ra", "s_dec", "em_min"])
+    settings = {"dp02": DatasetSettings(shadow_replica=True)}
+    monkeypatch.setattr(config, "dataset_settings", settings)
+
+    # The replica has the same row as the mock Butler query result, plus one
+    # more.
+    snapshot = tmp_path / "obscore.parquet"
+    table = pa.table(
+        {
+            "obs_publisher_did": ["ivo://example/123", "ivo://example/456"],
+            "s_ra": [180.0, 180.01],
+            "s_dec": [-30.0, -30.0],
+            "s_fov": [0.1, 0.1],
+            "em_min": [4.0e-7, 4.0e-7],
+            "em_max": [7.0e-7, 7.0e-7],
+        }
+    )
+    parquet.write_table(table, snapshot)
+    replica = ObsCoreReplica.from_parquet(snapshot)
+
+    registry = CollectionRegistry()
+    async with AsyncClient() as http_client:
+        runtime = await registry.resolve("dp02", DiscoveryClient(http_client))
+    event_manager = config.metrics.make_manager()
+    await event_manager.initialize()
+    events = Events()
+    await events.initialize(event_manager)
+    bulkheads = Bulkheads()
+    service = QueryService(
+        butler=MockButler(),
+        collection=replace(runtime, replica=replica),
+        health=HealthTracker(),
+        bulkheads=bulkheads,
+        costs=CostEstimator(),
+        events=events,
+        logger=structlog.get_logger("sia"),
+    )
+    return service, bulkheads, events
+
+
+@pytest.mark.asyncio
+async def test_shadow_replica(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    service, bulkheads, events = await build_service(tmp_path, monkeypatch)
+    runtime = service._collection
+
+    # The query is answered by the Butler and shadowed with the replica in
+    # the background.
+    publish = AsyncMock()
+    with patch.object(events.sia_shadow_query_compared, "publish", publish):
+        params = SIAQueryParams(pos=["CIRCLE 180 -30 1"], maxrec=10)
+        await service.run_query_votable(params, "/q", "user")
+        await shadow_runner.join()
+    event = publish.call_args.args[0]
+    assert event.primary_engine == "butler"
+    assert event.shadow_engine == "replica"
+    assert (event.missing, event.extra, event.mismatched) == (0, 1, 0)
+    assert not event.matches
+
+    # Shadow queries are skipped while the slow lane has no free slot.
+    publish.reset_mock()
+    slow = bulkheads.get(runtime, QueryLane.slow)
+    async with AsyncExitStack() as stack:
+        for _ in range(slow.concurrency):
+            await stack.enter_async_context(slow.slot("other"))
+        with patch.object(
+            events.sia_shadow_query_compared, "publish", publish
+        ):
+            await service.run_query_votable(params, "/q", "user")
+            await shadow_runner.join()
+    assert not publish.called
+
+
+@pytest.mark.asyncio
+async def test_shadow_after_response(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    service, bulkheads, events = await build_service(tmp_path, monkeypatch)
+    runtime = service._collection
+    release = threading.Event()
+    active: list[int] = []
+    sent: list[bool] = []
+    query = ObsCoreReplica.query
+
+    def slow_query(self: ObsCoreReplica, *args: Any, **kwargs: Any) -> Any:
+        active.append(sum(s.active for s in bulkheads.status().values()))
+        release.wait(5)
+        return query(self, *args, **kwargs)
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        params = SIAQueryParams(pos=["CIRCLE 180 -30 1"], maxrec=10)
+        body = await service.run_query_votable(params, "/q", "user")
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": body})
+
+    async def send(message: Message) -> None:
+        sent.append(bool(active))
+
+    # The response is sent in full before the slow shadow query starts, and
+    # the request finishes without waiting for it.
+    publish = AsyncMock()
+    with (
+        patch.object(ObsCoreReplica, "query", slow_query),
+        patch.object(events.sia_shadow_query_compared, "publish", publish),
+    ):
+        middleware = ShadowMiddleware(app)
+        scope = {"type": "http", "method": "GET", "path": "/q"}
+        await asyncio.wait_for(middleware(scope, AsyncMock(), send), 1)
+        assert sent == [False, False]
+
+        # The shadow query runs once the primary query has released its slot.
+        for _ in range(100):
+            if active:
+                break
+            await asyncio.sleep(0.01)
+        assert active == [0]
+        slow = bulkheads.get(runtime, QueryLane.slow)
+        assert slow.status().active == 1
+        release.set()
+        await shadow_runner.join()
+    assert publish.called
+    assert slow.status().active == 0
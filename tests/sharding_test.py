@@ -0,0 +1,55 @@
+"""Tests for planning sub-queries."""
+
+from datetime import UTC, datetime
+
+import pytest
+from astropy.time import Time
+from lsst.daf.butler import Timespan
+from lsst.dax.obscore.siav2 import SIAv2Parameters
+
+from sia.config import DatasetSettings, config
+from sia.sharding import plan_subqueries, shard_time
+
+
+def test_shard_time() -> None:
+    epochs = [
+        datetime(2022, 1, 1, tzinfo=UTC),
+        datetime(2021, 1, 1, tzinfo=UTC),
+    ]
+
+    # An unbounded interval is split into every epoch, in time order.
+    shards = shard_time(Timespan(None, None), epochs)
+    assert len(shards) == 3
+    assert shards[0].begin is None
+    assert shards[-1].end is None
+    assert shards[0].end == shards[1].begin
+
+    # A bounded interval is split only where it crosses a boundary.
+    begin = Time("2021-06-01", scale="utc")
+    shards = shard_time(Timespan(begin, None), epochs)
+    assert len(shards) == 2
+    assert shards[0] == Timespan(begin, Time("2022-01-01", scale="utc"))
+    end = Time("2021-07-01", scale="utc")
+    assert shard_time(Timespan(begin, end), epochs) == [Timespan(begin, end)]
+
+
+def test_plan_subqueries(monkeypatch: pytest.MonkeyPatch) -> None:
+    epochs = [datetime(2021, 1, 1, tzinfo=UTC)]
+    settings = DatasetSettings(time_epochs=epochs)
+    monkeypatch.setattr(config, "dataset_settings", {"dp02": settings})
+
+    # Queries that need no splitting are left alone.
+    params = SIAv2Parameters.from_siav2(pos="CIRCLE 0 0 1", maxrec="10")
+    assert plan_subqueries(params, "dp02") == [params]
+
+    # Long intervals are split, but only for datasets with epochs.
+    params = SIAv2Parameters.from_siav2(
+        pos=["CIRCLE 0 0 1", "CIRCLE 10 0 1"], time="-Inf +Inf", maxrec="10"
+    )
+    assert len(plan_subqueries(params, "other")) == 2
+    subqueries = plan_subqueries(params, "dp02")
+    assert len(subqueries) == 4
+    assert subqueries[0].time == subqueries[1].time
+    assert subqueries[0].pos != subqueries[1].pos
+    assert all(len(p.pos) == len(p.time) == 1 for p in subqueries)
+    assert all(p.maxrec == 10 for p in subqueries)
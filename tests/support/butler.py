@@ -10,6 +10,7 @@ from astropy.io.votable import from_table
 from astropy.table import Table
 from lsst.daf.butler import Butler, LabeledButlerFactory
 from lsst.dax.obscore import siav2
+from lsst.sphgeom import Angle, Circle, LonLat, UnitVector3d
 
 __all__ = [
     "MockButler",
@@ -88,9 +89,13 @@ class MockButler(Mock):
     def _get_child_mock(self, /, **kwargs: Any) -> Mock:
         return Mock(**kwargs)
 
-    def query_dimension_records(self, query: str) -> list[str]:
+    def query_dimension_records(self, query: str, **kwargs: Any) -> list[Mock]:
         record = Mock()
-        record.name = "HSC"
+        if query == "instrument":
+            record.name = "HSC"
+        else:
+            center = UnitVector3d(LonLat.fromDegrees(180, -30))
+            record.region = Circle(center, Angle.fromDegrees(1))
         return [record]
 
 
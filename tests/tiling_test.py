@@ -0,0 +1,55 @@
+"""Tests for splitting large POS regions into sky tiles."""
+
+import pytest
+from lsst.sphgeom import Angle, LonLat, Region, UnitVector3d
+
+from sia.config import config
+from sia.tiling import plan_regions, tile_level, tile_region
+
+
+def test_tile_region(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "pos_tile_size", 5.0)
+
+    # Small regions are left alone.
+    small = Region.from_ivoa_pos("CIRCLE 10 10 1")
+    assert tile_region(small) == [small]
+
+    # Large regions are split into tiles that together cover the region.
+    large = Region.from_ivoa_pos("RANGE 0 40 -20 20")
+    tiles = tile_region(large)
+    assert 1 < len(tiles) <= config.pos_max_tiles
+    for lon, lat in ((1, 1), (20, -19), (39, 19)):
+        point = UnitVector3d(LonLat.fromDegrees(lon, lat))
+        assert any(t.contains(point) for t in tiles)
+    outside = UnitVector3d(LonLat.fromDegrees(50, 0))
+    assert not any(t.contains(outside) for t in tiles)
+
+    # Tiling can be disabled.
+    monkeypatch.setattr(config, "pos_tile_size", None)
+    assert tile_region(large) == [large]
+
+
+def test_tile_level(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "pos_tile_size", 1.0)
+    monkeypatch.setattr(config, "pos_max_tiles", 64)
+
+    # Small regions get tiles of about the tile size, and larger regions
+    # get coarser tiles.
+    small = tile_level(Angle.fromDegrees(2))
+    assert small == 5
+    assert tile_level(Angle.fromDegrees(90)) < small
+    assert tile_level(Angle.fromDegrees(180)) == 1
+
+
+def test_plan_regions(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "pos_tile_size", 5.0)
+    small = Region.from_ivoa_pos("CIRCLE 10 10 1")
+    large = Region.from_ivoa_pos("CIRCLE 100 0 20")
+    assert plan_regions((small,)) == [small]
+    plan = plan_regions((small, large))
+    assert plan[0] == small
+    assert len(plan) > 2
+
+    # Without fan-out, multiple regions are queried together.
+    monkeypatch.setattr(config, "pos_fanout", False)
+    assert plan_regions((small, large)) == []
@@ -0,0 +1,67 @@
+"""Tests for parsing uploaded tables of positions."""
+
+import io
+
+import pytest
+from astropy.io.votable import from_table
+from astropy.table import Table
+from fastapi import UploadFile
+
+from sia.config import config
+from sia.exceptions import UsageFaultError
+from sia.upload import Cone, max_upload_size, parse_cones, read_upload
+
+
+def test_parse_csv() -> None:
+    upload = b"RA,Dec,radius,name\n320,-0.1,0.5,a\n10.5,20,1,b\n"
+    cones = parse_cones(upload)
+    assert cones == [Cone(320, -0.1, 0.5), Cone(10.5, 20, 1)]
+    assert cones[0].to_pos() == "CIRCLE 320.0 -0.1 0.5"
+
+
+def test_parse_votable() -> None:
+    table = Table({"ra": [320.0], "dec": [-0.1], "radius": [0.5]})
+    output = io.BytesIO()
+    from_table(table).to_xml(output)
+    assert parse_cones(output.getvalue()) == [Cone(320, -0.1, 0.5)]
+
+
+@pytest.mark.parametrize(
+    "upload",
+    [
+        b"<VOTABLE",
+        b"ra,dec\n320,-0.1\n",
+        b"ra,dec,radius\n",
+        b"ra,dec,radius\n320,-0.1,foo\n",
+        b"ra,dec,radius\n320,-91,0.5\n",
+        b"ra,dec,radius\n320,-0.1,0\n",
+        b"ra,dec,radius\n320,-0.1,nan\n",
+    ],
+)
+def test_parse_invalid(upload: bytes) -> None:
+    with pytest.raises(UsageFaultError):
+        parse_cones(upload)
+
+
+def test_parse_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "bulk_max_positions", 2)
+    upload = b"ra,dec,radius\n1,1,1\n2,2,1\n"
+    assert len(parse_cones(upload)) == 2
+    with pytest.raises(UsageFaultError):
+        parse_cones(upload + b"3,3,1\n")
+
+
+@pytest.mark.asyncio
+async def test_read_upload(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "bulk_max_positions", 1)
+    limit = max_upload_size()
+    data = b"x" * limit
+    assert await read_upload(UploadFile(io.BytesIO(data))) == data
+
+    # Larger uploads are rejected, whether or not their size is known.
+    data += b"x"
+    for size in (len(data), None):
+        upload = UploadFile(io.BytesIO(data), size=size)
+        with pytest.raises(UsageFaultError) as excinfo:
+            await read_upload(upload)
+        assert excinfo.value.status_code == 413
@@ -0,0 +1,77 @@
+"""Tests for merging VOTable query results."""
+
+from astropy.io.votable import from_table
+from astropy.io.votable.tree import Info, VOTableFile
+from astropy.table import Table
+
+from sia.votable import (
+    column_names,
+    merge_collections,
+    merge_results,
+    publisher_dids,
+    query_status,
+)
+
+
+def build_result(dids: list[str], status: str = "OK") -> VOTableFile:
+    table = Table(
+        {
+            "obs_publisher_did": dids,
+            "s_ra": [float(i) for i in range(len(dids))],
+        }
+    )
+    votable = from_table(table)
+    votable.resources[0].infos.append(Info(name="QUERY_STATUS", value=status))
+    return votable
+
+
+def dids(votable: VOTableFile) -> list[str]:
+    return list(votable.get_first_table().array["obs_publisher_did"])
+
+
+def test_merge() -> None:
+    # Rows are kept in order, and duplicates keep their first occurrence.
+    results = [build_result(["a", "b"]), build_result(["c", "a", "d"])]
+    merged = merge_results(results, 10)
+    assert dids(merged) == ["a", "b", "c", "d"]
+    assert query_status(merged) == "OK"
+
+    # Cutting to MAXREC is an overflow.
+    results = [build_result(["a", "b"]), build_result(["c", "d"])]
+    merged = merge_results(results, 3)
+    assert dids(merged) == ["a", "b", "c"]
+    assert query_status(merged) == "OVERFLOW"
+
+    # So is an overflow of any sub-query, even without a cut.
+    results = [build_result(["a"]), build_result(["b"], "OVERFLOW")]
+    merged = merge_results(results, None)
+    assert dids(merged) == ["a", "b"]
+    assert query_status(merged) == "OVERFLOW"
+
+    # Empty results are skipped.
+    results = [build_result([]), build_result(["a"])]
+    assert dids(merge_results(results, 10)) == ["a"]
+
+
+def test_publisher_dids() -> None:
+    assert publisher_dids(build_result(["a", "b", "a"])) == ["a", "b", "a"]
+    assert publisher_dids(build_result([])) == []
+    votable = from_table(Table({"s_ra": [1.0]}))
+    assert publisher_dids(votable) is None
+
+
+def test_merge_collections() -> None:
+    results = {"dp02": build_result(["a"]), "dp1": build_result(["b", "c"])}
+    merged = merge_collections(results, None)
+    array = merged.get_first_table().array
+    assert list(array["collection_name"]) == ["dp02", "dp1", "dp1"]
+    assert dids(merged) == ["a", "b", "c"]
+
+    assert column_names(merged)[-1] == "collection_name"
+
+    # The same data product from several collections is kept for each.
+    results = {"dp02": build_result(["a"]), "dp1": build_result(["a", "b"])}
+    merged = merge_collections(results, None)
+    array = merged.get_first_table().array
+    assert list(array["collection_name"]) == ["dp02", "dp1", "dp1"]
+    assert dids(merged) == ["a", "a", "b"]